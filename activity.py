@@ -0,0 +1,291 @@
+"""Agrégation incrémentale de l'activité vocale par salon et par heure, pour le résumé quotidien"""
+import os
+import struct
+import sys
+import time
+from array import array
+
+HOURS = 24
+
+# Une période plus longue que 24 h (résumé manqué) recouvrirait ses propres cases ; marge pour le retard du réveil
+PERIOD_GRACE = 300
+
+# En-tête: signature, version, début de la période, nombre de serveurs
+MAGIC = b"VACT"
+VERSION = 1
+HEADER = struct.Struct("<4sHdI")
+# Par serveur: guild_id, nombre de salons
+GUILD_HEADER = struct.Struct("<QI")
+
+
+def hour_of(timestamp):
+    """Case horaire (0-23, UTC) d'un horodatage"""
+    return int(timestamp // 3600) % HOURS
+
+
+class GuildActivity:
+    """Cases horaires d'un serveur: une ligne de 24 cases par salon, dans des tableaux contigus"""
+    __slots__ = ("slots", "channel_ids", "updated_at", "seconds", "peaks", "joins", "present", "visitors")
+
+    def __init__(self):
+        # channel_id -> index de ligne
+        self.slots = {}
+        self.channel_ids = array("Q")
+        # Date jusqu'à laquelle le temps passé en vocal a été compté, par salon
+        self.updated_at = array("d")
+        # [ligne * 24 + heure]: secondes cumulées en vocal, pic de connexions simultanées, arrivées
+        self.seconds = array("d")
+        self.peaks = array("I")
+        self.joins = array("I")
+        # Membres présents et visiteurs distincts de la période, par salon
+        self.present = []
+        self.visitors = []
+
+    def slot(self, channel_id, now):
+        slot = self.slots.get(channel_id)
+        if slot is None:
+            slot = self.slots[channel_id] = len(self.channel_ids)
+            self.channel_ids.append(channel_id)
+            self.updated_at.append(now)
+            self.seconds.extend(array("d", [0.0]) * HOURS)
+            self.peaks.extend(array("I", [0]) * HOURS)
+            self.joins.extend(array("I", [0]) * HOURS)
+            self.present.append(set())
+            self.visitors.append(set())
+        return slot
+
+
+class ActivityAggregator:
+    """Activité vocale des salons surveillés, agrégée au fil des événements.
+
+    `move()` est appelé par le gestionnaire vocal à chaque changement de salon
+    (O(1)) : le temps passé en vocal est l'intégrale du nombre de membres
+    présents, comptée case horaire par case horaire. `digest()` ne lit que les
+    24 cases de chaque salon, quelle que soit l'ancienneté des données ;
+    `rollover()` remet les cases à zéro pour la période suivante.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._guilds = {}
+        self.period_start = clock()
+        # Début de la période abandonnée par `expire_period()`, signalé dans le résumé suivant
+        self.skipped_since = None
+
+    def guild(self, guild_id):
+        activity = self._guilds.get(guild_id)
+        if activity is None:
+            activity = self._guilds[guild_id] = GuildActivity()
+        return activity
+
+    def _integrate(self, activity, slot, now):
+        """Ajoute le temps passé par les membres présents depuis la dernière mise à jour du salon"""
+        start = activity.updated_at[slot]
+        activity.updated_at[slot] = now
+        count = len(activity.present[slot])
+        if not count or now <= start:
+            return
+        # Les cases ne couvrent qu'une journée (flush() passe bien plus souvent)
+        start = max(start, now - HOURS * 3600)
+        base = slot * HOURS
+        seconds = activity.seconds
+        peaks = activity.peaks
+        while start < now:
+            hour_end = (int(start // 3600) + 1) * 3600
+            end = now if now < hour_end else hour_end
+            index = base + hour_of(start)
+            seconds[index] += count * (end - start)
+            if peaks[index] < count:
+                peaks[index] = count
+            start = end
+
+    def move(self, guild_id, member_id, before_id=None, after_id=None, now=None):
+        """Un membre quitte `before_id` et/ou rejoint `after_id` (None: salon non surveillé)"""
+        now = self._clock() if now is None else now
+        activity = self.guild(guild_id)
+        if before_id is not None:
+            slot = activity.slot(before_id, now)
+            self._integrate(activity, slot, now)
+            activity.present[slot].discard(member_id)
+        if after_id is not None:
+            slot = activity.slot(after_id, now)
+            self._integrate(activity, slot, now)
+            present = activity.present[slot]
+            present.add(member_id)
+            activity.visitors[slot].add(member_id)
+            index = slot * HOURS + hour_of(now)
+            activity.joins[index] += 1
+            if activity.peaks[index] < len(present):
+                activity.peaks[index] = len(present)
+
+    def reset(self, guild_id, channels, now=None):
+        """Recale les membres présents sur les salons surveillés (démarrage, reconstruction de l'index)"""
+        now = self._clock() if now is None else now
+        activity = self.guild(guild_id)
+        current = {channel.id: {member.id for member in channel.members} for channel in channels}
+        for channel_id in set(activity.slots) | set(current):
+            slot = activity.slot(channel_id, now)
+            self._integrate(activity, slot, now)
+            members = current.get(channel_id, set())
+            activity.present[slot] = members
+            activity.visitors[slot].update(members)
+            index = slot * HOURS + hour_of(now)
+            if activity.peaks[index] < len(members):
+                activity.peaks[index] = len(members)
+
+    def remove_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+    def flush(self, now=None):
+        """Compte le temps passé jusqu'à maintenant dans tous les salons (cases à jour sans événement)"""
+        now = self._clock() if now is None else now
+        for activity in self._guilds.values():
+            for slot in range(len(activity.channel_ids)):
+                self._integrate(activity, slot, now)
+
+    def digest(self, guild_id, now=None):
+        """Résumé de la période par salon, du plus actif au moins actif.
+
+        Retourne [{channel_id, visitors, seconds, peak, busiest_hour}] où
+        `busiest_hour` est l'horodatage du début de l'heure la plus chargée.
+        """
+        now = self._clock() if now is None else now
+        activity = self._guilds.get(guild_id)
+        if activity is None:
+            return []
+        rows = []
+        for slot, channel_id in enumerate(activity.channel_ids):
+            self._integrate(activity, slot, now)
+            base = slot * HOURS
+            hours = activity.seconds[base:base + HOURS]
+            total = sum(hours)
+            if not total and not activity.visitors[slot]:
+                continue
+            busiest = max(range(HOURS), key=hours.__getitem__)
+            rows.append({
+                "channel_id": channel_id,
+                "visitors": len(activity.visitors[slot]),
+                "seconds": total,
+                "peak": max(activity.peaks[base:base + HOURS]),
+                "busiest_hour": self._hour_start(busiest, now) if total else None,
+            })
+        rows.sort(key=lambda row: row["seconds"], reverse=True)
+        return rows
+
+    def _hour_start(self, hour, now):
+        """Début de la dernière heure `hour` (UTC) écoulée dans la période"""
+        current = int(now // 3600)
+        return (current - (current - hour) % HOURS) * 3600
+
+    def expire_period(self, now=None):
+        """Abandonne la période en cours si elle dépasse 24 h (bot arrêté à l'heure du résumé).
+
+        Les heures de la veille et du jour se mélangeraient dans les mêmes
+        cases : on repart d'une période vide, en gardant la date de début de
+        celle abandonnée pour le signaler. Retourne True si elle l'a été.
+        """
+        now = self._clock() if now is None else now
+        if now - self.period_start <= HOURS * 3600 + PERIOD_GRACE:
+            return False
+        skipped_since = self.period_start
+        self.rollover(now)
+        self.skipped_since = skipped_since
+        return True
+
+    def rollover(self, now=None):
+        """Commence une nouvelle période: cases à zéro, les membres présents restent comptés"""
+        now = self._clock() if now is None else now
+        self.flush(now)
+        for activity in self._guilds.values():
+            size = len(activity.channel_ids) * HOURS
+            activity.seconds = array("d", [0.0]) * size
+            activity.peaks = array("I", [0]) * size
+            activity.joins = array("I", [0]) * size
+            activity.visitors = [set(present) for present in activity.present]
+            for slot, present in enumerate(activity.present):
+                activity.peaks[slot * HOURS + hour_of(now)] = len(present)
+        self.period_start = now
+        self.skipped_since = None
+
+    # --- Persistance (les cases de la période en cours survivent à un redémarrage) ---
+
+    def encode(self):
+        parts = [HEADER.pack(MAGIC, VERSION, self.period_start, len(self._guilds))]
+        for guild_id, activity in self._guilds.items():
+            parts.append(GUILD_HEADER.pack(guild_id, len(activity.channel_ids)))
+            counts = array("I", (len(visitors) for visitors in activity.visitors))
+            visitor_ids = array("Q", (member_id for visitors in activity.visitors for member_id in visitors))
+            arrays = (activity.channel_ids, activity.seconds, activity.peaks, activity.joins, counts, visitor_ids)
+            for values in arrays:
+                if sys.byteorder == "big":
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                parts.append(values.tobytes())
+        return b"".join(parts)
+
+    def decode(self, data, now=None):
+        """Recharge les cases d'une période enregistrée (les membres présents sont recalés par `reset()`)"""
+        now = self._clock() if now is None else now
+        if len(data) < HEADER.size:
+            raise ValueError("fichier d'activité tronqué")
+        magic, version, period_start, guild_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("format d'activité inconnu")
+        offset = HEADER.size
+        guilds = {}
+
+        def read(typecode, count):
+            nonlocal offset
+            values = array(typecode)
+            size = values.itemsize * count
+            values.frombytes(data[offset:offset + size])
+            if len(values) != count:
+                raise ValueError("fichier d'activité tronqué")
+            if sys.byteorder == "big":
+                values.byteswap()
+            offset += size
+            return values
+
+        for _ in range(guild_count):
+            if offset + GUILD_HEADER.size > len(data):
+                raise ValueError("fichier d'activité tronqué")
+            guild_id, channel_count = GUILD_HEADER.unpack_from(data, offset)
+            offset += GUILD_HEADER.size
+            activity = GuildActivity()
+            activity.channel_ids = read("Q", channel_count)
+            activity.seconds = read("d", channel_count * HOURS)
+            activity.peaks = read("I", channel_count * HOURS)
+            activity.joins = read("I", channel_count * HOURS)
+            counts = read("I", channel_count)
+            visitor_ids = read("Q", sum(counts))
+            position = 0
+            for slot, channel_id in enumerate(activity.channel_ids):
+                activity.slots[channel_id] = slot
+                activity.visitors.append(set(visitor_ids[position:position + counts[slot]]))
+                activity.present.append(set())
+                position += counts[slot]
+            activity.updated_at = array("d", [now]) * channel_count
+            guilds[guild_id] = activity
+        self._guilds = guilds
+        self.period_start = period_start
+        self.skipped_since = None
+        self.expire_period(now)
+
+
+def save(path, data):
+    """Écrit les cases encodées par `encode()` de façon atomique"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read(path):
+    """Contenu du fichier d'activité, ou None s'il est absent"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
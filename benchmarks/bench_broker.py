@@ -0,0 +1,174 @@
+"""Benchmark de la transmission gateway -> workers d'envoi (broker.py).
+
+Lance `--workers` processus à l'écoute sur des sockets Unix, chacun avec
+son `NotificationDispatcher` et un `send` simulé qui consomme `--send-cpu-ms`
+de CPU par requête (sérialisation, TLS...) ; les limites de débit de Discord
+sont levées pour mesurer le débit des processus. La gateway (ce processus)
+publie `--notifications` messages répartis sur `--channels` salons, puis le
+débit de bout en bout est mesuré et l'ordre des messages de chaque salon
+vérifié. Avec `--kill-after N`, le premier worker est tué après N messages
+publiés puis relancé : la gateway garde ses messages en file et reprend.
+
+Usage:
+    python benchmarks/bench_broker.py [--workers 4] [--notifications 20000] [--channels 200] [--kill-after 5000]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import broker  # noqa: E402
+import dispatcher  # noqa: E402
+from broker import BrokerPublisher  # noqa: E402
+from dispatcher import Notification, NotificationDispatcher  # noqa: E402
+
+UNLIMITED = (10 ** 9, 1.0)
+
+
+class Guild:
+    id = 1
+
+
+class Channel:
+    __slots__ = ("id", "guild")
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.guild = Guild
+
+
+def burn(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def run_worker(url, send_cpu, delivered, requests, disorders):
+    """Processus worker: reçoit, ordonnance et « envoie » en comptant les lignes"""
+    dispatcher.CHANNEL_SEND_RATE = UNLIMITED
+    last_seq = {}
+
+    async def send(channel, content):
+        burn(send_cpu)
+        lines = content.split("\n")
+        for line in lines:
+            channel_id, seq = map(int, line.split(":"))
+            if seq <= last_seq.get(channel_id, -1):
+                with disorders.get_lock():
+                    disorders.value += 1
+            last_seq[channel_id] = seq
+        with delivered.get_lock():
+            delivered.value += len(lines)
+        with requests.get_lock():
+            requests.value += 1
+        return None
+
+    async def main():
+        local = NotificationDispatcher(send, workers=8, queue_size=100000, global_rate=UNLIMITED)
+        local.start()
+
+        async def handle(reader, writer):
+            async for frame in broker.read_frames(reader):
+                now = time.monotonic()
+                local.submit(Notification(Channel(frame["c"]), frame["t"], tuple(now - age for age in frame["a"]),
+                                          created_at=now - frame["k"]))
+
+        await broker.start_server(url, handle)
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def start_worker(url, args, counters):
+    process = multiprocessing.Process(target=run_worker, args=(url, args.send_cpu_ms / 1000, *counters), daemon=True)
+    process.start()
+    return process
+
+
+async def publish(args, urls, processes, counters):
+    publisher = BrokerPublisher(urls, queue_size=args.notifications, max_reconnect_delay=0.5)
+    publisher.start()
+    channels = [Channel(((1_000_000 + i * 7919) << 22) + i) for i in range(args.channels)]
+    seqs = [0] * args.channels
+    delivered = counters[0]
+
+    # Retard maximal de la boucle de la gateway pendant la publication (et la panne d'un worker)
+    max_lag = 0.0
+    stop = asyncio.Event()
+
+    async def watch_lag():
+        nonlocal max_lag
+        while not stop.is_set():
+            expected = time.perf_counter() + 0.01
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.perf_counter() - expected)
+
+    lag_task = asyncio.create_task(watch_lag())
+    started = time.perf_counter()
+    for index in range(args.notifications):
+        channel_index = index % args.channels
+        channel = channels[channel_index]
+        publisher.submit(Notification(channel, f"{channel.id}:{seqs[channel_index]}", (time.monotonic(),)))
+        seqs[channel_index] += 1
+        if index % 100 == 0:
+            await asyncio.sleep(0)
+        if args.kill_after and index == args.kill_after:
+            processes[0].kill()
+            processes[0].join()
+            # Le worker revient une seconde plus tard, les messages de ses salons attendent dans la file
+            await asyncio.sleep(0.2)
+            asyncio.get_running_loop().call_later(
+                1.0, lambda: processes.__setitem__(0, start_worker(urls[0], args, counters))
+            )
+    published = time.perf_counter() - started
+
+    # Attente de la livraison (ou de 3 s sans progrès si des messages ont été perdus avec le worker tué)
+    last, progressed_at = -1, time.perf_counter()
+    while delivered.value < args.notifications and time.perf_counter() - progressed_at < 3.0:
+        await asyncio.sleep(0.01)
+        if delivered.value != last:
+            last, progressed_at = delivered.value, time.perf_counter()
+    elapsed = progressed_at - started
+    stop.set()
+    await lag_task
+    await publisher.drain(timeout=1.0)
+    return publisher, published, elapsed, max_lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--notifications", type=int, default=20000)
+    parser.add_argument("--channels", type=int, default=200)
+    parser.add_argument("--send-cpu-ms", type=float, default=1.0)
+    parser.add_argument("--kill-after", type=int, default=0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench-broker-")
+    urls = [f"unix://{directory}/worker-{i}.sock" for i in range(args.workers)]
+    counters = (multiprocessing.Value("q", 0), multiprocessing.Value("q", 0), multiprocessing.Value("q", 0))
+    processes = [start_worker(url, args, counters) for url in urls]
+    try:
+        publisher, published, elapsed, max_lag = asyncio.run(publish(args, urls, processes, counters))
+    finally:
+        for process in processes:
+            process.kill()
+
+    delivered, requests, disorders = (counter.value for counter in counters)
+    print(f"{args.workers} worker(s), {args.notifications} notifications, {args.channels} salons, "
+          f"send simulé: {args.send_cpu_ms} ms CPU")
+    print(f"  publication (gateway) : {published * 1000:.0f} ms ({args.notifications / published:.0f} msg/s)")
+    print(f"  livraison complète    : {elapsed * 1000:.0f} ms ({delivered / elapsed:.0f} msg/s, {requests} requêtes)")
+    print(f"  retard max de la boucle de la gateway : {max_lag * 1000:.1f} ms")
+    print(f"  livrées / perdues     : {delivered} / {args.notifications - delivered}")
+    print(f"  ordre par salon       : {'conservé' if not disorders else f'{disorders} inversion(s)'}")
+    print(f"  reconnexions          : {publisher.reconnects}, abandonnées: {publisher.dropped}, expirées: {publisher.expired}")
+
+
+if __name__ == "__main__":
+    main()
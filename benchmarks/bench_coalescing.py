@@ -0,0 +1,194 @@
+"""Benchmark du regroupement des notifications vocales.
+
+Rejoue une rafale d'événements vocaux synthétiques (1000 par défaut) répartis
+sur plusieurs salons et compare l'envoi direct (un message par événement) avec
+la file de regroupement par salon.
+
+Les salons simulés appliquent une limite d'envoi par salon (type rate limit
+Discord) et une latence REST fixe.
+
+Usage:
+    python benchmarks/bench_coalescing.py [--events 1000] [--channels 20] ...
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import notifications  # noqa: E402
+from dispatcher import NotificationDispatcher  # noqa: E402
+from templates import DEFAULT_SET  # noqa: E402
+
+
+class FakeGuild:
+    id = 1
+
+
+class FakeChannel:
+    """Salon simulé avec une limite d'envoi de `rate` messages par `per` secondes"""
+
+    def __init__(self, channel_id, rate, per, latency):
+        self.id = channel_id
+        self.name = f"vocal-{channel_id}"
+        self.guild = FakeGuild
+        self.rate = rate
+        self.per = per
+        self.latency = latency
+        self.sent = []
+        self._window_start = 0.0
+        self._window_count = 0
+        self._lock = asyncio.Lock()
+
+    async def send(self, content):
+        async with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.per:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count >= self.rate:
+                await asyncio.sleep(self._window_start + self.per - now)
+                self._window_start = time.monotonic()
+                self._window_count = 0
+            self._window_count += 1
+            await asyncio.sleep(self.latency)
+            self.sent.append(content)
+
+
+def make_events(count, channels, members, seed):
+    """Génère une suite d'événements vocaux cohérente (membre par membre)"""
+    rng = random.Random(seed)
+    location = {}
+    events = []
+    while len(events) < count:
+        member_id = rng.randrange(members)
+        current = location.get(member_id)
+        if current is None:
+            target = rng.randrange(channels)
+            events.append((notifications.JOIN, member_id, target, None))
+            location[member_id] = target
+        elif rng.random() < 0.5:
+            events.append((notifications.LEAVE, member_id, current, None))
+            del location[member_id]
+        else:
+            target = rng.randrange(channels)
+            if target == current:
+                continue
+            events.append((notifications.MOVE_OUT, member_id, current, target))
+            events.append((notifications.MOVE_IN, member_id, target, current))
+            location[member_id] = target
+    return events[:count]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_naive(events, channels, duration):
+    """Envoi direct: un message par événement, comme l'ancien gestionnaire"""
+    latencies = []
+    tasks = []
+    interval = duration / len(events)
+
+    async def deliver(channel, content, enqueued_at):
+        await channel.send(content)
+        latencies.append(time.monotonic() - enqueued_at)
+
+    for kind, member_id, channel_index, other in events:
+        channel = channels[channel_index]
+        content = DEFAULT_SET.render_lines([
+            notifications.VoiceEvent(kind, member_id, f"membre-{member_id}", channels[other].name if other is not None else None, 0.0)
+        ])[0]
+        tasks.append(asyncio.create_task(deliver(channel, content, time.monotonic())))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+async def run_coalesced(events, channels, duration, window, max_batch, workers):
+    """Envoi via la file de regroupement par salon et le pool de workers"""
+    latencies = []
+
+    async def send(channel, content):
+        await channel.send(content)
+
+    dispatcher = NotificationDispatcher(send, workers=workers, latency_observer=latencies.append)
+    dispatcher.start()
+    notifier = notifications.NotificationCoalescer(dispatcher.submit, window=window, max_batch=max_batch)
+    interval = duration / len(events)
+    for kind, member_id, channel_index, other in events:
+        notifier.push(
+            channels[channel_index],
+            kind,
+            member_id,
+            f"membre-{member_id}",
+            channels[other] if other is not None else None,
+        )
+        await asyncio.sleep(interval)
+    # Laisser expirer les dernières fenêtres avant de vider le pool
+    await asyncio.sleep(window)
+    notifier.flush_all()
+    await dispatcher.drain(timeout=60)
+    return latencies, notifier, dispatcher
+
+
+def report(label, events, channels, latencies, elapsed):
+    messages = sum(len(channel.sent) for channel in channels)
+    print(f"{label}")
+    print(f"  événements        : {len(events)}")
+    print(f"  messages envoyés  : {messages}")
+    print(f"  événements livrés : {len(latencies)}")
+    print(f"  latence p50       : {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"  latence p99       : {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"  durée totale      : {elapsed:.2f} s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--members", type=int, default=300)
+    parser.add_argument("--duration", type=float, default=2.0, help="durée de la rafale (s)")
+    parser.add_argument("--window", type=float, default=0.5, help="fenêtre de regroupement (s)")
+    parser.add_argument("--max-batch", type=int, default=25)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=int, default=5, help="messages autorisés par salon et par période")
+    parser.add_argument("--per", type=float, default=1.0, help="période de la limite d'envoi (s)")
+    parser.add_argument("--latency", type=float, default=0.05, help="latence REST simulée (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-naive", action="store_true", help="ne pas mesurer l'envoi direct")
+    args = parser.parse_args()
+
+    events = make_events(args.events, args.channels, args.members, args.seed)
+
+    def make_channels():
+        return [FakeChannel(i, args.rate, args.per, args.latency) for i in range(args.channels)]
+
+    if not args.skip_naive:
+        channels = make_channels()
+        started = time.monotonic()
+        latencies = await run_naive(events, channels, args.duration)
+        report("Envoi direct (un message par événement)", events, channels, latencies, time.monotonic() - started)
+
+    channels = make_channels()
+    started = time.monotonic()
+    latencies, notifier, dispatcher = await run_coalesced(
+        events, channels, args.duration, args.window, args.max_batch, args.workers
+    )
+    report(
+        f"File de regroupement (fenêtre {args.window}s, lot max {args.max_batch})",
+        events, channels, latencies, time.monotonic() - started,
+    )
+    print(f"  événements annulés: {notifier.events_cancelled}")
+    print(f"  notifications abandonnées: {dispatcher.dropped}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""Benchmark de l'agrégation de l'activité vocale et du résumé quotidien.
+
+Simule `--days` jours d'événements vocaux (arrivées, départs, changements de
+salon) sur `--channels` salons, avec un résumé et une nouvelle période chaque
+jour, puis mesure le coût de `move()` par événement et le temps de calcul
+du résumé. Le résumé ne lit que les cases horaires de la période en cours :
+son coût ne dépend pas du nombre de jours simulés.
+
+Usage:
+    python benchmarks/bench_digest.py [--days 90] [--events-per-day 20000] [--channels 50]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity import ActivityAggregator  # noqa: E402
+
+GUILD_ID = 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--events-per-day", type=int, default=20000)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = 1_700_000_000 - 1_700_000_000 % 86400
+    aggregator = ActivityAggregator(clock=lambda: start)
+    channel_ids = [1000 + i for i in range(args.channels)]
+    location = {}
+    move_time = 0.0
+    digest_times = []
+    events = 0
+
+    for day in range(args.days):
+        day_start = start + day * 86400
+        offsets = sorted(rng.uniform(0, 86400) for _ in range(args.events_per_day))
+        for offset in offsets:
+            member_id = rng.randrange(args.members)
+            before_id = location.get(member_id)
+            after_id = None if before_id is not None and rng.random() < 0.5 else rng.choice(channel_ids)
+            location[member_id] = after_id
+            started = time.perf_counter()
+            aggregator.move(GUILD_ID, member_id, before_id, after_id, now=day_start + offset)
+            move_time += time.perf_counter() - started
+            events += 1
+
+        now = day_start + 86400
+        started = time.perf_counter()
+        rows = aggregator.digest(GUILD_ID, now=now)
+        digest_times.append(time.perf_counter() - started)
+        aggregator.rollover(now=now)
+
+    first_digest, last_digest = digest_times[0], digest_times[-1]
+    digest_times.sort()
+    encoded = aggregator.encode()
+    print(f"{args.days} jours, {events} événements, {args.channels} salons, {args.members} membres")
+    print(f"  move()         : {move_time / events * 1e6:.2f} µs/événement")
+    print(f"  résumé (p50)   : {digest_times[len(digest_times) // 2] * 1000:.3f} ms")
+    print(f"  résumé (max)   : {digest_times[-1] * 1000:.3f} ms")
+    print(f"  premier / dernier jour : {first_digest * 1000:.3f} ms / {last_digest * 1000:.3f} ms")
+    print(f"  salons résumés : {len(rows)}")
+    print(f"  état enregistré: {len(encoded) / 1024:.1f} Kio")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark du cache des membres: mode complet contre mode allégé.
+
+Pour chaque mode, un processus séparé construit le client avec les options de
+`member_cache.client_options()` puis traite un GUILD_CREATE synthétique (un
+serveur de `--members` membres dont `--in-voice` sont en vocal). En mode
+complet, les membres arrivent ensuite par paquets de 1000 comme lors du
+chargement au démarrage (chunking) ; en mode allégé, seuls les membres
+présents en vocal sont reçus et gardés.
+
+Mesures: mémoire résidente (VmRSS) après chargement et temps de traitement
+jusqu'à l'équivalent de `on_ready`.
+
+Usage:
+    python benchmarks/bench_member_cache.py [--members 50000] [--in-voice 200]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNK_SIZE = 1000
+GUILD_ID = 1
+VOICE_CHANNELS = 20
+
+
+def rss_kib():
+    """Mémoire résidente du processus courant (Linux)"""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def member_payload(member_id):
+    return {
+        "user": {"id": str(member_id), "username": f"membre{member_id}", "discriminator": "0",
+                 "global_name": f"Membre {member_id}", "avatar": None},
+        "nick": None,
+        "roles": [],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def guild_payload(members, in_voice, lean):
+    channels = [
+        {"id": str(100 + i), "type": 2, "name": f"vocal-{i}", "position": i, "guild_id": str(GUILD_ID),
+         "permission_overwrites": [], "bitrate": 64000, "user_limit": 0}
+        for i in range(VOICE_CHANNELS)
+    ]
+    voice_ids = range(1000, 1000 + in_voice)
+    voice_states = [
+        {"user_id": str(member_id), "channel_id": str(100 + member_id % VOICE_CHANNELS),
+         "session_id": "x", "deaf": False, "mute": False, "self_deaf": False, "self_mute": False,
+         "suppress": False, "member": member_payload(member_id)}
+        for member_id in voice_ids
+    ]
+    return {
+        "id": str(GUILD_ID),
+        "name": "Serveur de test",
+        "owner_id": "1000",
+        "member_count": members,
+        "roles": [{"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0,
+                   "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+        "channels": channels,
+        # Sans l'intent members, Discord n'envoie que les membres en vocal (et le bot)
+        "members": [member_payload(member_id) for member_id in voice_ids] if lean else [],
+        "voice_states": voice_states,
+        "large": True,
+        "features": [],
+        "emojis": [],
+        "stickers": [],
+    }
+
+
+def child(mode, members, in_voice):
+    import discord
+    from discord.member import Member
+
+    from member_cache import client_options
+
+    lean = mode == "lean"
+    baseline = rss_kib()
+    client = discord.Client(**client_options(lean=lean))
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data={
+        "id": "1", "username": "bot", "discriminator": "0", "avatar": None, "bot": True})
+
+    start = time.perf_counter()
+    guild = state._add_guild_from_data(guild_payload(members, in_voice, lean))
+    if state._chunk_guilds:
+        # Chargement des membres au démarrage: paquets GUILD_MEMBERS_CHUNK
+        for offset in range(1000, 1000 + members, CHUNK_SIZE):
+            stop = min(offset + CHUNK_SIZE, 1000 + members)
+            chunk = [Member(data=member_payload(member_id), guild=guild, state=state)
+                     for member_id in range(offset, stop)]
+            for member in chunk:
+                guild._add_member(member)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "mode": mode,
+        "ready_ms": elapsed * 1000,
+        "rss_mib": (rss_kib() - baseline) / 1024,
+        "cached_members": len(guild._members),
+        "in_voice": sum(len(channel.voice_states) for channel in guild.voice_channels),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=50000)
+    parser.add_argument("--in-voice", type=int, default=200)
+    parser.add_argument("--child", choices=("full", "lean"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.members, args.in_voice)
+        return
+
+    results = []
+    for mode in ("full", "lean"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode,
+             "--members", str(args.members), "--in-voice", str(args.in_voice)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"Serveur synthétique: {args.members} membres, {args.in_voice} en vocal")
+    print(f"{'mode':<6} {'membres en cache':>17} {'en vocal':>9} {'RSS (Mio)':>10} {'prêt (ms)':>10}")
+    for result in results:
+        print(f"{result['mode']:<6} {result['cached_members']:>17} {result['in_voice']:>9} "
+              f"{result['rss_mib']:>10.1f} {result['ready_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
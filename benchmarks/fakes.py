@@ -0,0 +1,159 @@
+"""Objets Discord simulés pour rejouer des événements vocaux sans connexion.
+
+Ils n'implémentent que les attributs et méthodes utilisés par le bot
+(gestionnaire vocal, index des salons, commandes). `FakeVoiceChannel.send`
+enregistre les messages au lieu de les envoyer.
+"""
+import asyncio
+import time
+
+
+class FakePermissions:
+    def __init__(self, send_messages=True):
+        self.send_messages = send_messages
+
+
+class FakeUser:
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{user_id}>"
+        self.bot = True
+
+
+class FakeMember:
+    def __init__(self, member_id, name, guild):
+        self.id = member_id
+        self.name = name
+        self.display_name = name
+        self.guild = guild
+        self.bot = False
+        self.mention = f"<@{member_id}>"
+        self.roles = []
+
+
+class FakeVoiceState:
+    def __init__(self, channel=None, self_mute=False, self_deaf=False):
+        self.channel = channel
+        self.self_mute = self_mute
+        self.self_deaf = self_deaf
+
+
+class SentMessage:
+    """Message enregistré, éditable comme un `discord.Message`"""
+    __slots__ = ("channel", "content", "embed", "sent_at", "edits")
+
+    def __init__(self, channel, content, embed, sent_at):
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.sent_at = sent_at
+        self.edits = 0
+
+    async def edit(self, content=None, embed=None):
+        if self.channel is not None and self.channel.latency:
+            await asyncio.sleep(self.channel.latency)
+        self.content = content
+        self.embed = embed
+        self.edits += 1
+        return self
+
+
+class FakeVoiceChannel:
+    """Salon vocal dont `send` enregistre les messages (avec une latence REST optionnelle)"""
+
+    def __init__(self, channel_id, name, guild, category=None, position=0, latency=0.0, writable=True):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.category = category
+        self.category_id = category.id if category else None
+        self.position = position
+        self.members = []
+        self.mention = f"<#{channel_id}>"
+        self.latency = latency
+        self.writable = writable
+        self.sent = []
+
+    def permissions_for(self, member):
+        return FakePermissions(send_messages=self.writable)
+
+    async def send(self, content=None, embed=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = SentMessage(self, content, embed, time.monotonic())
+        self.sent.append(message)
+        return message
+
+    def __eq__(self, other):
+        return isinstance(other, FakeVoiceChannel) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeCategoryChannel:
+    def __init__(self, category_id, name, guild, position=0):
+        self.id = category_id
+        self.name = name
+        self.guild = guild
+        self.position = position
+        self.voice_channels = []
+
+
+class FakeGuild:
+    def __init__(self, guild_id, name, me=None):
+        self.id = guild_id
+        self.name = name
+        self.me = me
+        self.categories = []
+        self.members = {}
+        self._channels = {}
+
+    def add_category(self, category_id, name):
+        category = FakeCategoryChannel(category_id, name, self, position=len(self.categories))
+        self.categories.append(category)
+        self._channels[category_id] = category
+        return category
+
+    def add_voice_channel(self, channel_id, name, category=None, latency=0.0):
+        position = len(category.voice_channels) if category else 0
+        channel = FakeVoiceChannel(channel_id, name, self, category, position, latency)
+        if category is not None:
+            category.voice_channels.append(channel)
+        self._channels[channel_id] = channel
+        return channel
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def member(self, member_id, name):
+        """Retourne le membre, créé au besoin (le nom affiché suit la trace)"""
+        member = self.members.get(member_id)
+        if member is None:
+            member = self.members[member_id] = FakeMember(member_id, name, self)
+        else:
+            member.display_name = name
+        return member
+
+    @property
+    def voice_channels(self):
+        return [c for c in self._channels.values() if isinstance(c, FakeVoiceChannel)]
+
+
+class FakeContext:
+    """Contexte de commande dont `send` enregistre les réponses"""
+
+    def __init__(self, guild, author):
+        self.guild = guild
+        self.author = author
+        self.sent = []
+
+    async def send(self, content=None, embed=None):
+        message = SentMessage(None, content, embed, time.monotonic())
+        self.sent.append(message)
+        return message
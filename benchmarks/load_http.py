@@ -0,0 +1,197 @@
+"""Test de charge des endpoints de monitoring.
+
+Compare le serveur aiohttp exécuté sur la boucle du bot (`MonitoringServer`)
+avec l'ancien serveur Flask lancé dans un thread démon. Pour chaque serveur :
+
+1. débit maximal (requêtes/s) sur `/health` ;
+2. dégradation de la latence de la boucle asyncio (représentative du
+   traitement des événements gateway) à débit fixe (500 req/s par défaut),
+   comparée à une mesure sans charge.
+
+Le générateur de charge tourne dans un processus séparé pour ne pas fausser
+la mesure. Le mode Flask nécessite `pip install flask`.
+
+Usage:
+    python benchmarks/load_http.py [--server aiohttp|flask|both] [--rps 500] [--duration 10]
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp  # noqa: E402
+
+from http_server import MonitoringServer  # noqa: E402
+
+
+class FakeUser:
+    id = 123456789
+
+
+class FakeBot:
+    """État minimal lu par les endpoints"""
+    guilds = [object()]
+    latency = 0.042
+    user = FakeUser()
+
+    def is_ready(self):
+        return True
+
+
+def start_flask_thread(bot, start_time, port):
+    """Reproduit l'ancien serveur Flask démarré dans un thread démon"""
+    import logging
+
+    from flask import Flask
+
+    app = Flask("")
+    state = {"ping_count": 0}
+
+    @app.route("/ping")
+    def ping():
+        state["ping_count"] += 1
+        return {"pong": True, "timestamp": int(time.time()), "ping_count": state["ping_count"]}
+
+    @app.route("/health")
+    def health():
+        is_healthy = bot.is_ready() and len(bot.guilds) > 0
+        return {
+            "healthy": is_healthy,
+            "bot_ready": bot.is_ready(),
+            "guilds_connected": len(bot.guilds) if bot.is_ready() else 0,
+            "latency_ms": round(bot.latency * 1000, 2) if bot.is_ready() else None,
+            "timestamp": int(time.time()),
+            "uptime_seconds": int(time.time() - start_time)
+        }, 200 if is_healthy else 503
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    thread = threading.Thread(
+        target=app.run, kwargs={"host": "127.0.0.1", "port": port, "debug": False}, daemon=True
+    )
+    thread.start()
+
+
+# --- Générateur de charge (processus séparé) ---
+
+async def _load(url, rps, duration, concurrency):
+    connector = aiohttp.TCPConnector(limit=concurrency)  # connexions keep-alive réutilisées
+    done = 0
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def worker(index):
+            nonlocal done, errors
+            # Chaque worker gère une part du débit cible
+            interval = concurrency / rps if rps else 0.0
+            next_at = time.monotonic() + index * (interval / concurrency if interval else 0.0)
+            while time.monotonic() < deadline:
+                if interval:
+                    delay = next_at - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    next_at += interval
+                try:
+                    async with session.get(url) as response:
+                        await response.read()
+                        if response.status >= 500:
+                            errors += 1
+                    done += 1
+                except aiohttp.ClientError:
+                    errors += 1
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return done, errors
+
+
+def _load_process(url, rps, duration, concurrency, results):
+    results.put(asyncio.run(_load(url, rps, duration, concurrency)))
+
+
+# --- Mesure de la latence de la boucle ---
+
+async def measure_loop_lag(duration, interval=0.005):
+    """Retard d'ordonnancement d'un `sleep(interval)` répété, en millisecondes"""
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - started - interval) * 1000)
+    return samples
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(pct / 100 * len(ordered))) - 1)]
+
+
+async def run_load(url, rps, duration, concurrency):
+    """Lance la charge dans un processus fils et mesure la boucle pendant ce temps"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_load_process, args=(url, rps, duration, concurrency, results))
+    process.start()
+    # Laisser le processus fils démarrer avant de mesurer
+    await asyncio.sleep(1.0)
+    lag = await measure_loop_lag(duration - 1.0)
+    done, errors = await asyncio.get_running_loop().run_in_executor(None, results.get)
+    process.join()
+    return done, errors, lag
+
+
+async def bench(server, args):
+    bot = FakeBot()
+    start_time = time.time()
+    port = args.port
+
+    if server == "aiohttp":
+        monitoring = MonitoringServer(bot, start_time)
+        await monitoring.start(host="127.0.0.1", port=port)
+    else:
+        start_flask_thread(bot, start_time, port)
+        await asyncio.sleep(0.5)
+
+    url = f"http://127.0.0.1:{port}{args.path}"
+    idle = await measure_loop_lag(2.0)
+
+    done, errors, _ = await run_load(url, 0, args.duration, args.concurrency)
+    max_rps = done / args.duration
+
+    done_fixed, errors_fixed, loaded = await run_load(url, args.rps, args.duration, args.concurrency)
+
+    print(f"Serveur {server} ({args.path})")
+    print(f"  débit maximal          : {max_rps:.0f} req/s ({errors} erreurs)")
+    print(f"  charge fixe            : {done_fixed / args.duration:.0f} req/s ciblées {args.rps} ({errors_fixed} erreurs)")
+    print(f"  latence boucle au repos: p50 {percentile(idle, 50):.2f} ms, p99 {percentile(idle, 99):.2f} ms")
+    print(f"  latence boucle en charge: p50 {percentile(loaded, 50):.2f} ms, p99 {percentile(loaded, 99):.2f} ms")
+
+    if server == "aiohttp":
+        await monitoring.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=("aiohttp", "flask", "both"), default="both")
+    parser.add_argument("--rps", type=int, default=500, help="débit fixe pour la mesure de latence")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    servers = ("aiohttp", "flask") if args.server == "both" else (args.server,)
+    for index, server in enumerate(servers):
+        # Un port distinct par serveur: le thread Flask ne peut pas être arrêté
+        args.port += index
+        asyncio.run(bench(server, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Rejeu hors ligne de traces d'événements vocaux à travers le gestionnaire du bot.
+
+Format de trace (JSONL, une ligne par enregistrement) :
+
+    {"type": "guild", "id": 1, "name": "Replay"}
+    {"type": "category", "guild": 1, "id": 10, "name": "「 Salons vocaux 」", "monitored": true}
+    {"type": "channel", "guild": 1, "id": 100, "name": "vocal-1", "category": 10}
+    {"type": "voice", "t": 0.125, "guild": 1, "member": 42, "name": "Alice", "before": null, "after": 100}
+
+Les enregistrements `voice` décrivent une transition d'état vocal (`before` et
+`after` sont des IDs de salons ou null) ; `t` est le temps en secondes depuis
+le début de la trace. Les champs optionnels `mute` et `deaf` décrivent l'état
+après la transition (changement de micro sans changement de salon).
+
+Le bot est importé avec une configuration temporaire (serveurs et catégories
+surveillées issus de la trace, base SQLite et instantané dans un dossier
+temporaire) et les salons simulés enregistrent les messages au lieu de les
+envoyer. Aucune connexion à Discord n'est ouverte.
+
+Usage:
+    python benchmarks/replay.py generate trace.jsonl [--events 10000] [--channels 20] ...
+    python benchmarks/replay.py run trace.jsonl [--speed 0] [--tracemalloc] [--commands 200]
+
+`--speed 0` rejoue aussi vite que possible, `--speed 1` en temps réel.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeContext, FakeGuild, FakeUser, FakeVoiceState  # noqa: E402
+
+MONITORED_CATEGORY_NAME = "「 Salons vocaux 」"
+
+
+# --- Traces ---
+
+def read_trace(path):
+    """Lit une trace: (guilds, categories, channels, events), chaque élément étant une liste de dicts"""
+    guilds, categories, channels, events = [], [], [], []
+    by_type = {"guild": guilds, "category": categories, "channel": channels, "voice": events}
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            target = by_type.get(record.get("type"))
+            if target is None:
+                raise ValueError(f"ligne {number}: type d'enregistrement inconnu {record.get('type')!r}")
+            target.append(record)
+    events.sort(key=lambda record: record["t"])
+    return guilds, categories, channels, events
+
+
+def write_trace(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+
+
+def generate_trace(events, channels, unmonitored, members, rate, flap_ratio, mute_ratio, seed):
+    """Trace synthétique: arrivées, départs, déplacements, reconnexions rapides et changements de micro"""
+    rng = random.Random(seed)
+    guild_id = 1
+    records = [
+        {"type": "guild", "id": guild_id, "name": "Replay"},
+        {"type": "category", "guild": guild_id, "id": 10, "name": MONITORED_CATEGORY_NAME, "monitored": True},
+        {"type": "category", "guild": guild_id, "id": 20, "name": "Autres", "monitored": False},
+    ]
+    channel_ids = []
+    for index in range(channels):
+        channel_id = 1000 + index
+        channel_ids.append(channel_id)
+        records.append({"type": "channel", "guild": guild_id, "id": channel_id, "name": f"vocal-{index + 1}", "category": 10})
+    for index in range(unmonitored):
+        channel_id = 2000 + index
+        channel_ids.append(channel_id)
+        records.append({"type": "channel", "guild": guild_id, "id": channel_id, "name": f"autre-{index + 1}", "category": 20})
+
+    location = {}
+    t = 0.0
+    produced = 0
+
+    def voice(member_id, before, after, **extra):
+        record = {"type": "voice", "t": round(t, 4), "guild": guild_id, "member": member_id,
+                  "name": f"membre-{member_id}", "before": before, "after": after}
+        record.update(extra)
+        records.append(record)
+
+    while produced < events:
+        t += rng.expovariate(rate)
+        member_id = 100000 + rng.randrange(members)
+        current = location.get(member_id)
+        roll = rng.random()
+        if current is None:
+            target = rng.choice(channel_ids)
+            voice(member_id, None, target)
+            location[member_id] = target
+        elif roll < flap_ratio:
+            # Connexion instable: déconnexion puis retour quelques secondes plus tard
+            voice(member_id, current, None)
+            t += rng.uniform(0.5, 5.0)
+            voice(member_id, None, current)
+            produced += 1
+        elif roll < flap_ratio + mute_ratio:
+            voice(member_id, current, current, mute=rng.random() < 0.5)
+        elif roll < 0.6:
+            voice(member_id, current, None)
+            del location[member_id]
+        else:
+            target = rng.choice(channel_ids)
+            if target == current:
+                continue
+            voice(member_id, current, target)
+            location[member_id] = target
+        produced += 1
+    return records
+
+
+# --- Rejeu ---
+
+def configure_environment(guilds, categories, workdir, args):
+    """Configuration du bot avant son import: serveurs de la trace, fichiers temporaires"""
+    config = {"guilds": {}}
+    for guild in guilds:
+        monitored = [c["id"] for c in categories if c.get("guild", guild["id"]) == guild["id"] and c.get("monitored")]
+        config["guilds"][str(guild["id"])] = {
+            "enabled": True,
+            "category_ids": monitored,
+            "category_names": [],
+            "language": guild.get("language", "fr"),
+            "embeds": bool(guild.get("embeds", False)),
+        }
+    config_path = os.path.join(workdir, "guilds.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+    os.environ.update({
+        "DISCORD_TOKEN": "replay",
+        "GUILD_ID": "",
+        "MONITORED_CATEGORY_IDS": "",
+        "GUILD_CONFIG_PATH": config_path,
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions.db"),
+        "SNAPSHOT_PATH": os.path.join(workdir, "snapshot.bin"),
+        "NOTIFY_WINDOW_SECONDS": str(args.window),
+        "NOTIFY_MAX_BATCH": str(args.max_batch),
+        "NOTIFY_WORKERS": str(args.workers),
+        "FLAP_GRACE_SECONDS": str(args.flap_grace),
+        "LOG_LEVEL": args.log_level,
+    })
+
+
+def build_guilds(guilds, categories, channels, bot_user, send_latency):
+    fakes = {}
+    for guild in guilds:
+        fakes[guild["id"]] = FakeGuild(guild["id"], guild.get("name", str(guild["id"])), me=bot_user)
+    default_guild = guilds[0]["id"]
+    category_objects = {}
+    for category in categories:
+        guild = fakes[category.get("guild", default_guild)]
+        category_objects[category["id"]] = guild.add_category(category["id"], category["name"])
+    for channel in channels:
+        guild = fakes[channel.get("guild", default_guild)]
+        guild.add_voice_channel(channel["id"], channel["name"], category_objects.get(channel.get("category")), send_latency)
+    return fakes
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def replay(bot_module, fakes, events, speed, yield_every):
+    """Rejoue les transitions et retourne (durée du rejeu, temps par cas, log compris)"""
+    per_case = {}
+    handle = bot_module.handle_voice_state_update
+    log_event = bot_module.log_voice_event
+    default_guild = next(iter(fakes))
+    states = {}
+    started = time.perf_counter()
+    for index, record in enumerate(events):
+        if speed > 0:
+            delay = record["t"] / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif index % yield_every == 0:
+            # Laisser tourner les workers d'envoi et les minuteurs
+            await asyncio.sleep(0)
+
+        guild = fakes[record.get("guild", default_guild)]
+        member = guild.member(record["member"], record.get("name", f"membre-{record['member']}"))
+        before_channel = guild.get_channel(record["before"]) if record["before"] is not None else None
+        after_channel = guild.get_channel(record["after"]) if record["after"] is not None else None
+        previous = states.get((guild.id, member.id))
+        before = previous if previous is not None and previous.channel == before_channel else FakeVoiceState(before_channel)
+        after = FakeVoiceState(after_channel, record.get("mute", False), record.get("deaf", False))
+        states[(guild.id, member.id)] = after
+
+        # Occupation des salons simulés, comme le cache de discord.py
+        if before_channel is not None and before_channel != after_channel and member in before_channel.members:
+            before_channel.members.remove(member)
+        if after_channel is not None and member not in after_channel.members:
+            after_channel.members.append(member)
+
+        t0 = time.perf_counter()
+        case = handle(member, before, after)
+        log_event(member, before, after, case, time.perf_counter() - t0)
+        elapsed = time.perf_counter() - t0
+        per_case.setdefault(case, []).append(elapsed)
+    return time.perf_counter() - started, per_case
+
+
+async def bench_commands(bot_module, fakes, iterations):
+    """Temps d'exécution des commandes de consultation sur l'état obtenu après le rejeu"""
+    guild = next(iter(fakes.values()))
+    author = next(iter(guild.members.values()), None) or guild.member(1, "auteur")
+    commands = {
+        "status": lambda ctx: bot_module.status_command.callback(ctx),
+        "channels": lambda ctx: bot_module.list_channels.callback(ctx),
+        "stats": lambda ctx: bot_module.stats_command.callback(ctx, author),
+        "top": lambda ctx: bot_module.top_command.callback(ctx),
+    }
+    results = {}
+    for name, run in commands.items():
+        timings = []
+        for _ in range(iterations):
+            ctx = FakeContext(guild, author)
+            t0 = time.perf_counter()
+            await run(ctx)
+            timings.append(time.perf_counter() - t0)
+        results[name] = timings
+    return results
+
+
+async def run(args):
+    guilds, categories, channels, events = read_trace(args.trace)
+    if not guilds:
+        raise SystemExit("❌ La trace ne décrit aucun serveur")
+    if args.limit:
+        events = events[:args.limit]
+
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    configure_environment(guilds, categories, workdir, args)
+
+    import bot as bot_module
+
+    bot_user = FakeUser(1, "ArriveesDepart")
+    bot_module.bot._connection.user = bot_user
+    fakes = build_guilds(guilds, categories, channels, bot_user, args.send_latency)
+    for guild in fakes.values():
+        bot_module.rebuild_guild(guild)
+
+    bot_module.dispatcher.start()
+    await asyncio.to_thread(bot_module.session_store.start)
+
+    gc.collect()
+    if args.tracemalloc:
+        tracemalloc.start(10)
+    blocks_before = sys.getallocatedblocks()
+    elapsed, per_case = await replay(bot_module, fakes, events, args.speed, args.yield_every)
+    blocks_after = sys.getallocatedblocks()
+    if args.tracemalloc:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    # Départs retenus et lots en attente, puis fin des envois
+    drain_started = time.perf_counter()
+    bot_module.flap_detector.flush()
+    bot_module.notifier.flush_all()
+    await bot_module.dispatcher.drain(timeout=120)
+    drained = time.perf_counter() - drain_started
+
+    sent = sum(len(channel.sent) for guild in fakes.values() for channel in guild.voice_channels)
+    edits = sum(message.edits for guild in fakes.values() for channel in guild.voice_channels for message in channel.sent)
+    handler_total = sum(sum(values) for values in per_case.values())
+
+    print(f"Trace: {args.trace}")
+    print(f"  transitions rejouées : {len(events)}")
+    print(f"  durée du rejeu       : {elapsed:.2f} s (vitesse {'max' if args.speed <= 0 else f'{args.speed}x'})")
+    print(f"  débit                : {len(events) / elapsed:.0f} événements/s")
+    print(f"  temps gestionnaire   : {handler_total * 1000:.1f} ms ({handler_total / max(1, len(events)) * 1e6:.1f} µs/événement)")
+    print(f"  messages produits    : {sent} + {edits} édition(s) (vidage final {drained:.2f} s)")
+    print(f"  événements annulés   : {bot_module.notifier.events_cancelled}")
+    print(f"  notifications        : {bot_module.dispatcher.merged} fusionnée(s), {bot_module.dispatcher.expired} expirée(s)")
+    print(f"  reconnexions         : {bot_module.flap_detector.reconnects}")
+    print(f"  blocs alloués (net)  : {blocks_after - blocks_before:+d}")
+    print("  temps par cas:")
+    for case, values in sorted(per_case.items(), key=lambda item: -len(item[1])):
+        print(
+            f"    {case:<9} n={len(values):<7} moyenne {sum(values) / len(values) * 1e6:7.1f} µs  "
+            f"p50 {percentile(values, 50) * 1e6:7.1f} µs  p99 {percentile(values, 99) * 1e6:7.1f} µs"
+        )
+
+    if args.tracemalloc:
+        print(f"  tracemalloc: pic {peak / 1024:.0f} Kio, principales allocations restantes:")
+        for stat in snapshot.statistics("lineno")[:args.top_allocations]:
+            print(f"    {stat.count:>7} blocs {stat.size / 1024:8.1f} Kio  {stat.traceback[0]}")
+
+    if args.commands:
+        print(f"  commandes ({args.commands} exécutions chacune):")
+        for name, timings in (await bench_commands(bot_module, fakes, args.commands)).items():
+            print(f"    !{name:<9} p50 {percentile(timings, 50) * 1000:6.2f} ms  p99 {percentile(timings, 99) * 1000:6.2f} ms")
+
+    await asyncio.to_thread(bot_module.session_store.close)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="génère une trace synthétique")
+    gen.add_argument("trace")
+    gen.add_argument("--events", type=int, default=10000)
+    gen.add_argument("--channels", type=int, default=20, help="salons surveillés")
+    gen.add_argument("--unmonitored", type=int, default=5, help="salons non surveillés")
+    gen.add_argument("--members", type=int, default=500)
+    gen.add_argument("--rate", type=float, default=20.0, help="événements par seconde (en moyenne)")
+    gen.add_argument("--flap-ratio", type=float, default=0.1, help="part de reconnexions rapides")
+    gen.add_argument("--mute-ratio", type=float, default=0.15, help="part de changements de micro")
+    gen.add_argument("--seed", type=int, default=42)
+
+    run_parser = sub.add_parser("run", help="rejoue une trace")
+    run_parser.add_argument("trace")
+    run_parser.add_argument("--speed", type=float, default=0.0, help="0 = aussi vite que possible, 1 = temps réel")
+    run_parser.add_argument("--limit", type=int, default=0, help="nombre maximal de transitions")
+    run_parser.add_argument("--window", type=float, default=2.0)
+    run_parser.add_argument("--max-batch", type=int, default=25)
+    run_parser.add_argument("--workers", type=int, default=4)
+    run_parser.add_argument("--flap-grace", type=float, default=10.0)
+    run_parser.add_argument("--send-latency", type=float, default=0.0, help="latence simulée de channel.send (s)")
+    run_parser.add_argument("--yield-every", type=int, default=100, help="à vitesse max, rend la main à la boucle tous les N événements")
+    run_parser.add_argument("--tracemalloc", action="store_true", help="détail des allocations (ralentit le rejeu)")
+    run_parser.add_argument("--top-allocations", type=int, default=10)
+    run_parser.add_argument("--commands", type=int, default=0, help="exécutions de chaque commande après le rejeu")
+    run_parser.add_argument("--log-level", default="WARNING", help="INFO pour mesurer le coût des logs par événement")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        records = generate_trace(
+            args.events, args.channels, args.unmonitored, args.members,
+            args.rate, args.flap_ratio, args.mute_ratio, args.seed
+        )
+        write_trace(args.trace, records)
+        print(f"✅ {sum(1 for r in records if r['type'] == 'voice')} transitions écrites dans {args.trace}")
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
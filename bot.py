@@ -1,99 +1,60 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
 import os
 from dotenv import load_dotenv
 from datetime import datetime
 import asyncio
 import logging
-from threading import Thread
-from flask import Flask
 import time
 import json
+from typing import Union
 
-# Configuration du logging sécurisé
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+import notifications
+import metrics
+from channel_index import MonitoredChannelIndex
+from guild_config import GuildConfig, GuildConfigStore, DEFAULT_CATEGORY_NAME, LANGUAGES
+from http_server import MonitoringServer, format_uptime
+from session_store import SessionStore, format_duration
+from dispatcher import Notification, NotificationDispatcher, message_payload
+from templates import TemplateCache, escape_name
+from flap import FlapDetector, POLICIES as FLAP_POLICIES
+from occupancy import OccupancyTracker
+from log_pipeline import parse_spec, setup_logging
+from member_cache import NameCache, client_options
+from slash_commands import ResponseCache, sync_command_tree
+from supervisor import LoopLagMonitor, Supervisor
+from broker import BrokerPublisher, parse_url
+from preferences import PreferenceStore, flag_names, OPT_OUT, JOIN_ONLY, SILENT_MOVES
+import snapshot
+import activity
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Configuration du logging sécurisé: écriture dans un thread dédié, texte ou JSON (LOG_FORMAT),
+# échantillonnage (LOG_SAMPLE=voice=0.1) et plafond par seconde (LOG_RATE_LIMIT=voice=20) par type d'événement
+try:
+    log_listener, log_sampling = setup_logging(
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        fmt=os.getenv('LOG_FORMAT', 'text'),
+        sample_rates=parse_spec(os.getenv('LOG_SAMPLE', ''), float),
+        rate_caps=parse_spec(os.getenv('LOG_RATE_LIMIT', ''), int)
+    )
+    log_config_error = None
+except ValueError as e:
+    log_listener, log_sampling = setup_logging()
+    log_config_error = e
 logger = logging.getLogger(__name__)
+# Une ligne structurée par événement vocal traité
+voice_logger = logging.getLogger('bot.voice')
 
-# Serveur web optimisé pour uptime
-app = Flask('')
+if log_config_error is not None:
+    logger.error("❌ ERREUR: LOG_LEVEL, LOG_SAMPLE ou LOG_RATE_LIMIT invalide: %s", log_config_error)
+    exit(1)
 
 # Variables pour le monitoring
 start_time = time.time()
-ping_count = 0
-
-@app.route('/')
-def home():
-    return "Bot Discord Arrivées/Départ est en ligne !"
-
-@app.route('/ping')
-def ping():
-    """Endpoint ultra-rapide pour uptime monitoring"""
-    global ping_count
-    ping_count += 1
-    return {"pong": True, "timestamp": int(time.time()), "ping_count": ping_count}
-
-@app.route('/status')
-def status():
-    """Endpoint détaillé avec informations complètes"""
-    global ping_count
-    ping_count += 1
-    uptime = int(time.time() - start_time)
-    
-    # Vérifier l'état du bot
-    bot_status = "online" if bot.is_ready() else "connecting"
-    guild_count = len(bot.guilds) if bot.is_ready() else 0
-    
-    return {
-        "status": bot_status,
-        "bot": "discord-arrivees-depart", 
-        "uptime_seconds": uptime,
-        "uptime_formatted": f"{uptime // 3600}h {(uptime % 3600) // 60}m {uptime % 60}s",
-        "ping_count": ping_count,
-        "guilds": guild_count,
-        "timestamp": int(time.time()),
-        "user_id": str(bot.user.id) if bot.user else None,
-        "latency_ms": round(bot.latency * 1000, 2) if bot.is_ready() else None
-    }
-
-@app.route('/health')
-def health():
-    """Vérification de santé détaillée"""
-    try:
-        is_healthy = bot.is_ready() and len(bot.guilds) > 0
-        
-        response_data = {
-            "healthy": is_healthy,
-            "bot_ready": bot.is_ready(),
-            "guilds_connected": len(bot.guilds) if bot.is_ready() else 0,
-            "latency_ms": round(bot.latency * 1000, 2) if bot.is_ready() else None,
-            "timestamp": int(time.time()),
-            "uptime_seconds": int(time.time() - start_time)
-        }
-        
-        return response_data, 200 if is_healthy else 503
-        
-    except Exception as e:
-        logger.error(f"Health check error: {e}")
-        return {"healthy": False, "error": "Health check failed", "timestamp": int(time.time())}, 503
-
-def run_flask():
-    port = int(os.environ.get('PORT', 8080))
-    # Désactiver les logs Flask pour éviter le spam
-    log = logging.getLogger('werkzeug')
-    log.setLevel(logging.WARNING)
-    
-    app.run(host='0.0.0.0', port=port, debug=False)
-
-def keep_alive():
-    t = Thread(target=run_flask)
-    t.daemon = True
-    t.start()
-
-# Charger les variables d'environnement
-load_dotenv()
 
 # Configuration SÉCURISÉE - Jamais de tokens en dur !
 TOKEN = os.getenv('DISCORD_TOKEN')
@@ -105,290 +66,932 @@ if not TOKEN:
     logger.error("Créez un fichier .env avec: DISCORD_TOKEN=votre_token_ici")
     exit(1)
 
-if not GUILD_ID:
-    logger.error("❌ ERREUR CRITIQUE: GUILD_ID non trouvé dans les variables d'environnement!")
-    logger.error("Ajoutez dans .env: GUILD_ID=votre_id_serveur")
+try:
+    GUILD_ID = int(GUILD_ID) if GUILD_ID else None
+except ValueError:
+    logger.error("❌ ERREUR: GUILD_ID doit être un nombre!")
     exit(1)
 
+# Catégories surveillées du serveur GUILD_ID, configurées par ID (ex: MONITORED_CATEGORY_IDS=123,456)
 try:
-    GUILD_ID = int(GUILD_ID)
+    MONITORED_CATEGORY_IDS = [int(x) for x in os.getenv('MONITORED_CATEGORY_IDS', '').split(',') if x.strip()]
 except ValueError:
-    logger.error("❌ ERREUR: GUILD_ID doit être un nombre!")
+    logger.error("❌ ERREUR: MONITORED_CATEGORY_IDS doit être une liste d'IDs séparés par des virgules!")
     exit(1)
 
-# Configuration des intents
-intents = discord.Intents.default()
-intents.voice_states = True
-intents.guilds = True
-intents.members = True
-intents.message_content = True
+# Configuration par serveur (catégories, modèles, activation, langue)
+GUILD_CONFIG_PATH = os.getenv('GUILD_CONFIG_PATH', 'guilds.json')
+try:
+    CONFIG_RELOAD_SECONDS = float(os.getenv('CONFIG_RELOAD_SECONDS', '10'))
+except ValueError:
+    logger.error("❌ ERREUR: CONFIG_RELOAD_SECONDS doit être un nombre!")
+    exit(1)
+
+# AUTO_SHARD=1 pour répartir les serveurs sur plusieurs shards (grands déploiements)
+AUTO_SHARD = os.getenv('AUTO_SHARD', '0').lower() in ('1', 'true', 'yes')
+
+# Résumé quotidien de l'activité vocale: heure d'envoi (HH:MM, UTC), salon texte du serveur GUILD_ID,
+# cases horaires en cours enregistrées toutes les ACTIVITY_FLUSH_SECONDS dans ACTIVITY_PATH
+try:
+    digest_hour, digest_minute = (int(x) for x in os.getenv('DIGEST_TIME', '09:00').split(':'))
+    if not (0 <= digest_hour < 24 and 0 <= digest_minute < 60):
+        raise ValueError
+    DIGEST_TIME_SECONDS = digest_hour * 3600 + digest_minute * 60
+    DIGEST_CHANNEL_ID = int(os.getenv('DIGEST_CHANNEL_ID') or 0) or None
+    ACTIVITY_FLUSH_SECONDS = float(os.getenv('ACTIVITY_FLUSH_SECONDS', '300'))
+except ValueError:
+    logger.error("❌ ERREUR: DIGEST_TIME doit être au format HH:MM, DIGEST_CHANNEL_ID et ACTIVITY_FLUSH_SECONDS des nombres!")
+    exit(1)
+ACTIVITY_PATH = os.getenv('ACTIVITY_PATH', 'voice_activity.bin')
+
+# Le serveur GUILD_ID (mono-serveur historique) sert de configuration par défaut
+default_configs = []
+if GUILD_ID:
+    if not MONITORED_CATEGORY_IDS:
+        logger.warning('⚠️ MONITORED_CATEGORY_IDS non défini, repli sur la catégorie "%s"', DEFAULT_CATEGORY_NAME)
+    default_configs.append(GuildConfig(
+        GUILD_ID,
+        category_ids=MONITORED_CATEGORY_IDS,
+        category_names=() if MONITORED_CATEGORY_IDS else (DEFAULT_CATEGORY_NAME,),
+        digest_channel_id=DIGEST_CHANNEL_ID
+    ))
+
+guild_configs = GuildConfigStore(GUILD_CONFIG_PATH, defaults=default_configs)
+try:
+    guild_configs.load()
+except (OSError, ValueError, TypeError, AttributeError) as e:
+    logger.error("❌ ERREUR: configuration des serveurs illisible (%s): %s", GUILD_CONFIG_PATH, e)
+    exit(1)
+
+if not guild_configs.enabled_ids:
+    logger.error("❌ ERREUR CRITIQUE: aucun serveur autorisé!")
+    logger.error("Ajoutez dans .env: GUILD_ID=votre_id_serveur, ou configurez les serveurs dans %s", GUILD_CONFIG_PATH)
+    exit(1)
+
+# Préférences de notification par membre et par salon (/notify)
+preferences = PreferenceStore(os.getenv('PREFERENCES_PATH', 'preferences.json'))
+try:
+    preferences.load()
+except (OSError, ValueError, AttributeError) as e:
+    logger.error("❌ ERREUR: préférences de notification illisibles (%s): %s", preferences.path, e)
+    exit(1)
+
+# Regroupement des notifications (fenêtre en secondes, taille maximale d'un lot)
+try:
+    NOTIFY_WINDOW_SECONDS = float(os.getenv('NOTIFY_WINDOW_SECONDS', '2'))
+    NOTIFY_MAX_BATCH = int(os.getenv('NOTIFY_MAX_BATCH', '25'))
+    NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', '4'))
+    NOTIFY_QUEUE_SIZE = int(os.getenv('NOTIFY_QUEUE_SIZE', '1000'))
+    NOTIFY_TTL_SECONDS = float(os.getenv('NOTIFY_TTL_SECONDS', '60'))
+except ValueError:
+    logger.error("❌ ERREUR: NOTIFY_WINDOW_SECONDS, NOTIFY_MAX_BATCH, NOTIFY_WORKERS, NOTIFY_QUEUE_SIZE et NOTIFY_TTL_SECONDS doivent être des nombres!")
+    exit(1)
+
+# Envoi par des processus séparés (worker.py), répartis par salon: adresses des workers séparées par des virgules
+# (ex: NOTIFICATION_WORKERS=unix:///run/bot/worker-0.sock,unix:///run/bot/worker-1.sock). Vide: envoi dans ce processus
+NOTIFICATION_WORKER_URLS = [url.strip() for url in os.getenv('NOTIFICATION_WORKERS', '').split(',') if url.strip()]
+try:
+    for url in NOTIFICATION_WORKER_URLS:
+        parse_url(url)
+except ValueError as e:
+    logger.error("❌ ERREUR: NOTIFICATION_WORKERS invalide: %s", e)
+    exit(1)
+
+# Reconnexions rapides: délai de grâce avant d'annoncer une déconnexion, puis politique
+# d'annonce du retour (notice: une annonce « reconnecté » par fenêtre, silent: aucune)
+try:
+    FLAP_GRACE_SECONDS = float(os.getenv('FLAP_GRACE_SECONDS', '10'))
+    FLAP_WINDOW_SECONDS = float(os.getenv('FLAP_WINDOW_SECONDS', '60'))
+except ValueError:
+    logger.error("❌ ERREUR: FLAP_GRACE_SECONDS et FLAP_WINDOW_SECONDS doivent être des nombres!")
+    exit(1)
+FLAP_POLICY = os.getenv('FLAP_POLICY', 'notice')
+if FLAP_POLICY not in FLAP_POLICIES:
+    logger.error("❌ ERREUR: FLAP_POLICY doit valoir %s!", ' ou '.join(FLAP_POLICIES))
+    exit(1)
+
+# Base SQLite des sessions vocales (!stats, !top)
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'voice_sessions.db')
+
+# Instantané de l'occupation des salons, pour la réconciliation au redémarrage
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'voice_snapshot.bin')
+try:
+    SNAPSHOT_INTERVAL_SECONDS = float(os.getenv('SNAPSHOT_INTERVAL_SECONDS', '30'))
+    SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv('SNAPSHOT_MAX_AGE_SECONDS', '900'))
+except ValueError:
+    logger.error("❌ ERREUR: SNAPSHOT_INTERVAL_SECONDS et SNAPSHOT_MAX_AGE_SECONDS doivent être des nombres!")
+    exit(1)
+
+# LEAN_MEMBER_CACHE=1: seuls les membres présents en vocal sont gardés en cache (gros serveurs)
+LEAN_MEMBER_CACHE = os.getenv('LEAN_MEMBER_CACHE', '0').lower() in ('1', 'true', 'yes')
+# Commandes slash par défaut ; PREFIX_COMMANDS=1 réactive les commandes `!` (et la réception des messages)
+PREFIX_COMMANDS = os.getenv('PREFIX_COMMANDS', '0').lower() in ('1', 'true', 'yes')
+
+# Réponses des commandes slash réutilisées pendant SLASH_CACHE_SECONDS ; version de l'arbre
+# des commandes déjà synchronisée avec Discord (pas de resynchronisation à chaque démarrage)
+try:
+    SLASH_CACHE_SECONDS = float(os.getenv('SLASH_CACHE_SECONDS', '5'))
+except ValueError:
+    logger.error("❌ ERREUR: SLASH_CACHE_SECONDS doit être un nombre!")
+    exit(1)
+COMMAND_SYNC_PATH = os.getenv('COMMAND_SYNC_PATH', 'command_tree.json')
+
+# Supervision: retard de boucle au-delà duquel /health répond 503, blocage journalisé avec sa pile,
+# délai maximal entre deux redémarrages du client, temps laissé aux envois en attente lors d'un arrêt
+try:
+    LOOP_LAG_THRESHOLD_SECONDS = float(os.getenv('LOOP_LAG_THRESHOLD_SECONDS', '1'))
+    LOOP_STALL_SECONDS = float(os.getenv('LOOP_STALL_SECONDS', '10'))
+    RESTART_MAX_DELAY_SECONDS = float(os.getenv('RESTART_MAX_DELAY_SECONDS', '60'))
+    SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', '15'))
+except ValueError:
+    logger.error("❌ ERREUR: LOOP_LAG_THRESHOLD_SECONDS, LOOP_STALL_SECONDS, RESTART_MAX_DELAY_SECONDS et SHUTDOWN_DRAIN_SECONDS doivent être des nombres!")
+    exit(1)
+
+# Configuration des intents et du cache des membres
+cache_options = client_options(lean=LEAN_MEMBER_CACHE, prefix_commands=PREFIX_COMMANDS)
+
+# Modèles de messages compilés par serveur (invalidés quand sa configuration change)
+message_templates = TemplateCache(guild_configs.get)
+
+def notification_payload(channel, content):
+    """Arguments de `send`/`edit`: texte brut ou embed selon le serveur"""
+    return message_payload(content, message_templates.get(channel.guild.id).embeds)
+
+async def timed_request(channel, request):
+    """Attend une requête REST d'envoi ou d'édition en mesurant sa latence et ses échecs"""
+    started = time.perf_counter()
+    try:
+        return await request
+    except discord.HTTPException as e:
+        # Chaque 429 est déjà compté par RateLimitLogHandler: ici, seulement ceux qui remontent jusqu'à l'envoi
+        metrics.SEND_FAILURES.inc(channel.id)
+        if e.status == 429:
+            metrics.RATE_LIMIT_FAILURES.inc()
+        raise
+    except discord.RateLimited:
+        metrics.SEND_FAILURES.inc(channel.id)
+        metrics.RATE_LIMIT_FAILURES.inc()
+        raise
+    except Exception:
+        metrics.SEND_FAILURES.inc(channel.id)
+        raise
+    finally:
+        metrics.SEND_LATENCY.observe(time.perf_counter() - started, channel.id)
+
+async def send_notification(channel, content):
+    """Envoie une notification regroupée dans un salon vocal et retourne le message"""
+    message = await timed_request(channel, channel.send(**notification_payload(channel, content)))
+    logger.info("✅ Notification envoyée dans %s", channel.name, extra={"event": "notification_sent", "channel_id": channel.id})
+    return message
+
+async def edit_notification(message, content):
+    """Complète la dernière notification d'un salon saturé"""
+    channel = message.channel
+    await timed_request(channel, message.edit(**notification_payload(channel, content)))
+    logger.info("✏️ Notification complétée dans %s", channel.name, extra={"event": "notification_edited", "channel_id": channel.id})
+
+# Ordonnanceur d'envoi : le gestionnaire d'événements ne fait que mettre en file.
+# Avec NOTIFICATION_WORKERS, les messages sont transmis aux workers, qui les ordonnancent et les envoient
+if NOTIFICATION_WORKER_URLS:
+    dispatcher = BrokerPublisher(
+        NOTIFICATION_WORKER_URLS,
+        embeds=lambda channel: message_templates.get(channel.guild.id).embeds,
+        queue_size=NOTIFY_QUEUE_SIZE,
+        ttl=NOTIFY_TTL_SECONDS
+    )
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        "notification_broker_reconnects_total", "Reconnexions aux workers d'envoi", lambda: dispatcher.reconnects, kind="counter"
+    ))
+else:
+    dispatcher = NotificationDispatcher(
+        send_notification,
+        workers=NOTIFY_WORKERS,
+        queue_size=NOTIFY_QUEUE_SIZE,
+        latency_observer=metrics.DELIVERY_LATENCY.observe,
+        edit=edit_notification,
+        ttl=NOTIFY_TTL_SECONDS
+    )
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        "notification_edits_total", "Notifications ajoutées au dernier message d'un salon saturé", lambda: dispatcher.edits, kind="counter"
+    ))
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        "notification_merged_total", "Notifications fusionnées dans un même envoi", lambda: dispatcher.merged, kind="counter"
+    ))
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "notification_queue_depth", "Notifications en attente d'envoi", dispatcher.depth
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "notification_dropped_total", "Notifications abandonnées (file pleine)", lambda: dispatcher.dropped, kind="counter"
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "log_records_dropped_total", "Logs écartés par échantillonnage ou plafond de débit", lambda: log_sampling.dropped, kind="counter"
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "notification_expired_total", "Notifications abandonnées car trop anciennes", lambda: dispatcher.expired, kind="counter"
+))
+
+# Les 429 réessayés en interne par discord.py ne remontent qu'à travers ses logs: ses WARNING
+# doivent être produits même avec LOG_LEVEL=ERROR (la sortie garde le niveau configuré)
+http_logger = logging.getLogger('discord.http')
+http_logger.setLevel(min(logging.WARNING, http_logger.getEffectiveLevel()))
+http_logger.addHandler(metrics.RateLimitLogHandler(level=logging.WARNING))
+
+notifier = notifications.NotificationCoalescer(
+    dispatcher.submit,
+    window=NOTIFY_WINDOW_SECONDS,
+    max_batch=NOTIFY_MAX_BATCH,
+    templates_lookup=message_templates.get
+)
+
+# Index des salons surveillés (tous serveurs), construit dans on_ready
+channel_index = MonitoredChannelIndex(
+    lambda guild_id: guild_configs.get(guild_id) if guild_configs.is_enabled(guild_id) else None
+)
+
+# Occupation des salons surveillés, tenue à jour par le gestionnaire vocal
+occupancy = OccupancyTracker()
+
+# Embeds de !status et !channels: {(commande, guild_id): (clé de version, embed)}
+embed_cache = {}
+
+# Activité vocale par salon et par heure, pour le résumé quotidien
+voice_activity = activity.ActivityAggregator()
+
+# Réponses éphémères des commandes slash: {(commande, guild_id): embed}, durée de vie courte
+response_cache = ResponseCache(ttl=SLASH_CACHE_SECONDS)
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "slash_response_cache_hits_total", "Réponses de commandes slash servies depuis le cache", lambda: response_cache.hits, kind="counter"
+))
+
+# Noms des membres vus en vocal (repli quand ils ne sont plus dans le cache de discord.py)
+name_cache = NameCache()
+
+# Sessions vocales: écritures par lots dans un thread dédié
+session_store = SessionStore(SESSION_DB_PATH)
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "session_writes_pending", "Sessions vocales terminées en attente d'écriture en base", session_store.pending
+))
+
+def release_leave(member, channel, left_at):
+    """Traite une déconnexion retenue dont le délai de grâce a expiré"""
+    current = session_store.current_session(member.guild.id, member.id)
+    if current is not None and current[0] == channel.id:
+        session_store.close_session(member.guild.id, member.id, left_at)
+    push_notification(channel, notifications.LEAVE, member)
+
+# Déconnexions retenues pendant le délai de grâce (une seule roue de minuteurs)
+flap_detector = FlapDetector(
+    release_leave,
+    grace=FLAP_GRACE_SECONDS,
+    window=FLAP_WINDOW_SECONDS,
+    policy=FLAP_POLICY
+)
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "voice_leaves_held", "Déconnexions retenues en attente d'un éventuel retour", flap_detector.pending
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "voice_reconnects_total", "Reconnexions rapides absorbées", lambda: flap_detector.reconnects, kind="counter"
+))
+
+BotBase = commands.AutoShardedBot if AUTO_SHARD else commands.Bot
+
+class ArriveesDepartBot(BotBase):
+    """Bot avec démarrage et arrêt propre du pipeline de notifications"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # on_ready est rejoué à chaque reconnexion complète
+        self.ready_once = False
+        # Positionné après la première réconciliation (avant, l'instantané sur disque fait foi)
+        self.reconciled = asyncio.Event()
+        # Tâches de fond de cette session du client, annulées à sa fermeture
+        self.background_tasks = set()
+        # Positionné au début de close(): les événements vocaux suivants sont ignorés
+        self.shutting_down = False
+
+    def clear(self):
+        """Réinitialise le client avant un redémarrage par le superviseur (reprise comme au démarrage)"""
+        super().clear()
+        self.ready_once = False
+        self.reconciled = asyncio.Event()
+        self.shutting_down = False
+
+    def start_background(self, coro):
+        task = self.loop.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def setup_hook(self):
+        dispatcher.start()
+        data = await asyncio.to_thread(activity.read, ACTIVITY_PATH)
+        if data is not None:
+            try:
+                voice_activity.decode(data)
+            except ValueError as e:
+                logger.error("❌ Activité vocale enregistrée illisible (%s): %s", ACTIVITY_PATH, e)
+            if voice_activity.skipped_since is not None:
+                logger.warning("⚠️ Résumé quotidien manqué pendant l'arrêt: nouvelle période d'activité vocale")
+        await asyncio.to_thread(session_store.start)
+        loaded = await session_store.load_recent()
+        logger.info("🗄️ Sessions vocales: %s membre(s) récent(s) chargé(s)", loaded)
+        self.start_background(sample_gateway_latency())
+        self.start_background(persist_snapshots())
+        self.start_background(persist_activity())
+        self.start_background(post_daily_digests())
+        self.start_background(watch_guild_configs())
+        try:
+            await sync_command_tree(self.tree, self.application_id, COMMAND_SYNC_PATH)
+        except discord.HTTPException as e:
+            logger.error("❌ Erreur synchronisation des commandes slash: %s", e)
+
+    async def close(self):
+        # Plus aucun événement vocal n'est traité: ceux reçus pendant l'arrêt seraient annoncés après la fermeture
+        # de la file et enregistrés après celle de la base. L'instantané écrit ci-dessous les laisse à la
+        # réconciliation du prochain démarrage, qui annonce les changements manqués
+        self.shutting_down = True
+        for task in list(self.background_tasks):
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        # Annoncer les départs retenus, vider les lots puis laisser les workers terminer leurs envois
+        flap_detector.flush()
+        notifier.flush_all()
+        await dispatcher.drain(timeout=SHUTDOWN_DRAIN_SECONDS)
+        # Les sessions en cours sont conservées dans l'instantané et reprises au redémarrage
+        if self.reconciled.is_set():
+            await asyncio.to_thread(snapshot.save, SNAPSHOT_PATH, session_store.snapshot_entries(), time.time())
+        await asyncio.to_thread(session_store.close)
+        voice_activity.flush()
+        await asyncio.to_thread(activity.save, ACTIVITY_PATH, voice_activity.encode())
+        await super().close()
 
 # Créer le bot avec configuration sécurisée
-bot = commands.Bot(
+bot = ArriveesDepartBot(
     command_prefix='!',
-    intents=intents,
     help_command=None,  # Désactiver la commande help par défaut
-    max_messages=1000   # Limiter le cache des messages
+    max_ratelimit_timeout=30.0,  # Au-delà, RateLimited est levée et l'ordonnanceur suspend le salon
+    **cache_options
 )
 
-def validate_guild(guild_id):
-    """Valide que l'ID du serveur est autorisé"""
-    return guild_id == GUILD_ID
+# Retard de la boucle asyncio (exposé par /health et /metrics)
+loop_monitor = LoopLagMonitor(stall_after=LOOP_STALL_SECONDS, observer=metrics.LOOP_LAG.observe)
 
-def validate_category(category_name):
-    """Valide que la catégorie est autorisée"""
-    return category_name == "「 Salons vocaux 」"
+# Relance le client s'il meurt, arrêt propre sur SIGTERM
+bot_supervisor = Supervisor(bot, TOKEN, max_delay=RESTART_MAX_DELAY_SECONDS)
 
-def find_text_channel_for_voice(voice_channel):
-    """Trouve le salon où envoyer les notifications - utilise directement le salon vocal"""
-    if not voice_channel or not voice_channel.guild:
-        return None
+# Endpoints de monitoring (/, /ping, /status, /health, /metrics), actifs aussi pendant un redémarrage du client
+monitoring = MonitoringServer(
+    bot,
+    start_time,
+    status_extras=lambda: {"notifications": dispatcher.stats(), "voice": occupancy.summary()},
+    registry=metrics.REGISTRY,
+    loop_monitor=loop_monitor,
+    lag_threshold=LOOP_LAG_THRESHOLD_SECONDS
+)
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "event_loop_stalls_total", "Blocages de la boucle asyncio détectés par le watchdog", lambda: loop_monitor.stalls, kind="counter"
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "bot_restarts_total", "Redémarrages du client Discord après une erreur", lambda: bot_supervisor.restarts, kind="counter"
+))
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "gateway_latency_current_seconds",
+    "Dernière latence connue de la gateway Discord",
+    lambda: bot.latency if bot.is_ready() else 0.0
+))
+
+async def persist_snapshots():
+    """Écrit périodiquement l'occupation des salons surveillés si elle a changé"""
+    await bot.reconciled.wait()
+    last_changes = None
+    while not bot.is_closed():
+        if session_store.changes != last_changes:
+            last_changes = session_store.changes
+            try:
+                await asyncio.to_thread(snapshot.save, SNAPSHOT_PATH, session_store.snapshot_entries(), time.time())
+            except OSError as e:
+                logger.error("❌ Erreur écriture de l'instantané vocal: %s", e)
+        await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+
+async def persist_activity():
+    """Compte le temps passé en vocal jusqu'à maintenant et enregistre les cases horaires en cours"""
+    await bot.reconciled.wait()
+    while not bot.is_closed():
+        await asyncio.sleep(ACTIVITY_FLUSH_SECONDS)
+        if voice_activity.expire_period():
+            logger.warning("⚠️ Résumé quotidien manqué: nouvelle période d'activité vocale")
+        voice_activity.flush()
+        try:
+            await asyncio.to_thread(activity.save, ACTIVITY_PATH, voice_activity.encode())
+        except OSError as e:
+            logger.error("❌ Erreur écriture de l'activité vocale: %s", e)
+
+def next_digest_time(now):
+    """Prochaine heure d'envoi du résumé (DIGEST_TIME, UTC), strictement après `now`"""
+    day_start = now - now % 86400
+    next_digest = day_start + DIGEST_TIME_SECONDS
+    if next_digest <= now:
+        next_digest += 86400
+    return next_digest
+
+async def post_daily_digests():
+    """Envoie chaque jour le résumé d'activité des serveurs qui ont un salon de résumé, puis ouvre une nouvelle période"""
+    await bot.reconciled.wait()
+    target = next_digest_time(time.time())
+    while not bot.is_closed():
+        # L'horloge a pu reculer pendant l'attente: on attend l'heure visée, pas seulement sa durée
+        while (remaining := target - time.time()) > 0:
+            await asyncio.sleep(remaining)
+        # Période de plus de 24 h (processus suspendu): ses cases ne sont plus fiables
+        voice_activity.expire_period()
+        for guild in bot.guilds:
+            config = guild_configs.get(guild.id)
+            if not validate_guild(guild.id) or config.digest_channel_id is None:
+                continue
+            channel = guild.get_channel(config.digest_channel_id)
+            if channel is None:
+                logger.warning("⚠️ %s: salon du résumé quotidien introuvable (%s)", guild.name, config.digest_channel_id)
+                continue
+            started = time.perf_counter()
+            embed = build_digest_embed(guild)
+            elapsed = (time.perf_counter() - started) * 1000
+            try:
+                await channel.send(embed=embed)
+                logger.info("📰 Résumé quotidien envoyé dans %s (calculé en %.1f ms)", channel.name, elapsed)
+            except discord.HTTPException as e:
+                logger.error("❌ Erreur envoi du résumé quotidien dans %s: %s", channel.id, e)
+        voice_activity.rollover()
+        try:
+            await asyncio.to_thread(activity.save, ACTIVITY_PATH, voice_activity.encode())
+        except OSError as e:
+            logger.error("❌ Erreur écriture de l'activité vocale: %s", e)
+        # Calculé depuis l'heure visée: un recul de l'horloge ne déclenche pas un second résumé le même jour
+        target = next_digest_time(max(time.time(), target))
+
+def apply_config_changes(changed_ids):
+    """Invalide l'index et les modèles des serveurs dont la configuration a changé"""
+    for guild_id in changed_ids:
+        message_templates.invalidate(guild_id)
+        response_cache.invalidate(("status", guild_id))
+        response_cache.invalidate(("channels", guild_id))
+        guild = bot.get_guild(guild_id)
+        if guild is None:
+            continue
+        if validate_guild(guild_id):
+            rebuild_guild(guild)
+            logger.info("⚙️ Configuration rechargée pour %s: %s salon(s) surveillé(s)", guild.name, channel_index.channel_count(guild_id))
+        else:
+            forget_guild(guild_id)
+            logger.info("⚙️ Notifications désactivées pour %s", guild.name)
+
+async def watch_guild_configs():
+    """Recharge la configuration des serveurs quand le fichier est modifié"""
+    await bot.wait_until_ready()
+    while not bot.is_closed():
+        await asyncio.sleep(CONFIG_RELOAD_SECONDS)
+        changed = await asyncio.to_thread(guild_configs.reload_if_changed)
+        apply_config_changes(changed)
+
+async def reconcile_voice_state(guild, first_ready, taken_at=None, entries=()):
+    """Compare l'état connu avec les salons réels et annonce les changements manqués.
     
-    guild = voice_channel.guild
+    Au démarrage, l'état connu est l'instantané sur disque (`taken_at`,
+    `entries`) ; lors d'une reconnexion, ce sont les sessions en mémoire. Au
+    plus un message récapitulatif est envoyé par salon.
+    """
+    now = time.time()
+    if first_ready:
+        previous = {
+            (guild_id, member_id): (channel_id, started_at)
+            for guild_id, channel_id, member_id, started_at in entries
+            if guild_id == guild.id
+        }
+    else:
+        taken_at = now
+        previous = {key: value for key, value in session_store.open_sessions.items() if key[0] == guild.id}
     
-    # Validation de sécurité
-    if not validate_guild(guild.id):
-        logger.warning(f"⚠️ Tentative d'accès depuis un serveur non autorisé: {guild.id}")
-        return None
+    current = {}
+    for vc in channel_index.channels(guild):
+        for m in vc.members:
+            current[(guild.id, m.id)] = vc.id
+            name_cache.remember(guild.id, m.id, m.display_name)
     
-    # Vérifier que le salon vocal est bien dans la catégorie autorisée
-    if not voice_channel.category or not validate_category(voice_channel.category.name):
-        return None
+    stale = taken_at is None or now - taken_at > SNAPSHOT_MAX_AGE_SECONDS
+    if first_ready and stale:
+        # Instantané trop ancien: toutes les sessions sont closes à sa date et rouvertes maintenant
+        _, left, _ = snapshot.diff_occupancy(previous, {})
+        joined, _, _ = snapshot.diff_occupancy({}, current)
+        kept = []
+    else:
+        joined, left, kept = snapshot.diff_occupancy(previous, current)
     
-    # Vérifier que le bot peut envoyer des messages dans ce salon vocal
-    if voice_channel.permissions_for(guild.me).send_messages:
-        logger.info(f"✅ Utilisation directe du salon vocal: {voice_channel.name} (ID: {voice_channel.id})")
-        return voice_channel
+    # Sessions
+    if first_ready:
+        for key, (channel_id, started_at) in previous.items():
+            session_store.restore_session(guild.id, key[1], channel_id, started_at)
+        end_time = taken_at if taken_at is not None else now
     else:
-        logger.warning(f"❌ Pas de permission d'écrire dans le salon vocal: {voice_channel.name}")
-        return None
+        end_time = now
+    for channel_id, member_ids in left.items():
+        for member_id in member_ids:
+            session_store.close_session(guild.id, member_id, end_time)
+    for channel_id, member_ids in joined.items():
+        for member_id in member_ids:
+            session_store.open_session(guild.id, member_id, channel_id, now)
+    
+    logger.info(
+        "🔄 Réconciliation: %s session(s) reprise(s), %s arrivée(s), %s départ(s)",
+        len(kept), sum(map(len, joined.values())), sum(map(len, left.values()))
+    )
+    
+    # Messages récapitulatifs (sauf si l'état connu est trop ancien pour être fiable)
+    if stale:
+        return
+    
+    def member_names(member_ids, channel_id, kind):
+        names = []
+        for member_id in member_ids:
+            if not preferences.allows(guild.id, member_id, channel_id, kind):
+                continue
+            m = guild.get_member(member_id)
+            name = m.display_name if m else name_cache.get(guild.id, member_id)
+            names.append(escape_name(member_id, name) if name else f"Membre {member_id}")
+        return names
+    
+    guild_templates = message_templates.get(guild.id)
+    for channel_id in set(joined) | set(left):
+        channel = guild.get_channel(channel_id)
+        if channel is None or not channel_index.can_send(channel_id):
+            continue
+        joined_names = member_names(joined.get(channel_id, ()), channel_id, notifications.JOIN)
+        left_names = member_names(left.get(channel_id, ()), channel_id, notifications.LEAVE)
+        if not joined_names and not left_names:
+            continue
+        lines = guild_templates.render_catch_up(joined_names, left_names)
+        for content in notifications.split_message(lines):
+            dispatcher.submit(Notification(channel, content))
+
+async def sample_gateway_latency(interval=15):
+    """Échantillonne la latence gateway pour en suivre l'évolution dans le temps"""
+    await bot.wait_until_ready()
+    while not bot.is_closed():
+        metrics.GATEWAY_LATENCY.observe(bot.latency)
+        await asyncio.sleep(interval)
+
+def validate_guild(guild_id):
+    """Valide que l'ID du serveur est autorisé (accès O(1) au cache de configuration)"""
+    return guild_id in guild_configs.enabled_ids
 
 @bot.event
 async def on_ready():
-    """Événement déclenché quand le bot est prêt"""
-    logger.info(f'✅ {bot.user} est connecté et prêt!')
-    logger.info(f'📊 Serveurs connectés: {len(bot.guilds)}')
-    logger.info(f'🔗 URL du bot: https://discord-bot-arrivees-depart.onrender.com')
-    logger.info(f'⚡ Latence: {round(bot.latency * 1000, 2)}ms')
-    
-    # Validation de sécurité : vérifier qu'on est sur le bon serveur
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        logger.error(f'❌ ERREUR SÉCURITÉ: Serveur avec l\'ID {GUILD_ID} non trouvé!')
+    """Événement déclenché quand le bot est prêt (rejoué à chaque reconnexion complète)"""
+    first_ready = not bot.ready_once
+    bot.ready_once = True
+    
+    if first_ready:
+        logger.info("✅ %s est connecté et prêt!", bot.user)
+        logger.info("📊 Serveurs connectés: %s", len(bot.guilds))
+        logger.info("🔗 URL du bot: https://discord-bot-arrivees-depart.onrender.com")
+    else:
+        logger.info("🔄 %s reconnecté", bot.user)
+    logger.info("⚡ Latence: %sms", round(bot.latency * 1000, 2))
+    
+    # Validation de sécurité : vérifier qu'au moins un serveur autorisé est présent
+    guilds = [g for g in bot.guilds if validate_guild(g.id)]
+    if not guilds:
+        logger.error("❌ ERREUR SÉCURITÉ: Aucun serveur autorisé trouvé (%s configuré(s))!", len(guild_configs.enabled_ids))
         logger.error('Le bot va se déconnecter pour des raisons de sécurité.')
         await bot.close()
         return
     
-    logger.info(f'🎯 Serveur cible trouvé: {guild.name}')
-    logger.info(f'👥 Membres: {guild.member_count}')
-    
-    # Trouver la catégorie autorisée
-    voice_category = None
-    target_category_name = "「 Salons vocaux 」"
+    ignored = len(bot.guilds) - len(guilds)
+    if ignored:
+        logger.warning("⚠️ %s serveur(s) non autorisé(s) ignoré(s)", ignored)
     
-    for category in guild.categories:
-        if category.name == target_category_name:
-            voice_category = category
-            break
+    # Au démarrage, l'état connu est l'instantané sur disque (lu une seule fois pour tous les serveurs)
+    taken_at, entries = None, []
+    if first_ready:
+        taken_at, entries = await asyncio.to_thread(snapshot.load, SNAPSHOT_PATH)
+    else:
+        # Les départs retenus sont traités avant de comparer avec l'état réel
+        flap_detector.flush()
     
-    if voice_category:
-        logger.info(f'✅ Catégorie vocal trouvée: "{voice_category.name}"')
-        voice_channels_count = len(voice_category.voice_channels)
-        logger.info(f'🔊 Salons vocaux surveillés: {voice_channels_count}')
+    for guild in guilds:
+        # Reconstruire l'index des salons surveillés (le cache a pu changer pendant la déconnexion)
+        rebuild_guild(guild)
         
-        # Test de connectivité (sans envoyer de message public)
-        for vc in voice_category.voice_channels:
-            can_write = vc.permissions_for(guild.me).send_messages
-            status = "✅" if can_write else "❌"
-            logger.info(f'   🔊 {vc.name} (ID: {vc.id}) → {status} Peut écrire')
-    else:
-        logger.warning(f'❌ Catégorie "「 Salons vocaux 」" non trouvée !')
+        categories = channel_index.categories(guild)
+        if categories:
+            logger.info(
+                "🎯 %s: %s salon(s) vocal(aux) surveillé(s) dans %s catégorie(s)",
+                guild.name, channel_index.channel_count(guild.id), len(categories)
+            )
+            
+            # Détail par salon uniquement en debug (coûteux sur les gros serveurs)
+            if logger.isEnabledFor(logging.DEBUG):
+                for vc in channel_index.channels(guild):
+                    status = "✅" if channel_index.can_send(vc.id) else "❌"
+                    logger.debug("   🔊 %s (ID: %s) → %s Peut écrire", vc.name, vc.id, status)
+        else:
+            logger.warning("❌ %s: aucune catégorie surveillée trouvée !", guild.name)
+        
+        # Rattraper les arrivées/départs manqués pendant l'absence du bot
+        await reconcile_voice_state(guild, first_ready, taken_at, entries)
+    
+    bot.reconciled.set()
     
-    # Log des endpoints disponibles
-    logger.info("🌐 Endpoints disponibles:")
-    logger.info("   📍 / → Page d'accueil")
-    logger.info("   📍 /ping → Monitoring rapide")
-    logger.info("   📍 /status → Statut détaillé")
-    logger.info("   📍 /health → Vérification santé")
+    if first_ready:
+        # Log des endpoints disponibles
+        logger.info("🌐 Endpoints disponibles:")
+        logger.info("   📍 / → Page d'accueil")
+        logger.info("   📍 /ping → Monitoring rapide")
+        logger.info("   📍 /status → Statut détaillé")
+        logger.info("   📍 /health → Vérification santé")
+        logger.info("   📍 /metrics → Métriques Prometheus")
+
+def push_notification(channel, kind, member, other=None, detail=None):
+    """Met une notification en file si les préférences l'autorisent et si le bot peut écrire dans le salon"""
+    if preferences.allows(member.guild.id, member.id, channel.id, kind) and channel_index.can_send(channel.id):
+        notifier.push(channel, kind, member.id, member.display_name, other, detail)
+
+def start_session(member, channel):
+    """Ouvre une session vocale et retourne le détail à afficher dans le message d'arrivée (None s'il n'est pas annoncé)"""
+    previous = session_store.open_session(member.guild.id, member.id, channel.id)
+    if previous is None or not preferences.allows(member.guild.id, member.id, channel.id, notifications.JOIN):
+        return None
+    return message_templates.get(member.guild.id).last_session(format_duration(previous))
+
+def rejoin(member, channel):
+    """Annule une déconnexion retenue si le membre revient dans le même salon (True dans ce cas)"""
+    reconnected = flap_detector.rejoin(member, channel)
+    if reconnected is None:
+        return False
+    if reconnected:
+        push_notification(channel, notifications.RECONNECT, member)
+    return True
+
+def rebuild_guild(guild):
+    """Reconstruit l'index des salons surveillés d'un serveur et recompte leur occupation"""
+    channel_index.rebuild(guild)
+    occupancy.reset(guild.id, channel_index.channels(guild))
+    voice_activity.reset(guild.id, channel_index.channels(guild))
+
+def forget_guild(guild_id):
+    channel_index.remove_guild(guild_id)
+    occupancy.remove_guild(guild_id)
+    voice_activity.remove_guild(guild_id)
+    embed_cache.pop(("status", guild_id), None)
+    embed_cache.pop(("channels", guild_id), None)
+    response_cache.invalidate(("status", guild_id))
+    response_cache.invalidate(("channels", guild_id))
+
+def sync_occupancy(guild):
+    """Recompte l'occupation après une modification de salon (création, déplacement, suppression)"""
+    occupancy.reset(guild.id, channel_index.channels(guild))
+    voice_activity.reset(guild.id, channel_index.channels(guild))
+
+@bot.event
+async def on_guild_join(guild):
+    if validate_guild(guild.id):
+        rebuild_guild(guild)
+        logger.info("➕ Serveur autorisé rejoint: %s (%s salon(s) surveillé(s))", guild.name, channel_index.channel_count(guild.id))
+    else:
+        logger.warning("⚠️ Serveur non autorisé rejoint: %s", guild.id)
+
+@bot.event
+async def on_guild_remove(guild):
+    forget_guild(guild.id)
+
+def monitoring_state(channel):
+    """(salon surveillé, catégorie surveillée) selon l'index, avant ou après une modification"""
+    return channel_index.is_monitored(channel.id), channel.id in channel_index.category_ids
+
+def monitoring_changed(before, after):
+    """Vrai si l'occupation doit être recomptée: un salon entre ou sort de la surveillance, ou une catégorie
+    surveillée change. Les autres modifications (salons texte, renommages, sujets) ne touchent que l'index"""
+    return before != after or before[1] or after[1]
+
+@bot.event
+async def on_guild_channel_create(channel):
+    if validate_guild(channel.guild.id):
+        channel_index.update_channel(channel)
+        if monitoring_changed((False, False), monitoring_state(channel)):
+            sync_occupancy(channel.guild)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    if validate_guild(after.guild.id):
+        was = monitoring_state(after)
+        channel_index.update_channel(after)
+        if monitoring_changed(was, monitoring_state(after)):
+            sync_occupancy(after.guild)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    if validate_guild(channel.guild.id):
+        was = monitoring_state(channel)
+        channel_index.remove_channel(channel)
+        if monitoring_changed(was, (False, False)):
+            sync_occupancy(channel.guild)
+
+async def refresh_own_permissions(guild):
+    """Recalcule les salons où le bot peut écrire d'après ses rôles actuels"""
+    me = None
+    if LEAN_MEMBER_CACHE:
+        # Sans intent `members`, les changements de rôles du bot peuvent ne pas arriver
+        # (on_member_update) : ses rôles sont relus par l'API, ces événements étant rares
+        try:
+            me = await guild.fetch_member(bot.user.id)
+        except discord.HTTPException as e:
+            logger.warning("⚠️ Rôles du bot non relus sur %s, permissions calculées depuis le cache: %s", guild.id, e)
+    channel_index.refresh_permissions(guild, me)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if not validate_guild(after.guild.id):
+        return
+    if before.permissions != after.permissions or LEAN_MEMBER_CACHE or after in after.guild.me.roles:
+        await refresh_own_permissions(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role):
+    if validate_guild(role.guild.id):
+        await refresh_own_permissions(role.guild)
+
+@bot.event
+async def on_guild_update(before, after):
+    # Changement de propriétaire, de fonctionnalités...: en mode allégé, seule occasion de relire les rôles du bot
+    if validate_guild(after.id):
+        await refresh_own_permissions(after)
+
+@bot.event
+async def on_member_update(before, after):
+    # Seuls les changements de rôles du bot modifient ses permissions
+    if after.id == bot.user.id and validate_guild(after.guild.id) and before.roles != after.roles:
+        channel_index.refresh_permissions(after.guild)
 
 @bot.event
 async def on_voice_state_update(member, before, after):
     """Événement déclenché lors des changements d'état vocal"""
+    started = time.perf_counter()
+    case = handle_voice_state_update(member, before, after)
+    duration = time.perf_counter() - started
+    metrics.VOICE_EVENTS.inc(case)
+    metrics.HANDLER_DURATION.observe(duration)
+    log_voice_event(member, before, after, case, duration)
+
+def log_voice_event(member, before, after, case, duration):
+    """Une ligne structurée par événement traité (formatée par le thread de journalisation, si gardée)"""
+    if case != "filtered" and voice_logger.isEnabledFor(logging.INFO) and log_sampling.allow("voice"):
+        channel = after.channel or before.channel
+        voice_logger.info(
+            "🎯 %s: %s (%s → %s)",
+            VOICE_CASE_LABELS[case],
+            member.display_name,
+            before.channel.name if before.channel else "—",
+            after.channel.name if after.channel else "—",
+            extra={
+                "event": "voice",
+                "sampled": True,
+                "case": case,
+                "guild_id": member.guild.id,
+                "member_id": member.id,
+                "channel_id": channel.id,
+                "duration_ms": round(duration * 1000, 3),
+            }
+        )
+
+# Libellés des cas traités, pour les logs
+VOICE_CASE_LABELS = {
+    "join": "CONNEXION",
+    "leave": "DÉCONNEXION",
+    "reconnect": "RECONNEXION",
+    "3a": "CHANGEMENT",
+    "3b": "CHANGEMENT",
+    "3c": "CHANGEMENT",
+}
+
+def handle_voice_state_update(member, before, after):
+    """Traite un changement d'état vocal et retourne le cas rencontré (pour les métriques)"""
     
     # Validation de sécurité
     if not member or not member.guild:
-        return
+        return "filtered"
+
+    # Arrêt en cours: file d'envoi et base des sessions en cours de fermeture
+    if bot.shutting_down:
+        return "filtered"
     
     if not validate_guild(member.guild.id):
-        logger.warning(f"⚠️ Tentative d'utilisation depuis un serveur non autorisé: {member.guild.id}")
-        return
+        logger.warning(
+            "⚠️ Tentative d'utilisation depuis un serveur non autorisé: %s", member.guild.id,
+            extra={"event": "unauthorized_guild", "guild_id": member.guild.id}
+        )
+        return "filtered"
 
-    # Ne traiter QUE les salons vocaux de la catégorie autorisée
-    voice_category_name = "「 Salons vocaux 」"
-    
-    # Vérifier si le changement concerne la catégorie autorisée
-    is_relevant_change = False
+    # Ne traiter QUE les salons vocaux surveillés (tests O(1) sur l'index)
+    before_is_monitored = before.channel is not None and channel_index.is_monitored(before.channel.id)
+    after_is_monitored = after.channel is not None and channel_index.is_monitored(after.channel.id)
     
-    if before.channel and before.channel.category and validate_category(before.channel.category.name):
-        is_relevant_change = True
+    # Si le changement ne concerne pas un salon surveillé, ignorer
+    if not before_is_monitored and not after_is_monitored:
+        return "filtered"
     
-    if after.channel and after.channel.category and validate_category(after.channel.category.name):
-        is_relevant_change = True
+    # Compteurs d'occupation (O(1)), lus par !status, !channels et /status
+    if before.channel != after.channel:
+        name_cache.remember(member.guild.id, member.id, member.display_name)
+        before_id = before.channel.id if before_is_monitored else None
+        after_id = after.channel.id if after_is_monitored else None
+        occupancy.move(member.guild.id, before_id, after_id)
+        # Cases horaires du résumé quotidien
+        voice_activity.move(member.guild.id, member.id, before_id, after_id)
     
-    # Si le changement ne concerne pas la catégorie autorisée, ignorer
-    if not is_relevant_change:
-        return
+    # Cas 1: Connexion à un salon vocal surveillé
+    if before.channel is None and after_is_monitored:
+        if rejoin(member, after.channel):
+            return "reconnect"
+        detail = start_session(member, after.channel)
+        push_notification(after.channel, notifications.JOIN, member, detail=detail)
+        return "join"
     
-    # Sanitize le nom d'utilisateur pour les logs
-    safe_username = member.display_name.replace('\n', '').replace('\r', '')[:50]
-    
-    # Cas 1: Connexion à un salon vocal autorisé
-    if (before.channel is None and 
-        after.channel is not None and 
-        after.channel.category and 
-        validate_category(after.channel.category.name)):
-        
-        logger.info(f"🎯 CONNEXION: {safe_username} → {after.channel.name}")
-        
-        # Message simple et sécurisé
-        try:
-            # Escape les caractères spéciaux dans le nom d'utilisateur
-            safe_display_name = discord.utils.escape_markdown(member.display_name)
-            simple_message = f"🔗 **{safe_display_name}** a rejoint le salon"
-            
-            await after.channel.send(simple_message)
-            logger.info(f"✅ Message envoyé: connexion de {safe_username}")
-            
-        except discord.HTTPException as e:
-            logger.error(f"❌ Erreur envoi message connexion: {e}")
-        except Exception as e:
-            logger.error(f"❌ Erreur générale connexion: {e}")
-    
-    # Cas 2: Déconnexion d'un salon vocal autorisé
-    elif (before.channel is not None and 
-          before.channel.category and 
-          validate_category(before.channel.category.name) and
-          after.channel is None):
-        
-        logger.info(f"🎯 DÉCONNEXION: {safe_username} ← {before.channel.name}")
-        
-        try:
-            safe_display_name = discord.utils.escape_markdown(member.display_name)
-            simple_message = f"❌ **{safe_display_name}** a quitté le salon"
-            
-            await before.channel.send(simple_message)
-            logger.info(f"✅ Message envoyé: déconnexion de {safe_username}")
-            
-        except discord.HTTPException as e:
-            logger.error(f"❌ Erreur envoi message déconnexion: {e}")
-        except Exception as e:
-            logger.error(f"❌ Erreur générale déconnexion: {e}")
+    # Cas 2: Déconnexion d'un salon vocal surveillé
+    elif before_is_monitored and after.channel is None:
+        # Départ retenu pendant le délai de grâce (connexion instable), sinon annoncé tout de suite.
+        # Une arrivée encore en attente d'envoi est annulée par le départ dans le regroupement: pas de retenue
+        if (notifier.has_arrival(before.channel.id, member.id)
+                or not flap_detector.hold_leave(member, before.channel)):
+            session_store.close_session(member.guild.id, member.id)
+            push_notification(before.channel, notifications.LEAVE, member)
+        return "leave"
     
     # Cas 3: Changement entre salons vocaux
     elif (before.channel is not None and after.channel is not None and 
           before.channel != after.channel):
         
-        logger.info(f"🎯 CHANGEMENT: {safe_username} {before.channel.name} → {after.channel.name}")
-        
-        # Vérifier si les salons sont dans la catégorie autorisée
-        before_is_monitored = (before.channel.category and validate_category(before.channel.category.name))
-        after_is_monitored = (after.channel.category and validate_category(after.channel.category.name))
-        
         # Cas 3a: Départ d'un salon surveillé vers un salon NON surveillé
         if before_is_monitored and not after_is_monitored:
-            try:
-                safe_display_name = discord.utils.escape_markdown(member.display_name)
-                leave_message = f"❌ **{safe_display_name}** a quitté le salon"
-                
-                await before.channel.send(leave_message)
-                logger.info(f"✅ Message départ (vers non-surveillé) envoyé pour {safe_username}")
-                
-            except discord.HTTPException as e:
-                logger.error(f"❌ Erreur envoi message départ: {e}")
-            except Exception as e:
-                logger.error(f"❌ Erreur générale départ: {e}")
+            session_store.close_session(member.guild.id, member.id)
+            push_notification(before.channel, notifications.LEAVE, member)
+            return "3a"
         
         # Cas 3b: Arrivée d'un salon NON surveillé vers un salon surveillé
         elif not before_is_monitored and after_is_monitored:
-            try:
-                safe_display_name = discord.utils.escape_markdown(member.display_name)
-                join_message = f"🔗 **{safe_display_name}** a rejoint le salon"
-                
-                await after.channel.send(join_message)
-                logger.info(f"✅ Message arrivée (depuis non-surveillé) envoyé pour {safe_username}")
-                
-            except discord.HTTPException as e:
-                logger.error(f"❌ Erreur envoi message arrivée: {e}")
-            except Exception as e:
-                logger.error(f"❌ Erreur générale arrivée: {e}")
+            if rejoin(member, after.channel):
+                return "reconnect"
+            detail = start_session(member, after.channel)
+            push_notification(after.channel, notifications.JOIN, member, detail=detail)
+            return "3b"
         
-        # Cas 3c: Changement entre deux salons surveillés - UN SEUL MESSAGE
+        # Cas 3c: Changement entre deux salons surveillés
         elif before_is_monitored and after_is_monitored:
-            try:
-                safe_display_name = discord.utils.escape_markdown(member.display_name)
-                safe_before_name = discord.utils.escape_markdown(before.channel.name)
-                safe_after_name = discord.utils.escape_markdown(after.channel.name)
-                
-                # Message de départ dans l'ancien salon
-                leave_message = f"📤 **{safe_display_name}** est parti vers #{safe_after_name}"
-                await before.channel.send(leave_message)
-                
-                # Message d'arrivée dans le nouveau salon (DIFFÉRENT)
-                arrive_message = f"📥 **{safe_display_name}** est arrivé depuis #{safe_before_name}"
-                await after.channel.send(arrive_message)
-                
-                logger.info(f"✅ Messages changement envoyés pour {safe_username}")
-                
-            except discord.HTTPException as e:
-                logger.error(f"❌ Erreur envoi message changement: {e}")
-            except Exception as e:
-                logger.error(f"❌ Erreur générale changement: {e}")
+            # Une session par salon: la session de l'ancien salon est close
+            session_store.open_session(member.guild.id, member.id, after.channel.id)
+            
+            # Message de départ dans l'ancien salon, d'arrivée dans le nouveau (DIFFÉRENT)
+            push_notification(before.channel, notifications.MOVE_OUT, member, after.channel)
+            push_notification(after.channel, notifications.MOVE_IN, member, before.channel)
+            return "3c"
         
         # Cas 3d: Changement entre deux salons NON surveillés - Ne rien faire
-        # (Ce cas ne devrait pas arriver car on a filtré avec is_relevant_change)
-
-@bot.command(name='status')
-async def status_command(ctx):
-    """Commande pour vérifier le statut du bot"""
-    # Validation de sécurité
-    if not validate_guild(ctx.guild.id):
-        logger.warning(f"⚠️ Tentative d'utilisation de !status depuis un serveur non autorisé")
-        return
-    
-    guild = bot.get_guild(GUILD_ID)
-    
-    # Trouver la catégorie autorisée
-    voice_category = None
-    for category in guild.categories:
-        if validate_category(category.name):
-            voice_category = category
-            break
-    
-    voice_channels_count = 0
-    total_voice_users = 0
+        # (Ce cas ne devrait pas arriver car on a filtré plus haut)
     
-    if voice_category:
-        voice_channels_count = len(voice_category.voice_channels)
-        for vc in voice_category.voice_channels:
-            total_voice_users += len(vc.members)
-    
-    # Calculer l'uptime
-    uptime_seconds = int(time.time() - start_time)
-    uptime_formatted = f"{uptime_seconds // 3600}h {(uptime_seconds % 3600) // 60}m {uptime_seconds % 60}s"
+    # Autres changements (micro, caméra...) dans un salon surveillé
+    return "filtered"
+
+def cached_embed(command, guild, build):
+    """Embed en cache d'une commande, reconstruit seulement si l'occupation ou l'index du serveur a changé"""
+    key = (occupancy.guild(guild.id).version, channel_index.version(guild.id))
+    cached = embed_cache.get((command, guild.id))
+    if cached is None or cached[0] != key:
+        cached = embed_cache[(command, guild.id)] = (key, build(guild))
+    embed = cached[1]
+    embed.timestamp = datetime.now()
+    return embed
+
+def build_status_embed(guild):
+    guild_occupancy = occupancy.guild(guild.id)
+    category_names = ", ".join(c.name for c in channel_index.categories(guild)) or "Aucune"
+    peak = f"{guild_occupancy.peak}"
+    if guild_occupancy.peak_at:
+        peak += f" (<t:{int(guild_occupancy.peak_at)}:R>)"
     
     embed = discord.Embed(
         title="📊 Statut du bot Arrivées/Départ",
-        color=0x0099ff,
-        timestamp=datetime.now()
+        color=0x0099ff
     )
     embed.add_field(name="🤖 Bot", value=f"{bot.user.mention}", inline=True)
     embed.add_field(name="🏠 Serveur", value=f"{guild.name}", inline=True)
-    embed.add_field(name="📁 Catégorie surveillée", value="「 Salons vocaux 」", inline=True)
-    embed.add_field(name="🔊 Salons vocaux", value=f"{voice_channels_count}", inline=True)
-    embed.add_field(name="👥 Utilisateurs en vocal", value=f"{total_voice_users}", inline=True)
-    embed.add_field(name="⚡ Latence", value=f"{round(bot.latency * 1000, 2)}ms", inline=True)
-    embed.add_field(name="⏱️ Uptime", value=uptime_formatted, inline=True)
-    embed.add_field(name="📊 Pings reçus", value=f"{ping_count}", inline=True)
+    embed.add_field(name="📁 Catégorie surveillée", value=category_names, inline=True)
+    embed.add_field(name="🔊 Salons vocaux", value=f"{channel_index.channel_count(guild.id)}", inline=True)
+    embed.add_field(name="👥 Utilisateurs en vocal", value=f"{guild_occupancy.total}", inline=True)
+    # Champs variables, mis à jour à chaque appel par refresh_status_fields
+    embed.add_field(name="⚡ Latence", value="", inline=True)
+    embed.add_field(name="⏱️ Uptime", value="", inline=True)
+    embed.add_field(name="📊 Pings reçus", value="", inline=True)
+    embed.add_field(name="📈 Pic de connexions", value=peak, inline=True)
     embed.add_field(name="🔒 Sécurité", value="✅ Activée", inline=True)
     
     embed.add_field(
@@ -396,69 +999,90 @@ async def status_command(ctx):
         value="• [/ping](https://discord-bot-arrivees-depart.onrender.com/ping)\n• [/status](https://discord-bot-arrivees-depart.onrender.com/status)\n• [/health](https://discord-bot-arrivees-depart.onrender.com/health)", 
         inline=False
     )
-    
-    await ctx.send(embed=embed)
-    logger.info(f"📊 Commande status exécutée par {ctx.author.display_name}")
+    return embed
 
-@bot.command(name='channels')
-async def list_channels(ctx):
-    """Commande pour lister tous les salons vocaux surveillés"""
-    # Validation de sécurité
-    if not validate_guild(ctx.guild.id):
-        logger.warning(f"⚠️ Tentative d'utilisation de !channels depuis un serveur non autorisé")
-        return
-    
-    guild = bot.get_guild(GUILD_ID)
-    
-    # Trouver la catégorie autorisée
-    voice_category = None
-    for category in guild.categories:
-        if validate_category(category.name):
-            voice_category = category
-            break
-    
-    if not voice_category:
-        embed = discord.Embed(
+def refresh_status_fields(embed):
+    embed.set_field_at(5, name="⚡ Latence", value=f"{round(bot.latency * 1000, 2)}ms", inline=True)
+    embed.set_field_at(6, name="⏱️ Uptime", value=format_uptime(int(time.time() - start_time)), inline=True)
+    embed.set_field_at(7, name="📊 Pings reçus", value=f"{monitoring.ping_count}", inline=True)
+
+def build_channels_embed(guild):
+    categories = channel_index.categories(guild)
+    if not categories:
+        return discord.Embed(
             title="❌ Erreur",
             description="Catégorie autorisée non trouvée !",
             color=0xff0000
         )
-        await ctx.send(embed=embed)
-        return
     
+    category_names = ", ".join(f"**{c.name}**" for c in categories)
     embed = discord.Embed(
         title="🔊 Salons vocaux surveillés",
-        description=f"Catégorie: **{voice_category.name}**\nMessages sécurisés dans chaque salon vocal",
-        color=0x0099ff,
-        timestamp=datetime.now()
+        description=f"Catégorie: {category_names}\nMessages sécurisés dans chaque salon vocal",
+        color=0x0099ff
     )
     
-    for vc in voice_category.voice_channels:
-        member_count = len(vc.members)
+    monitored_channels = channel_index.channels(guild)
+    # Un embed est limité à 25 champs
+    if len(monitored_channels) > 25:
+        embed.set_footer(text=f"25 salons affichés sur {len(monitored_channels)}")
+    
+    for vc in monitored_channels[:25]:
+        member_count = occupancy.count(guild.id, vc.id)
         status = "🟢" if member_count > 0 else "⚫"
         
-        can_write = vc.permissions_for(guild.me).send_messages
-        chat_status = "✅ Notifications actives" if can_write else "❌ Pas de permission"
+        chat_status = "✅ Notifications actives" if channel_index.can_send(vc.id) else "❌ Pas de permission"
         
         embed.add_field(
             name=f"{status} {vc.name}",
             value=f"👥 {member_count} membre(s)\n💬 {chat_status}",
             inline=True
         )
-    
-    await ctx.send(embed=embed)
-    logger.info(f"📋 Commande channels exécutée par {ctx.author.display_name}")
+    return embed
 
-@bot.command(name='uptime')
-async def uptime_command(ctx):
-    """Commande pour vérifier l'uptime et les statistiques"""
-    # Validation de sécurité
-    if not validate_guild(ctx.guild.id):
-        logger.warning(f"⚠️ Tentative d'utilisation de !uptime depuis un serveur non autorisé")
-        return
+def build_digest_embed(guild):
+    """Résumé de l'activité vocale de la période en cours (lu dans les cases horaires, sans historique)"""
+    rows = voice_activity.digest(guild.id)
+    embed = discord.Embed(
+        title="📰 Activité vocale des dernières 24 h",
+        description=f"Depuis <t:{int(voice_activity.period_start)}:f>",
+        color=0x0099ff,
+        timestamp=datetime.now()
+    )
+    if voice_activity.skipped_since is not None:
+        embed.description += (
+            f"\n⚠️ Bot arrêté à l'heure d'un résumé: l'activité depuis <t:{int(voice_activity.skipped_since)}:f> "
+            f"n'est comptée qu'à partir du redémarrage"
+        )
     
+    if not rows:
+        embed.description += "\nAucune activité vocale."
+        return embed
+    
+    # Un embed est limité à 25 champs
+    if len(rows) > 25:
+        embed.set_footer(text=f"25 salons affichés sur {len(rows)}")
+    
+    for row in rows[:25]:
+        channel = guild.get_channel(row["channel_id"])
+        value = (
+            f"👥 {row['visitors']} visiteur(s)\n"
+            f"⏱️ {format_duration(row['seconds'])} en vocal\n"
+            f"📈 Pic: {row['peak']} simultané(s)"
+        )
+        if row["busiest_hour"] is not None:
+            value += f"\n🕓 Heure la plus chargée: <t:{row['busiest_hour']}:t>"
+        embed.add_field(name=f"🔊 {channel.name if channel else row['channel_id']}", value=value, inline=True)
+    return embed
+
+def status_embed(guild):
+    embed = cached_embed("status", guild, build_status_embed)
+    refresh_status_fields(embed)
+    return embed
+
+def build_uptime_embed():
     uptime_seconds = int(time.time() - start_time)
-    uptime_formatted = f"{uptime_seconds // 3600}h {(uptime_seconds % 3600) // 60}m {uptime_seconds % 60}s"
+    uptime_formatted = format_uptime(uptime_seconds)
     
     embed = discord.Embed(
         title="⏱️ Statistiques d'uptime",
@@ -468,13 +1092,386 @@ async def uptime_command(ctx):
     
     embed.add_field(name="🚀 Démarrage", value=f"<t:{int(start_time)}:F>", inline=True)
     embed.add_field(name="⏱️ Uptime", value=uptime_formatted, inline=True)
-    embed.add_field(name="📊 Pings reçus", value=f"{ping_count}", inline=True)
+    embed.add_field(name="📊 Pings reçus", value=f"{monitoring.ping_count}", inline=True)
     embed.add_field(name="⚡ Latence", value=f"{round(bot.latency * 1000, 2)}ms", inline=True)
     embed.add_field(name="🔗 URL", value="[discord-bot-arrivees-depart.onrender.com](https://discord-bot-arrivees-depart.onrender.com)", inline=True)
     embed.add_field(name="📡 Status", value="[/status endpoint](https://discord-bot-arrivees-depart.onrender.com/status)", inline=True)
+    return embed
+
+async def build_stats_embed(guild_id, member):
+    stats = await session_store.member_stats(guild_id, member.id)
+    current = session_store.current_session(guild_id, member.id)
+    
+    embed = discord.Embed(
+        title=f"📈 Statistiques vocales de {discord.utils.escape_markdown(member.display_name)}",
+        color=0x0099ff,
+        timestamp=datetime.now()
+    )
+    
+    if stats is None and current is None:
+        embed.description = "Aucune session vocale enregistrée."
+    else:
+        total_seconds = stats["total_seconds"] if stats else 0
+        session_count = stats["session_count"] if stats else 0
+        if current is not None:
+            total_seconds += time.time() - current[1]
+            session_count += 1
+        
+        embed.add_field(name="⏱️ Temps total", value=format_duration(total_seconds), inline=True)
+        embed.add_field(name="🔢 Sessions", value=f"{session_count}", inline=True)
+        if stats:
+            embed.add_field(
+                name="🕓 Dernière session",
+                value=f"{format_duration(stats['last_duration'])} dans <#{stats['last_channel_id']}> (<t:{int(stats['last_ended_at'])}:R>)",
+                inline=False
+            )
+        if current is not None:
+            embed.add_field(
+                name="🟢 Session en cours",
+                value=f"<#{current[0]}> depuis {format_duration(time.time() - current[1])}",
+                inline=False
+            )
+    return embed
+
+async def build_top_embed(guild_id):
+    rows = await session_store.top(guild_id, limit=10)
+    
+    embed = discord.Embed(
+        title="🏆 Classement du temps passé en vocal",
+        color=0xffd700,
+        timestamp=datetime.now()
+    )
+    
+    if not rows:
+        embed.description = "Aucune session vocale enregistrée."
+    else:
+        embed.description = "\n".join(
+            f"**{rank}.** <@{member_id}> — {format_duration(total_seconds)} ({session_count} session(s))"
+            for rank, (member_id, total_seconds, session_count) in enumerate(rows, start=1)
+        )
+    return embed
+
+def config_usage(prefix):
+    return (
+        f"❌ Usage: `{prefix}config`, `{prefix}config enable|disable`, "
+        f"`{prefix}config language {'|'.join(LANGUAGES)}`, `{prefix}config embeds on|off`, "
+        f"`{prefix}config categories <id> [id...]`, `{prefix}config digest <id>|off`"
+    )
+
+def parse_config_change(setting, values):
+    """Modifications demandées par `!config`/`/config`.
+
+    Retourne None si la commande est invalide ; ValueError si les catégories ne sont pas des IDs.
+    """
+    changes = {}
+    if setting in ('enable', 'disable'):
+        changes["enabled"] = setting == 'enable'
+    elif setting == 'language' and len(values) == 1 and values[0] in LANGUAGES:
+        changes["language"] = values[0]
+    elif setting == 'embeds' and len(values) == 1 and values[0] in ('on', 'off'):
+        changes["embeds"] = values[0] == 'on'
+    elif setting == 'categories' and values:
+        try:
+            changes["category_ids"] = [int(v) for v in values]
+        except ValueError:
+            raise ValueError("❌ Les catégories doivent être des IDs numériques.")
+        changes["category_names"] = []
+    elif setting == 'digest' and len(values) == 1:
+        if values[0] == 'off':
+            changes["digest_channel_id"] = None
+        else:
+            try:
+                changes["digest_channel_id"] = int(values[0])
+            except ValueError:
+                raise ValueError("❌ Le salon du résumé doit être un ID numérique ou `off`.")
+    elif setting is not None:
+        return None
+    return changes
+
+async def apply_config_command(guild, author, changes):
+    """Enregistre les modifications de configuration et retourne l'embed de la configuration du serveur"""
+    if changes:
+        await asyncio.to_thread(guild_configs.update, guild.id, **changes)
+        apply_config_changes({guild.id})
+        logger.info("⚙️ Configuration modifiée par %s: %s", author.display_name, changes)
+    
+    config = guild_configs.get(guild.id)
+    embed = discord.Embed(
+        title="⚙️ Configuration du serveur",
+        color=0x0099ff,
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="🔔 Notifications", value="✅ Activées" if config.enabled else "❌ Désactivées", inline=True)
+    embed.add_field(name="🌍 Langue", value=config.language, inline=True)
+    embed.add_field(name="🖼️ Embeds", value="✅ Oui" if config.embeds else "❌ Non", inline=True)
+    categories = ", ".join(f"<#{c}>" for c in sorted(config.category_ids)) or ", ".join(config.category_names)
+    embed.add_field(name="📁 Catégories surveillées", value=categories or "Aucune", inline=False)
+    digest = "❌ Désactivé"
+    if config.digest_channel_id:
+        digest = f"<#{config.digest_channel_id}> à {DIGEST_TIME_SECONDS // 3600:02d}:{DIGEST_TIME_SECONDS % 3600 // 60:02d} UTC"
+    embed.add_field(name="📰 Résumé quotidien", value=digest, inline=False)
+    return embed
+
+def can_configure(guild_id):
+    """Seul un serveur déjà autorisé (ou configuré puis désactivé) peut être reconfiguré depuis Discord"""
+    return validate_guild(guild_id) or guild_configs.get(guild_id) is not None
+
+# --- Commandes préfixées (PREFIX_COMMANDS=1) ---
+
+@bot.command(name='status')
+async def status_command(ctx):
+    """Commande pour vérifier le statut du bot"""
+    # Validation de sécurité
+    if not validate_guild(ctx.guild.id):
+        logger.warning("⚠️ Tentative d'utilisation de !status depuis un serveur non autorisé")
+        return
+    
+    await ctx.send(embed=status_embed(ctx.guild))
+    logger.info("📊 Commande status exécutée par %s", ctx.author.display_name)
+
+@bot.command(name='channels')
+async def list_channels(ctx):
+    """Commande pour lister tous les salons vocaux surveillés"""
+    # Validation de sécurité
+    if not validate_guild(ctx.guild.id):
+        logger.warning("⚠️ Tentative d'utilisation de !channels depuis un serveur non autorisé")
+        return
+    
+    await ctx.send(embed=cached_embed("channels", ctx.guild, build_channels_embed))
+    logger.info("📋 Commande channels exécutée par %s", ctx.author.display_name)
+
+@bot.command(name='uptime')
+async def uptime_command(ctx):
+    """Commande pour vérifier l'uptime et les statistiques"""
+    # Validation de sécurité
+    if not validate_guild(ctx.guild.id):
+        logger.warning("⚠️ Tentative d'utilisation de !uptime depuis un serveur non autorisé")
+        return
+    
+    await ctx.send(embed=build_uptime_embed())
+    logger.info("⏱️ Commande uptime exécutée par %s", ctx.author.display_name)
+
+@bot.command(name='stats')
+async def stats_command(ctx, member: Union[discord.Member, discord.User] = None):
+    """Commande pour afficher le temps passé en vocal par un membre"""
+    # Validation de sécurité
+    if not validate_guild(ctx.guild.id):
+        logger.warning("⚠️ Tentative d'utilisation de !stats depuis un serveur non autorisé")
+        return
+    
+    await ctx.send(embed=await build_stats_embed(ctx.guild.id, member or ctx.author))
+    logger.info("📈 Commande stats exécutée par %s", ctx.author.display_name)
+
+@bot.command(name='top')
+async def top_command(ctx):
+    """Commande pour afficher les membres les plus présents en vocal"""
+    # Validation de sécurité
+    if not validate_guild(ctx.guild.id):
+        logger.warning("⚠️ Tentative d'utilisation de !top depuis un serveur non autorisé")
+        return
+    
+    await ctx.send(embed=await build_top_embed(ctx.guild.id))
+    logger.info("🏆 Commande top exécutée par %s", ctx.author.display_name)
+
+@bot.command(name='config')
+@commands.has_guild_permissions(manage_guild=True)
+async def config_command(ctx, setting: str = None, *values: str):
+    """Commande pour consulter ou modifier la configuration du serveur"""
+    if ctx.guild is None:
+        return
+    
+    if not can_configure(ctx.guild.id):
+        logger.warning("⚠️ Tentative d'utilisation de !config depuis un serveur non autorisé")
+        return
+    
+    try:
+        changes = parse_config_change(setting, values)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
+    if changes is None:
+        await ctx.send(config_usage('!'))
+        return
     
-    await ctx.send(embed=embed)
-    logger.info(f"⏱️ Commande uptime exécutée par {ctx.author.display_name}")
+    await ctx.send(embed=await apply_config_command(ctx.guild, ctx.author, changes))
+
+# --- Commandes slash: réponses éphémères, sans lire le contenu des messages ---
+
+async def reply(interaction, embed=None, content=None):
+    await interaction.response.send_message(content=content, embed=embed, ephemeral=True)
+
+def slash_guild_allowed(interaction, command):
+    """Validation de sécurité commune aux commandes slash"""
+    if validate_guild(interaction.guild_id):
+        return True
+    logger.warning(
+        "⚠️ Tentative d'utilisation de /%s depuis un serveur non autorisé", command,
+        extra={"event": "unauthorized_guild", "guild_id": interaction.guild_id}
+    )
+    return False
+
+@bot.tree.command(name='status', description="Statut du bot et du serveur")
+@app_commands.guild_only()
+async def status_slash(interaction: discord.Interaction):
+    if not slash_guild_allowed(interaction, 'status'):
+        return
+    guild = interaction.guild
+    await reply(interaction, embed=response_cache.get(("status", guild.id), lambda: status_embed(guild)))
+    logger.info("📊 Commande /status exécutée par %s", interaction.user.display_name)
+
+@bot.tree.command(name='channels', description="Salons vocaux surveillés")
+@app_commands.guild_only()
+async def channels_slash(interaction: discord.Interaction):
+    if not slash_guild_allowed(interaction, 'channels'):
+        return
+    guild = interaction.guild
+    await reply(interaction, embed=response_cache.get(
+        ("channels", guild.id), lambda: cached_embed("channels", guild, build_channels_embed)
+    ))
+    logger.info("📋 Commande /channels exécutée par %s", interaction.user.display_name)
+
+@bot.tree.command(name='uptime', description="Uptime et statistiques du bot")
+@app_commands.guild_only()
+async def uptime_slash(interaction: discord.Interaction):
+    if not slash_guild_allowed(interaction, 'uptime'):
+        return
+    # Identique pour tous les serveurs
+    await reply(interaction, embed=response_cache.get(("uptime", None), build_uptime_embed))
+    logger.info("⏱️ Commande /uptime exécutée par %s", interaction.user.display_name)
+
+@bot.tree.command(name='stats', description="Temps passé en vocal par un membre")
+@app_commands.describe(member="Membre (vous par défaut)")
+@app_commands.guild_only()
+async def stats_slash(interaction: discord.Interaction, member: discord.User = None):
+    if not slash_guild_allowed(interaction, 'stats'):
+        return
+    await reply(interaction, embed=await build_stats_embed(interaction.guild_id, member or interaction.user))
+    logger.info("📈 Commande /stats exécutée par %s", interaction.user.display_name)
+
+@bot.tree.command(name='top', description="Classement des membres les plus présents en vocal")
+@app_commands.guild_only()
+async def top_slash(interaction: discord.Interaction):
+    if not slash_guild_allowed(interaction, 'top'):
+        return
+    await reply(interaction, embed=await build_top_embed(interaction.guild_id))
+    logger.info("🏆 Commande /top exécutée par %s", interaction.user.display_name)
+
+@bot.tree.command(name='config', description="Consulter ou modifier la configuration du serveur")
+@app_commands.describe(setting="Paramètre à modifier", value="Nouvelle valeur (langue, on/off, IDs de catégories ou du salon de résumé)")
+@app_commands.choices(setting=[
+    app_commands.Choice(name=name, value=name)
+    for name in ('enable', 'disable', 'language', 'embeds', 'categories', 'digest')
+])
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.guild_only()
+async def config_slash(interaction: discord.Interaction, setting: app_commands.Choice[str] = None, value: str = None):
+    if not interaction.user.guild_permissions.manage_guild:
+        await reply(interaction, content="❌ Permission « Gérer le serveur » requise.")
+        return
+    if not can_configure(interaction.guild_id):
+        logger.warning("⚠️ Tentative d'utilisation de /config depuis un serveur non autorisé")
+        return
+    
+    try:
+        changes = parse_config_change(setting.value if setting else None, (value or "").split())
+    except ValueError as e:
+        await reply(interaction, content=str(e))
+        return
+    if changes is None:
+        await reply(interaction, content=config_usage('/'))
+        return
+    
+    await reply(interaction, embed=await apply_config_command(interaction.guild, interaction.user, changes))
+
+@bot.tree.command(name='digest', description="Aperçu du résumé quotidien de l'activité vocale")
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.guild_only()
+async def digest_slash(interaction: discord.Interaction):
+    if not slash_guild_allowed(interaction, 'digest'):
+        return
+    await reply(interaction, embed=build_digest_embed(interaction.guild))
+    logger.info("📰 Commande /digest exécutée par %s", interaction.user.display_name)
+
+# --- Préférences de notification (/notify me, /notify channel) ---
+
+PREFERENCE_LABELS = {
+    "opt_out": "🔕 Aucune notification",
+    "join_only": "📥 Arrivées seulement",
+    "silent_moves": "🔀 Changements de salon non annoncés",
+}
+
+def apply_flag_options(flags, opt_out=None, join_only=None, silent_moves=None):
+    """Active ou désactive les drapeaux dont l'option a été renseignée"""
+    for flag, value in ((OPT_OUT, opt_out), (JOIN_ONLY, join_only), (SILENT_MOVES, silent_moves)):
+        if value is not None:
+            flags = flags | flag if value else flags & ~flag
+    return flags
+
+def build_preferences_embed(title, flags):
+    embed = discord.Embed(title=title, color=0x0099ff)
+    names = flag_names(flags)
+    embed.description = "\n".join(PREFERENCE_LABELS[name] for name in names) if names else "🔔 Toutes les notifications"
+    return embed
+
+async def save_preferences():
+    try:
+        await asyncio.to_thread(preferences.save, preferences.snapshot())
+    except OSError as e:
+        logger.error("❌ Erreur écriture des préférences de notification: %s", e)
+
+notify_group = app_commands.Group(name='notify', description="Préférences de notification", guild_only=True)
+
+@notify_group.command(name='me', description="Vos préférences: ne pas annoncer vos arrivées/départs, ou vos changements de salon")
+@app_commands.describe(
+    opt_out="Ne jamais annoncer vos passages en vocal",
+    join_only="N'annoncer que vos arrivées",
+    silent_moves="Ne pas annoncer vos changements de salon"
+)
+async def notify_me_slash(interaction: discord.Interaction, opt_out: bool = None, join_only: bool = None,
+                          silent_moves: bool = None):
+    if not slash_guild_allowed(interaction, 'notify me'):
+        return
+    flags = preferences.member_flags(interaction.guild_id, interaction.user.id)
+    new_flags = apply_flag_options(flags, opt_out, join_only, silent_moves)
+    if new_flags != flags:
+        preferences.set_member(interaction.guild_id, interaction.user.id, new_flags)
+        await save_preferences()
+        logger.info("🔔 Préférences de %s: %s", interaction.user.display_name, flag_names(new_flags) or 'toutes')
+    await reply(interaction, embed=build_preferences_embed("🔔 Vos notifications", new_flags))
+
+@notify_group.command(name='channel', description="Notifications d'un salon vocal (permission « Gérer le serveur »)")
+@app_commands.describe(
+    channel="Salon vocal",
+    opt_out="Aucune notification dans ce salon",
+    join_only="Seulement les arrivées",
+    silent_moves="Pas d'annonce des changements de salon"
+)
+async def notify_channel_slash(interaction: discord.Interaction, channel: discord.VoiceChannel, opt_out: bool = None,
+                               join_only: bool = None, silent_moves: bool = None):
+    if not slash_guild_allowed(interaction, 'notify channel'):
+        return
+    if not interaction.user.guild_permissions.manage_guild:
+        await reply(interaction, content="❌ Permission « Gérer le serveur » requise.")
+        return
+    flags = preferences.channel_flags(channel.id)
+    new_flags = apply_flag_options(flags, opt_out, join_only, silent_moves)
+    if new_flags != flags:
+        preferences.set_channel(channel.id, new_flags)
+        await save_preferences()
+        logger.info("🔔 Préférences du salon %s modifiées par %s: %s", channel.name, interaction.user.display_name, flag_names(new_flags) or 'toutes')
+    await reply(interaction, embed=build_preferences_embed(f"🔔 Notifications de {channel.name}", new_flags))
+
+bot.tree.add_command(notify_group)
+
+@bot.tree.error
+async def on_app_command_error(interaction, error):
+    """Gestion sécurisée des erreurs de commandes slash"""
+    logger.error("Erreur de commande slash: %s", type(error).__name__)
+    message = "❌ Une erreur s'est produite lors de l'exécution de la commande."
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -483,7 +1480,7 @@ async def on_command_error(ctx, error):
         return  # Ignorer les commandes inexistantes
     
     # Log l'erreur sans exposer d'informations sensibles
-    logger.error(f"Erreur de commande: {type(error).__name__}")
+    logger.error("Erreur de commande: %s", type(error).__name__)
     
     # Message générique à l'utilisateur
     if hasattr(ctx, 'send'):
@@ -491,24 +1488,34 @@ async def on_command_error(ctx, error):
 
 @bot.event
 async def on_error(event, *args, **kwargs):
-    """Gestion sécurisée des erreurs générales"""
-    logger.error(f"Erreur dans l'événement {event}")
+    """Gestion sécurisée des erreurs générales (trace complète dans les logs uniquement)"""
+    logger.error("Erreur dans l'événement %s", event, exc_info=True)
+
+async def main():
+    """Serveur de monitoring et mesure de la boucle pour toute la durée du processus, client supervisé"""
+    loop_monitor.start()
+    # Serveur web pour Render, sur la boucle du bot
+    await monitoring.start(port=int(os.environ.get('PORT', 8080)))
+    try:
+        await bot_supervisor.run()
+    finally:
+        await monitoring.stop()
+        await loop_monitor.stop()
 
 # Point d'entrée sécurisé
 if __name__ == "__main__":
     logger.info("🚀 Démarrage du bot sécurisé avec optimisations uptime...")
     logger.info("🌐 Endpoints configurés: /, /ping, /status, /health")
     
-    # Démarrer le serveur web pour Render
-    keep_alive()
-    
     try:
-        bot.run(TOKEN, log_handler=None)  # Désactiver les logs Discord par défaut
+        asyncio.run(main())
     except discord.LoginFailure:
         logger.error("❌ ERREUR CRITIQUE: Token Discord invalide!")
         logger.error("Vérifiez votre token dans le fichier .env")
+        exit(1)
     except KeyboardInterrupt:
         logger.info("🛑 Arrêt du bot demandé par l'utilisateur")
     except Exception as e:
-        logger.error(f"❌ ERREUR CRITIQUE: {e}")
+        logger.error("❌ ERREUR CRITIQUE: %s", e, exc_info=True)
         logger.error("Le bot va s'arrêter pour des raisons de sécurité")
+        exit(1)
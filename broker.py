@@ -0,0 +1,275 @@
+"""Transport local des notifications entre la gateway et les workers d'envoi (socket Unix ou TCP)"""
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from supervisor import restart_delay
+
+logger = logging.getLogger(__name__)
+
+# Trame: longueur (4 octets, big-endian) puis un objet JSON
+FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 64 * 1024
+
+# Encodeur partagé (sortie ASCII: chemin rapide de l'encodeur C)
+_encode_json = json.JSONEncoder(separators=(",", ":")).encode
+
+# Trames écrites avant d'attendre que le socket se vide
+WRITE_BATCH = 256
+
+
+def parse_url(url):
+    """`unix:///chemin/worker.sock` ou `tcp://hôte:port` -> ("unix", chemin) ou ("tcp", (hôte, port))"""
+    parts = urlsplit(url.strip())
+    if parts.scheme == "unix" and parts.path:
+        return "unix", parts.path
+    if parts.scheme == "tcp" and parts.hostname and parts.port:
+        return "tcp", (parts.hostname, parts.port)
+    raise ValueError(f"adresse de worker invalide: {url!r} (unix:///chemin ou tcp://hôte:port)")
+
+
+async def open_connection(url):
+    scheme, address = parse_url(url)
+    if scheme == "unix":
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+
+async def start_server(url, handler):
+    """Écoute sur `url` ; `handler(reader, writer)` est appelé pour chaque connexion"""
+    scheme, address = parse_url(url)
+    if scheme == "unix":
+        # Socket laissé par un worker arrêté brutalement
+        if os.path.exists(address):
+            os.unlink(address)
+        return await asyncio.start_unix_server(handler, address, limit=MAX_FRAME_SIZE * 2)
+    return await asyncio.start_server(handler, *address, limit=MAX_FRAME_SIZE * 2)
+
+
+def shard_for(channel_id, shards):
+    """Worker responsable d'un salon: toujours le même, pour conserver l'ordre des messages du salon"""
+    # Les bits de poids faible d'un snowflake (compteur, processus) sont peu variés: l'horodatage répartit mieux
+    return (channel_id >> 22) % shards
+
+
+def encode_frame(notification, embed, now):
+    """Sérialise une notification ; les horodatages deviennent des âges, indépendants de l'horloge de chaque processus"""
+    payload = _encode_json({
+        "c": notification.channel.id,
+        "g": notification.channel.guild.id,
+        "e": embed,
+        "t": notification.content,
+        "k": now - notification.created_at,
+        "a": [now - enqueued_at for enqueued_at in notification.event_times],
+    }).encode("ascii")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+async def read_frames(reader):
+    """Itère sur les trames reçues jusqu'à la fin du flux"""
+    while True:
+        try:
+            header = await reader.readexactly(FRAME_HEADER.size)
+        except asyncio.IncompleteReadError:
+            return
+        (size,) = FRAME_HEADER.unpack(header)
+        if size > MAX_FRAME_SIZE:
+            raise ValueError(f"trame trop grande ({size} octets)")
+        yield json.loads(await reader.readexactly(size))
+
+
+class _Link:
+    """Connexion vers un worker et notifications en attente de transmission"""
+    __slots__ = ("url", "pending", "wakeup", "idle", "task", "writer", "forwarded")
+
+    def __init__(self, url):
+        self.url = url
+        self.pending = deque()
+        self.wakeup = None
+        self.idle = None
+        self.task = None
+        self.writer = None
+        self.forwarded = 0
+
+
+class BrokerPublisher:
+    """Côté gateway: transmet les notifications aux workers d'envoi au lieu de les envoyer.
+
+    Même interface que `NotificationDispatcher` (`start`, `submit`, `depth`,
+    `stats`, `drain`), pour être branché à sa place derrière le regroupement.
+    Chaque salon est attribué à un worker par `shard_for` et les messages d'un
+    worker passent par une seule connexion, dans l'ordre : l'ordre par salon
+    est conservé. Ce sont les workers qui suivent les limites de débit,
+    fusionnent et envoient.
+
+    Un worker injoignable ne bloque ni le gestionnaire d'événements ni la
+    gateway : ses notifications restent en file (au plus `queue_size`, puis
+    abandonnées) pendant que la connexion est retentée avec un délai
+    croissant. Celles plus vieilles que `ttl` secondes ne sont pas transmises.
+    Les trames déjà écrites sur une connexion qui se coupe sont perdues
+    (au plus une livraison).
+    """
+
+    def __init__(self, urls, embeds=None, queue_size=1000, ttl=60.0, max_reconnect_delay=30.0,
+                 clock=time.monotonic):
+        for url in urls:
+            parse_url(url)
+        if not urls:
+            raise ValueError("au moins un worker est nécessaire")
+        self._links = [_Link(url) for url in urls]
+        self._embeds = embeds or (lambda channel: False)
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self.max_reconnect_delay = max_reconnect_delay
+        self._clock = clock
+        self._started = False
+        self._closing = False
+
+        # Métriques
+        self.submitted = 0
+        self.dropped = 0
+        self.expired = 0
+        self.reconnects = 0
+
+    def start(self):
+        """Ouvre les connexions vers les workers sur la boucle courante"""
+        if self._started:
+            return
+        self._started = True
+        self._closing = False
+        for index, link in enumerate(self._links):
+            link.wakeup = asyncio.Event()
+            link.idle = asyncio.Event()
+            if not link.pending:
+                link.idle.set()
+            link.task = asyncio.create_task(self._run(link), name=f"broker-link-{index}")
+
+    def submit(self, notification):
+        """Met une notification en file pour son worker sans attendre. Retourne False si elle est abandonnée"""
+        if self._closing or not self._started:
+            self.dropped += 1
+            return False
+        link = self._links[shard_for(notification.channel.id, len(self._links))]
+        if len(link.pending) >= self.queue_size:
+            self.dropped += 1
+            logger.warning("⚠️ File du worker %s pleine, message abandonné pour %s", link.url, notification.channel.id)
+            return False
+        if notification.created_at is None:
+            notification.created_at = min(notification.event_times) if notification.event_times else self._clock()
+        link.pending.append((notification, self._embeds(notification.channel)))
+        self.submitted += 1
+        link.idle.clear()
+        link.wakeup.set()
+        return True
+
+    def depth(self):
+        """Nombre de notifications en attente de transmission"""
+        return sum(len(link.pending) for link in self._links)
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "queue_capacity": self.queue_size * len(self._links),
+            "workers": [
+                {"url": link.url, "connected": link.writer is not None, "pending": len(link.pending),
+                 "forwarded": link.forwarded}
+                for link in self._links
+            ],
+            "submitted": self.submitted,
+            "forwarded": sum(link.forwarded for link in self._links),
+            "expired": self.expired,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+    # --- Connexions ---
+
+    async def _run(self, link):
+        """Tient la connexion vers un worker ; quelle que soit l'erreur, elle est rouverte après un délai croissant"""
+        attempt = 0
+        while True:
+            try:
+                reader, writer = await open_connection(link.url)
+            except OSError as e:
+                if attempt == 0:
+                    logger.warning("⚠️ Worker %s injoignable (%s), nouvel essai avec un délai croissant", link.url, e)
+            except Exception as e:
+                logger.error("❌ Connexion au worker %s impossible: %s", link.url, e, exc_info=True)
+            else:
+                if link.forwarded:
+                    self.reconnects += 1
+                link.writer = writer
+                logger.info("🔌 Connecté au worker %s", link.url)
+                try:
+                    await self._forward(link, reader, writer)
+                except (ConnectionError, OSError) as e:
+                    # Worker arrêté ou redémarré: nouvel essai rapide
+                    attempt = 0
+                    logger.warning("⚠️ Connexion perdue avec le worker %s: %s", link.url, e)
+                except Exception as e:
+                    # Le délai continue de croître si l'erreur se répète ; les notifications en attente restent en file
+                    logger.error("❌ Erreur de transmission vers le worker %s: %s", link.url, e, exc_info=True)
+                finally:
+                    link.writer = None
+                    writer.close()
+            await asyncio.sleep(restart_delay(attempt, 0.5, self.max_reconnect_delay))
+            attempt += 1
+
+    async def _forward(self, link, reader, writer):
+        # Le worker n'écrit rien: la fin du flux signale son arrêt, même sans message à transmettre
+        closed = asyncio.create_task(reader.read())
+        try:
+            while True:
+                # Une écriture sur une connexion perdue ne lève pas d'erreur: les trames seraient perdues sans bruit
+                if closed.done() or writer.is_closing():
+                    raise ConnectionResetError("connexion fermée par le worker")
+                now = self._clock()
+                written = 0
+                while link.pending and written < WRITE_BATCH and not writer.is_closing():
+                    notification, embed = link.pending[0]
+                    if now - notification.created_at > self.ttl:
+                        self.expired += 1
+                    else:
+                        try:
+                            frame = encode_frame(notification, embed, now)
+                        except (TypeError, ValueError) as e:
+                            # Notification impossible à sérialiser: abandonnée plutôt que de bloquer la file
+                            self.dropped += 1
+                            logger.error("❌ Notification pour %s non transmise: %s", notification.channel.id, e)
+                        else:
+                            writer.write(frame)
+                            written += 1
+                    link.pending.popleft()
+                await writer.drain()
+                link.forwarded += written
+                if link.pending:
+                    continue
+                link.idle.set()
+                link.wakeup.clear()
+                waiter = asyncio.create_task(link.wakeup.wait())
+                await asyncio.wait({waiter, closed}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+        finally:
+            closed.cancel()
+
+    async def drain(self, timeout=10.0):
+        """Refuse les nouvelles notifications, transmet celles en attente puis ferme les connexions"""
+        self._closing = True
+        if not self._started:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(link.idle.wait() for link in self._links)), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Arrêt: %s notification(s) non transmise(s) aux workers", self.depth())
+        for link in self._links:
+            link.task.cancel()
+        await asyncio.gather(*(link.task for link in self._links), return_exceptions=True)
+        for link in self._links:
+            link.task = None
+            link.pending.clear()
+        self._started = False
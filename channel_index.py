@@ -0,0 +1,148 @@
+"""Index des salons vocaux surveillés, maintenu de façon incrémentale"""
+import logging
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+class MonitoredChannelIndex:
+    """Ensemble des IDs de salons vocaux surveillés et de leurs permissions d'écriture.
+
+    L'index est construit une fois par serveur dans `on_ready` puis tenu à jour
+    par les événements de salons, de rôles et de membre du bot. Le chemin
+    critique (`on_voice_state_update`) ne fait plus que des tests
+    d'appartenance O(1) : les IDs de salons sont uniques sur tout Discord, les
+    ensembles globaux suffisent quel que soit le nombre de serveurs.
+
+    `config_lookup(guild_id)` retourne la configuration du serveur (attributs
+    `category_ids` et `category_names`) ou None s'il n'est pas surveillé. Les
+    catégories sont configurées par ID ; les noms ne servent que de repli
+    lorsqu'aucun ID n'est configuré.
+    """
+
+    def __init__(self, config_lookup):
+        self._config_lookup = config_lookup
+        # Catégories effectivement résolues, tous serveurs confondus
+        self.category_ids = set()
+        # Salons vocaux surveillés
+        self.channel_ids = set()
+        # Salons surveillés dans lesquels le bot peut écrire
+        self.writable_ids = set()
+        # Détail par serveur, pour les reconstructions partielles
+        self._guild_categories = {}
+        self._guild_channels = {}
+        # Incrémenté à chaque modification d'un serveur (invalidation des embeds en cache)
+        self._versions = {}
+
+    def is_monitored(self, channel_id):
+        return channel_id in self.channel_ids
+
+    def can_send(self, channel_id):
+        return channel_id in self.writable_ids
+
+    def version(self, guild_id):
+        return self._versions.get(guild_id, 0)
+
+    def _touch(self, guild_id):
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+
+    def _matches_category(self, category):
+        config = self._config_lookup(category.guild.id)
+        if config is None:
+            return False
+        if config.category_ids:
+            return category.id in config.category_ids
+        return category.name in config.category_names
+
+    def remove_guild(self, guild_id):
+        """Retire tous les salons d'un serveur de l'index"""
+        self._touch(guild_id)
+        for channel_id in self._guild_channels.pop(guild_id, ()):
+            self.channel_ids.discard(channel_id)
+            self.writable_ids.discard(channel_id)
+        self.category_ids.difference_update(self._guild_categories.pop(guild_id, ()))
+
+    def rebuild(self, guild):
+        """Reconstruit entièrement l'index d'un serveur"""
+        self.remove_guild(guild.id)
+        categories = {c.id for c in guild.categories if self._matches_category(c)}
+        self._guild_categories[guild.id] = categories
+        self._guild_channels[guild.id] = set()
+        self.category_ids.update(categories)
+        for category_id in categories:
+            category = guild.get_channel(category_id)
+            if category is None:
+                continue
+            for vc in category.voice_channels:
+                self._add(vc)
+
+    def _add(self, channel):
+        self._touch(channel.guild.id)
+        self.channel_ids.add(channel.id)
+        self._guild_channels.setdefault(channel.guild.id, set()).add(channel.id)
+        if channel.permissions_for(channel.guild.me).send_messages:
+            self.writable_ids.add(channel.id)
+        else:
+            self.writable_ids.discard(channel.id)
+
+    def _remove(self, channel):
+        self._touch(channel.guild.id)
+        self.channel_ids.discard(channel.id)
+        self.writable_ids.discard(channel.id)
+        self._guild_channels.get(channel.guild.id, set()).discard(channel.id)
+
+    def update_channel(self, channel):
+        """Prend en compte la création ou la modification d'un salon"""
+        if isinstance(channel, discord.CategoryChannel):
+            # Renommage, permissions héritées ou nouvelle catégorie: rare, on reconstruit
+            if channel.id in self.category_ids or self._matches_category(channel):
+                self.rebuild(channel.guild)
+            return
+        if not isinstance(channel, discord.VoiceChannel):
+            return
+        if channel.category_id in self.category_ids:
+            self._add(channel)
+        else:
+            self._remove(channel)
+
+    def remove_channel(self, channel):
+        """Prend en compte la suppression d'un salon"""
+        if isinstance(channel, discord.CategoryChannel):
+            if channel.id in self.category_ids:
+                self.rebuild(channel.guild)
+            return
+        self._remove(channel)
+
+    def refresh_permissions(self, guild, member=None):
+        """Recalcule les permissions d'écriture après un changement de rôles.
+
+        `member` remplace `guild.me` quand le membre en cache du bot peut être
+        périmé (mode allégé, sans événements de membres).
+        """
+        me = member or guild.me
+        self._touch(guild.id)
+        for channel_id in self._guild_channels.get(guild.id, ()):
+            channel = guild.get_channel(channel_id)
+            if channel is None:
+                continue
+            if channel.permissions_for(me).send_messages:
+                self.writable_ids.add(channel_id)
+            else:
+                self.writable_ids.discard(channel_id)
+
+    def categories(self, guild):
+        """Catégories surveillées d'un serveur, dans l'ordre d'affichage"""
+        found = [guild.get_channel(category_id) for category_id in self._guild_categories.get(guild.id, ())]
+        return sorted((c for c in found if c is not None), key=lambda c: c.position)
+
+    def channels(self, guild):
+        """Salons vocaux surveillés d'un serveur, dans l'ordre d'affichage"""
+        found = [guild.get_channel(channel_id) for channel_id in self._guild_channels.get(guild.id, ())]
+        return sorted(
+            (c for c in found if c is not None),
+            key=lambda c: (c.category.position if c.category else -1, c.position)
+        )
+
+    def channel_count(self, guild_id):
+        return len(self._guild_channels.get(guild_id, ()))
@@ -0,0 +1,346 @@
+"""Envoi non bloquant des notifications, ordonnancé selon les limites de débit de Discord"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Limite Discord sur la taille d'un message
+MAX_MESSAGE_LENGTH = 2000
+
+# Limites de débit estimées (requêtes, période en secondes), suivies localement
+CHANNEL_SEND_RATE = (5, 5.0)
+CHANNEL_EDIT_RATE = (5, 5.0)
+GLOBAL_RATE = (50, 1.0)
+
+
+def message_payload(content, embed=False):
+    """Arguments de `send`/`edit`: texte brut ou embed"""
+    if embed:
+        return {"embed": discord.Embed(description=content, color=0x0099ff)}
+    return {"content": content}
+
+
+class Notification:
+    """Message prêt à être envoyé dans un salon"""
+    __slots__ = ("channel", "content", "event_times", "created_at")
+
+    def __init__(self, channel, content, event_times=(), created_at=None):
+        self.channel = channel
+        self.content = content
+        # Horodatages (monotonic) des événements couverts par ce message
+        self.event_times = event_times
+        # Date de référence pour la priorité et l'expiration (renseignée par `submit`)
+        self.created_at = created_at
+
+
+class TokenBucket:
+    """Seau à jetons: `capacity` requêtes par `per` secondes, rechargé en continu"""
+    __slots__ = ("capacity", "per", "tokens", "updated")
+
+    def __init__(self, capacity, per, now):
+        self.capacity = capacity
+        self.per = per
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / self.per)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Délai avant qu'un jeton soit disponible (0 s'il l'est déjà)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.per / self.capacity
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _ChannelState:
+    """File et seaux d'un salon, avec le dernier message envoyé (pour l'éditer)"""
+    __slots__ = ("channel", "pending", "send_bucket", "edit_bucket", "blocked_until", "in_flight",
+                 "last_message", "last_content", "last_sent_at")
+
+    def __init__(self, channel, now):
+        self.channel = channel
+        self.pending = deque()
+        self.send_bucket = TokenBucket(*CHANNEL_SEND_RATE, now)
+        self.edit_bucket = TokenBucket(*CHANNEL_EDIT_RATE, now)
+        self.blocked_until = 0.0
+        self.in_flight = False
+        self.last_message = None
+        self.last_content = None
+        self.last_sent_at = 0.0
+
+
+class NotificationDispatcher:
+    """Ordonnanceur d'envoi qui respecte lui-même les limites de débit.
+
+    Le gestionnaire d'événements se contente d'appeler `submit()`, qui ne bloque
+    jamais. Une seule tâche choisit ensuite quoi envoyer, en suivant localement
+    un seau par salon (envois et éditions) et un seau global, au lieu de
+    laisser discord.py attendre après chaque 429 :
+
+    - un salon n'a qu'une requête en cours à la fois (l'ordre est conservé) et
+      au plus `workers` requêtes sont en cours au total ;
+    - au plus `queue_size` notifications attendent, tous salons confondus ;
+      au-delà elles sont abandonnées (comptées dans `dropped`) ;
+    - les salons dont les notifications sont les plus récentes passent en
+      premier ; une notification plus vieille que `ttl` secondes est abandonnée
+      (comptée dans `expired`) ;
+    - toutes les notifications en attente d'un salon sont fusionnées dans un
+      seul message, dans la limite de 2000 caractères ;
+    - quand le seau d'envoi d'un salon est vide, le dernier message du bot dans
+      ce salon (s'il date de moins de `edit_window` secondes) est édité pour y
+      ajouter les nouvelles lignes.
+
+    Sous forte charge, le nombre de requêtes REST dépend donc du nombre de
+    salons actifs et non du nombre d'événements.
+
+    `send(channel, content)` doit retourner le message envoyé et
+    `edit(message, content)` le modifier ; sans `edit`, les notifications
+    attendent simplement que le seau d'envoi se recharge. `global_rate` est la
+    part de la limite globale du bot réservée à cet ordonnanceur (plusieurs
+    workers d'envoi se la partagent).
+    """
+
+    def __init__(self, send, workers=4, queue_size=1000, latency_observer=None, edit=None, ttl=60.0,
+                 edit_window=30.0, clock=time.monotonic, global_rate=GLOBAL_RATE):
+        self._send = send
+        self._edit = edit
+        self.worker_count = max(1, workers)
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self.edit_window = edit_window
+        self._latency_observer = latency_observer
+        self._clock = clock
+        self._channels = {}
+        self.global_rate = global_rate
+        self._global_bucket = None
+        self._pending_count = 0
+        self._in_flight = set()
+        self._wakeup = None
+        self._idle = None
+        self._task = None
+        self._closing = False
+
+        # Métriques de contre-pression
+        self.submitted = 0
+        self.dropped = 0
+        self.expired = 0
+        self.merged = 0
+        self.sent = 0
+        self.edits = 0
+        self.failures = 0
+        self.rate_limited = 0
+
+    def start(self):
+        """Démarre l'ordonnanceur sur la boucle courante"""
+        if self._task is not None:
+            return
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._global_bucket = TokenBucket(*self.global_rate, self._clock())
+        self._task = asyncio.create_task(self._run(), name="notification-scheduler")
+
+    def submit(self, notification):
+        """Met une notification en file sans attendre. Retourne False si elle est abandonnée"""
+        if self._closing or self._task is None:
+            self.dropped += 1
+            return False
+        if self._pending_count >= self.queue_size:
+            self.dropped += 1
+            logger.warning("⚠️ File de notifications pleine, message abandonné pour %s", notification.channel.id)
+            return False
+        now = self._clock()
+        if notification.created_at is None:
+            notification.created_at = min(notification.event_times) if notification.event_times else now
+        state = self._channels.get(notification.channel.id)
+        if state is None:
+            state = self._channels[notification.channel.id] = _ChannelState(notification.channel, now)
+        state.pending.append(notification)
+        self._pending_count += 1
+        self.submitted += 1
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    def depth(self):
+        """Nombre de notifications en attente d'envoi"""
+        return self._pending_count
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "queue_capacity": self.queue_size,
+            "workers": self.worker_count,
+            "in_flight": len(self._in_flight),
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "edits": self.edits,
+            "merged": self.merged,
+            "expired": self.expired,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "dropped": self.dropped,
+        }
+
+    # --- Ordonnancement ---
+
+    def _expire(self, state, now):
+        while state.pending and now - state.pending[0].created_at > self.ttl:
+            state.pending.popleft()
+            self._pending_count -= 1
+            self.expired += 1
+
+    def _take_batch(self, state, limit):
+        """Retire de la file les notifications qui tiennent dans `limit` caractères une fois fusionnées"""
+        batch = [state.pending.popleft()]
+        length = len(batch[0].content)
+        while state.pending and length + 1 + len(state.pending[0].content) <= limit:
+            notification = state.pending.popleft()
+            length += 1 + len(notification.content)
+            batch.append(notification)
+        self._pending_count -= len(batch)
+        self.merged += len(batch) - 1
+        return batch
+
+    def _schedule(self, now):
+        """Lance les requêtes possibles et retourne le délai avant la prochaine (ou None)"""
+        ready = []
+        next_wait = None
+        for channel_id, state in list(self._channels.items()):
+            if state.in_flight:
+                continue
+            self._expire(state, now)
+            if not state.pending:
+                if state.last_message is None or now - state.last_sent_at > self.edit_window:
+                    # Plus rien à envoyer ni à éditer: le salon est oublié
+                    del self._channels[channel_id]
+                continue
+            if state.blocked_until > now:
+                wait = state.blocked_until - now
+            else:
+                wait = state.send_bucket.wait_time(now)
+                if wait > 0 and self._can_edit(state, now):
+                    wait = min(wait, state.edit_bucket.wait_time(now))
+            if wait <= 0:
+                # Priorité aux salons dont la notification la plus récente est la plus fraîche
+                ready.append((-state.pending[-1].created_at, channel_id, state))
+            elif next_wait is None or wait < next_wait:
+                next_wait = wait
+
+        ready.sort(key=lambda item: item[:2])
+        for _, _, state in ready:
+            if len(self._in_flight) >= self.worker_count:
+                return next_wait
+            global_wait = self._global_bucket.wait_time(now)
+            if global_wait > 0:
+                return global_wait if next_wait is None else min(global_wait, next_wait)
+            self._global_bucket.take(now)
+            self._dispatch(state, now)
+        return next_wait
+
+    def _can_edit(self, state, now):
+        return (
+            self._edit is not None
+            and state.last_message is not None
+            and now - state.last_sent_at <= self.edit_window
+            and len(state.last_content) + 1 + len(state.pending[0].content) <= MAX_MESSAGE_LENGTH
+        )
+
+    def _dispatch(self, state, now):
+        if state.send_bucket.wait_time(now) <= 0:
+            state.send_bucket.take(now)
+            batch = self._take_batch(state, MAX_MESSAGE_LENGTH)
+            editing = False
+        else:
+            # Salon saturé: les nouvelles lignes sont ajoutées au dernier message
+            state.edit_bucket.take(now)
+            batch = self._take_batch(state, MAX_MESSAGE_LENGTH - len(state.last_content) - 1)
+            editing = True
+        state.in_flight = True
+        self._in_flight.add(asyncio.create_task(self._deliver(state, batch, editing)))
+
+    async def _deliver(self, state, batch, editing):
+        content = "\n".join(notification.content for notification in batch)
+        channel = state.channel
+        try:
+            if editing:
+                content = f"{state.last_content}\n{content}"
+                await self._edit(state.last_message, content)
+                self.edits += 1
+            else:
+                state.last_message = await self._send(channel, content)
+                self.sent += 1
+            state.last_content = content
+            state.last_sent_at = self._clock()
+            if self._latency_observer is not None:
+                now = self._clock()
+                for notification in batch:
+                    for enqueued_at in notification.event_times:
+                        self._latency_observer(now - enqueued_at)
+        except discord.RateLimited as e:
+            # Limite plus longue que prévu: le salon est suspendu et le lot remis en tête de file
+            self.rate_limited += 1
+            state.blocked_until = self._clock() + e.retry_after
+            self._requeue(state, batch)
+            logger.warning("⚠️ Limite de débit atteinte dans %s, reprise dans %.1fs", channel.id, e.retry_after)
+        except discord.HTTPException as e:
+            self.failures += 1
+            if editing:
+                # Message supprimé entre-temps: les lignes seront envoyées dans un nouveau message
+                state.last_message = None
+                self._requeue(state, batch)
+            logger.error("❌ Erreur envoi notification dans %s: %s", channel.id, e)
+        except Exception as e:
+            self.failures += 1
+            logger.error("❌ Erreur générale notification dans %s: %s", channel.id, e)
+        finally:
+            state.in_flight = False
+            self._in_flight.discard(asyncio.current_task())
+            self._wakeup.set()
+
+    def _requeue(self, state, batch):
+        state.pending.extendleft(reversed(batch))
+        self._pending_count += len(batch)
+        self._idle.clear()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            wait = self._schedule(self._clock())
+            if self._pending_count == 0 and not self._in_flight:
+                self._idle.set()
+            if wait is None:
+                await self._wakeup.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def drain(self, timeout=10.0):
+        """Refuse les nouvelles notifications, envoie celles en attente puis arrête l'ordonnanceur"""
+        self._closing = True
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Arrêt: %s notification(s) non envoyée(s)", self.depth())
+        self._task.cancel()
+        await asyncio.gather(self._task, *self._in_flight, return_exceptions=True)
+        self._task = None
+        self._channels = {}
+        self._pending_count = 0
@@ -0,0 +1,216 @@
+"""Détection des reconnexions rapides (membres dont la connexion est instable)"""
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+NOTICE = "notice"
+SILENT = "silent"
+POLICIES = (NOTICE, SILENT)
+
+
+class TimerWheel:
+    """Roue de minuteurs à résolution fixe.
+
+    Chaque clé est rangée dans la case correspondant à son échéance ;
+    `advance(now)` vide les cases écoulées. Armer ou annuler un minuteur est
+    O(1), sans tâche ni handle asyncio par clé. Les échéances sont arrondies
+    à la résolution supérieure et plafonnées à `slots - 1` cases.
+    """
+
+    def __init__(self, resolution, slots):
+        self.resolution = resolution
+        self._slots = [set() for _ in range(slots)]
+        # clé -> index de sa case
+        self._positions = {}
+        self._current = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def schedule(self, key, now, delay):
+        self.cancel(key)
+        if not self._positions:
+            # Roue vide: rien n'a expiré entre-temps, on repart de maintenant
+            self._current = int(now / self.resolution)
+        tick = math.ceil((now + delay) / self.resolution)
+        tick = max(self._current + 1, min(tick, self._current + len(self._slots) - 1))
+        index = tick % len(self._slots)
+        self._slots[index].add(key)
+        self._positions[key] = index
+
+    def cancel(self, key):
+        index = self._positions.pop(key, None)
+        if index is None:
+            return False
+        self._slots[index].discard(key)
+        return True
+
+    def advance(self, now):
+        """Retourne les clés arrivées à échéance"""
+        target = int(now / self.resolution)
+        expired = []
+        steps = min(target - self._current, len(self._slots))
+        for step in range(1, steps + 1):
+            slot = self._slots[(self._current + step) % len(self._slots)]
+            for key in slot:
+                del self._positions[key]
+            expired.extend(slot)
+            slot.clear()
+        self._current = max(self._current, target)
+        return expired
+
+    def pop_all(self):
+        expired = list(self._positions)
+        for slot in self._slots:
+            slot.clear()
+        self._positions.clear()
+        return expired
+
+
+class _PendingLeave:
+    __slots__ = ("member", "channel", "left_at")
+
+    def __init__(self, member, channel, left_at):
+        self.member = member
+        self.channel = channel
+        self.left_at = left_at
+
+
+class FlapDetector:
+    """Retient les déconnexions pendant un délai de grâce.
+
+    Un départ (déconnexion) est mis en attente `grace` secondes au lieu d'être
+    annoncé. Si le membre revient dans le même salon avant l'échéance, le
+    départ est annulé : `rejoin()` indique alors s'il faut annoncer une
+    reconnexion, au plus une fois par membre sur une fenêtre glissante de
+    `window` secondes (politique `notice`), ou jamais (politique `silent`).
+    Sinon, à l'échéance, `release(member, channel, left_at)` est appelé pour
+    traiter le départ normalement.
+
+    Les échéances sont gérées par une seule roue de minuteurs, avancée par un
+    unique `call_later` tant que des départs sont en attente. La mémoire est
+    bornée : au-delà de `max_members` départs en attente, les plus anciens
+    sont libérés immédiatement, et l'historique des reconnexions est purgé
+    au-delà de `window` secondes ou de `max_members` entrées.
+    """
+
+    def __init__(self, release, grace=10.0, window=60.0, policy=NOTICE, max_members=10000,
+                 resolution=1.0, clock=time.monotonic):
+        self._release = release
+        self.grace = grace
+        self.window = window
+        self.policy = policy
+        self.max_members = max_members
+        self._clock = clock
+        self._wheel = TimerWheel(resolution, int(math.ceil(grace / resolution)) + 2)
+        # (guild_id, member_id) -> _PendingLeave, dans l'ordre des départs
+        self._pending = OrderedDict()
+        # (guild_id, member_id) -> date de la dernière reconnexion annoncée
+        self._last_notice = OrderedDict()
+        self._handle = None
+
+        # Statistiques
+        self.leaves_held = 0
+        self.leaves_released = 0
+        self.reconnects = 0
+
+    @property
+    def enabled(self):
+        return self.grace > 0
+
+    def pending(self):
+        return len(self._pending)
+
+    def hold_leave(self, member, channel):
+        """Met la déconnexion du membre en attente (False si la détection est désactivée)"""
+        if not self.enabled:
+            return False
+        key = (member.guild.id, member.id)
+        now = self._clock()
+        previous = self._pending.pop(key, None)
+        if previous is not None:
+            self._wheel.cancel(key)
+            self._do_release(previous)
+        self._pending[key] = _PendingLeave(member, channel, time.time())
+        self._wheel.schedule(key, now, self.grace)
+        self.leaves_held += 1
+
+        while len(self._pending) > self.max_members:
+            oldest_key, oldest = self._pending.popitem(last=False)
+            self._wheel.cancel(oldest_key)
+            self._do_release(oldest)
+
+        self._arm()
+        return True
+
+    def rejoin(self, member, channel):
+        """Traite un retour en vocal.
+
+        Retourne None si aucun départ n'était en attente pour ce salon (le
+        retour est une arrivée normale), sinon True s'il faut annoncer la
+        reconnexion et False s'il faut la taire.
+        """
+        key = (member.guild.id, member.id)
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return None
+        self._wheel.cancel(key)
+        if pending.channel.id != channel.id:
+            # Retour dans un autre salon: le départ de l'ancien est bien réel
+            self._do_release(pending)
+            return None
+
+        self.reconnects += 1
+        if self.policy != NOTICE:
+            return False
+        now = self._clock()
+        last = self._last_notice.get(key)
+        if last is not None and now - last < self.window:
+            return False
+        # Réinsertion en fin: l'historique reste trié par date d'annonce
+        self._last_notice.pop(key, None)
+        self._last_notice[key] = now
+        if len(self._last_notice) > self.max_members:
+            self._last_notice.popitem(last=False)
+        return True
+
+    def flush(self):
+        """Libère immédiatement tous les départs en attente (arrêt, reconnexion du bot)"""
+        self._wheel.pop_all()
+        while self._pending:
+            _, pending = self._pending.popitem(last=False)
+            self._do_release(pending)
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _do_release(self, pending):
+        self.leaves_released += 1
+        try:
+            self._release(pending.member, pending.channel, pending.left_at)
+        except Exception as e:
+            logger.error("❌ Erreur lors de la libération d'un départ retenu: %s", e)
+
+    def _arm(self):
+        if self._handle is None and self._pending:
+            loop = asyncio.get_running_loop()
+            self._handle = loop.call_later(self._wheel.resolution, self._tick)
+
+    def _tick(self):
+        self._handle = None
+        now = self._clock()
+        for key in self._wheel.advance(now):
+            pending = self._pending.pop(key, None)
+            if pending is not None:
+                self._do_release(pending)
+        # Historique des reconnexions: on retire les entrées sorties de la fenêtre
+        while self._last_notice:
+            key, last = next(iter(self._last_notice.items()))
+            if now - last < self.window:
+                break
+            del self._last_notice[key]
+        self._arm()
@@ -0,0 +1,202 @@
+"""Configuration par serveur, chargée depuis un fichier JSON local et gardée en cache mémoire"""
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+LANGUAGES = ("fr", "en")
+
+# Catégorie surveillée quand aucune n'est configurée pour un serveur
+DEFAULT_CATEGORY_NAME = "「 Salons vocaux 」"
+
+# Valeurs acceptées pour les options booléennes de guilds.json
+TRUE_VALUES = (True, 1, "1", "true", "yes", "on")
+FALSE_VALUES = (False, 0, "0", "false", "no", "off")
+
+
+def parse_bool(value, field):
+    """Booléen strict: "false" ou "off" désactivent, une valeur inconnue est une erreur"""
+    if isinstance(value, str):
+        value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"{field}: booléen attendu, reçu {value!r}")
+
+
+def _list(data, field):
+    value = data.get(field) or []
+    if not isinstance(value, list):
+        raise ValueError(f"{field}: liste attendue, reçu {type(value).__name__}")
+    return value
+
+
+class GuildConfig:
+    """Configuration d'un serveur"""
+    __slots__ = ("guild_id", "enabled", "category_ids", "category_names", "language", "templates", "embeds",
+                 "digest_channel_id")
+
+    def __init__(self, guild_id, enabled=True, category_ids=(), category_names=(), language="fr", templates=None,
+                 embeds=False, digest_channel_id=None):
+        self.guild_id = guild_id
+        self.enabled = enabled
+        self.category_ids = frozenset(category_ids)
+        self.category_names = frozenset(category_names)
+        self.language = language if language in LANGUAGES else "fr"
+        # Modèles de messages par type d'événement (remplacent ceux par défaut)
+        self.templates = dict(templates or {})
+        # Notifications envoyées sous forme d'embed plutôt que de texte brut
+        self.embeds = embeds
+        # Salon texte du résumé quotidien de l'activité vocale (None: pas de résumé)
+        self.digest_channel_id = digest_channel_id
+
+    @classmethod
+    def from_dict(cls, guild_id, data):
+        """Construit la configuration d'une entrée de guilds.json ; ValueError si une valeur a un type inattendu"""
+        if not isinstance(data, dict):
+            raise ValueError(f"objet attendu, reçu {type(data).__name__}")
+        category_ids = _list(data, "category_ids")
+        try:
+            category_ids = [int(x) for x in category_ids]
+            digest_channel_id = int(data["digest_channel_id"]) if data.get("digest_channel_id") else None
+        except (TypeError, ValueError):
+            raise ValueError("category_ids et digest_channel_id doivent être des IDs numériques") from None
+        category_names = _list(data, "category_names")
+        if not all(isinstance(name, str) for name in category_names):
+            raise ValueError("category_names: noms de catégories attendus")
+        if not category_ids and not category_names:
+            category_names = [DEFAULT_CATEGORY_NAME]
+        language = data.get("language", "fr")
+        if not isinstance(language, str):
+            raise ValueError(f"language: texte attendu, reçu {language!r}")
+        templates = data.get("templates") or {}
+        if not isinstance(templates, dict) or not all(
+            isinstance(key, str) and isinstance(value, str) for key, value in templates.items()
+        ):
+            raise ValueError("templates: objet {type d'événement: modèle} attendu")
+        return cls(
+            guild_id,
+            enabled=parse_bool(data.get("enabled", True), "enabled"),
+            category_ids=category_ids,
+            category_names=category_names,
+            language=language,
+            templates=templates,
+            embeds=parse_bool(data.get("embeds", False), "embeds"),
+            digest_channel_id=digest_channel_id,
+        )
+
+    def to_dict(self):
+        return {
+            "enabled": self.enabled,
+            "category_ids": sorted(self.category_ids),
+            "category_names": sorted(self.category_names),
+            "language": self.language,
+            "templates": self.templates,
+            "embeds": self.embeds,
+            "digest_channel_id": self.digest_channel_id,
+        }
+
+
+class GuildConfigStore:
+    """Cache mémoire des configurations, adossé à un fichier JSON.
+
+    Le chemin critique ne lit jamais le disque : `is_enabled()` et `get()` sont
+    des accès O(1) au cache. Le fichier est relu quand sa date de modification
+    change (`reload_if_changed()`), et chaque modification faite par le bot
+    (`update()`) est écrite puis remplace l'entrée en cache. Ces méthodes
+    retournent les IDs des serveurs modifiés, pour que l'appelant invalide ce
+    qui en dépend (index des salons...) sur la boucle asyncio.
+    """
+
+    def __init__(self, path, defaults=()):
+        self.path = path
+        # Configurations issues des variables d'environnement, utilisées si absentes du fichier
+        self._defaults = {config.guild_id: config for config in defaults}
+        self._configs = dict(self._defaults)
+        self.enabled_ids = frozenset(g for g, c in self._configs.items() if c.enabled)
+        self._mtime = None
+        self._write_lock = threading.Lock()
+
+    def is_enabled(self, guild_id):
+        return guild_id in self.enabled_ids
+
+    def get(self, guild_id):
+        return self._configs.get(guild_id)
+
+    def _read_file(self):
+        """Lecture bloquante du fichier: {guild_id: GuildConfig}. Les entrées invalides sont ignorées"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        guilds = data.get("guilds", {}) if isinstance(data, dict) else None
+        if not isinstance(guilds, dict):
+            raise ValueError('objet {"guilds": {id: configuration}} attendu')
+        configs = {}
+        for key, entry in guilds.items():
+            try:
+                guild_id = int(key)
+                configs[guild_id] = GuildConfig.from_dict(guild_id, entry)
+            except ValueError as e:
+                logger.error("❌ Configuration du serveur %s invalide, ignorée: %s", key, e)
+        return configs
+
+    def _mtime_now(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        """Charge (ou recharge) le fichier et retourne les IDs des serveurs modifiés (bloquant)"""
+        self._mtime = self._mtime_now()
+        configs = dict(self._defaults)
+        configs.update(self._read_file())
+        return self._replace(configs)
+
+    def reload_if_changed(self):
+        """Recharge le fichier si sa date de modification a changé (bloquant)"""
+        if self._mtime_now() == self._mtime:
+            return set()
+        try:
+            return self.load()
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.error("❌ Configuration des serveurs illisible, ancienne version conservée: %s", e)
+            return set()
+
+    def _replace(self, configs):
+        changed = {
+            guild_id for guild_id in set(configs) | set(self._configs)
+            if self._configs.get(guild_id) is None
+            or configs.get(guild_id) is None
+            or self._configs[guild_id].to_dict() != configs[guild_id].to_dict()
+        }
+        self._configs = configs
+        self.enabled_ids = frozenset(g for g, c in configs.items() if c.enabled)
+        return changed
+
+    def update(self, guild_id, **changes):
+        """Modifie la configuration d'un serveur, l'écrit sur disque et met à jour le cache (bloquant)"""
+        with self._write_lock:
+            current = self._configs.get(guild_id) or GuildConfig(guild_id)
+            data = current.to_dict()
+            data.update(changes)
+            configs = dict(self._configs)
+            configs[guild_id] = GuildConfig.from_dict(guild_id, data)
+
+            stored = {
+                str(g): c.to_dict() for g, c in configs.items()
+                if g not in self._defaults or c.to_dict() != self._defaults[g].to_dict()
+            }
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"guilds": stored}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._mtime = self._mtime_now()
+
+        self._replace(configs)
+        return configs[guild_id]
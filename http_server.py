@@ -0,0 +1,153 @@
+"""Serveur HTTP de monitoring (uptime) exécuté sur la boucle asyncio du bot"""
+import logging
+import time
+
+from aiohttp import web
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+HOME_BODY = "Bot Discord Arrivées/Départ est en ligne !"
+
+
+def format_uptime(seconds):
+    return f"{seconds // 3600}h {(seconds % 3600) // 60}m {seconds % 60}s"
+
+
+class MonitoringServer:
+    """Endpoints `/`, `/ping`, `/status`, `/health` et `/metrics` servis par aiohttp.
+
+    Le serveur tourne sur la même boucle que la gateway Discord : les handlers
+    lisent l'état du bot sans concurrence de threads. Les connexions keep-alive
+    sont conservées entre deux requêtes du moniteur d'uptime.
+
+    `status_extras` est un callable optionnel dont le dictionnaire retourné est
+    fusionné dans la réponse de `/status`. `/metrics` n'est exposé que si un
+    `registry` (voir `metrics.Registry`) est fourni. Avec un `loop_monitor`
+    (voir `supervisor.LoopLagMonitor`), `/health` répond aussi 503 quand la
+    boucle a pris plus de `lag_threshold` secondes de retard.
+    """
+
+    def __init__(self, bot, start_time, status_extras=None, registry=None, keepalive_timeout=75.0,
+                 loop_monitor=None, lag_threshold=1.0):
+        self.bot = bot
+        self.loop_monitor = loop_monitor
+        self.lag_threshold = lag_threshold
+        self.start_time = start_time
+        self.status_extras = status_extras
+        self.registry = registry
+        self.keepalive_timeout = keepalive_timeout
+        self.ping_count = 0
+        self._runner = None
+
+        # Corps de /ping précalculé: seuls l'horodatage et le compteur varient
+        self._ping_second = 0
+        self._ping_prefix = b""
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get("/", self.home),
+            web.get("/ping", self.ping),
+            web.get("/status", self.status),
+            web.get("/health", self.health),
+        ])
+        if registry is not None:
+            self.app.add_routes([web.get("/metrics", self.metrics_endpoint)])
+
+    async def start(self, host="0.0.0.0", port=8080):
+        self._runner = web.AppRunner(
+            self.app,
+            access_log=None,  # Désactiver les logs d'accès pour éviter le spam
+            keepalive_timeout=self.keepalive_timeout,
+            handle_signals=False
+        )
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        logger.info("🌐 Serveur de monitoring démarré sur le port %s", port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def home(self, request):
+        metrics.HTTP_REQUESTS.inc("/")
+        return web.Response(text=HOME_BODY)
+
+    async def ping(self, request):
+        """Endpoint ultra-rapide pour uptime monitoring"""
+        metrics.HTTP_REQUESTS.inc("/ping")
+        self.ping_count += 1
+        now = int(time.time())
+        if now != self._ping_second:
+            self._ping_second = now
+            self._ping_prefix = b'{"pong": true, "timestamp": %d, "ping_count": ' % now
+        return web.Response(
+            body=self._ping_prefix + b"%d}" % self.ping_count,
+            content_type="application/json"
+        )
+
+    async def status(self, request):
+        """Endpoint détaillé avec informations complètes"""
+        metrics.HTTP_REQUESTS.inc("/status")
+        self.ping_count += 1
+        bot = self.bot
+        uptime = int(time.time() - self.start_time)
+
+        # Vérifier l'état du bot
+        is_ready = bot.is_ready()
+        data = {
+            "status": "online" if is_ready else "connecting",
+            "bot": "discord-arrivees-depart",
+            "uptime_seconds": uptime,
+            "uptime_formatted": format_uptime(uptime),
+            "ping_count": self.ping_count,
+            "guilds": len(bot.guilds) if is_ready else 0,
+            "timestamp": int(time.time()),
+            "user_id": str(bot.user.id) if bot.user else None,
+            "latency_ms": round(bot.latency * 1000, 2) if is_ready else None,
+        }
+        if self.status_extras is not None:
+            data.update(self.status_extras())
+        return web.json_response(data)
+
+    async def health(self, request):
+        """Vérification de santé détaillée"""
+        metrics.HTTP_REQUESTS.inc("/health")
+        try:
+            bot = self.bot
+            is_ready = bot.is_ready()
+            is_healthy = is_ready and len(bot.guilds) > 0
+            loop_ok = self.loop_monitor is None or self.loop_monitor.healthy(self.lag_threshold)
+            is_healthy = is_healthy and loop_ok
+
+            data = {
+                "healthy": is_healthy,
+                "bot_ready": is_ready,
+                "guilds_connected": len(bot.guilds) if is_ready else 0,
+                "latency_ms": round(bot.latency * 1000, 2) if is_ready else None,
+                "timestamp": int(time.time()),
+                "uptime_seconds": int(time.time() - self.start_time)
+            }
+            if self.loop_monitor is not None:
+                data["loop_healthy"] = loop_ok
+                data.update(self.loop_monitor.snapshot())
+            return web.json_response(data, status=200 if is_healthy else 503)
+
+        except Exception as e:
+            logger.error("Health check error: %s", e)
+            return web.json_response(
+                {"healthy": False, "error": "Health check failed", "timestamp": int(time.time())},
+                status=503
+            )
+
+    async def metrics_endpoint(self, request):
+        """Métriques au format texte Prometheus"""
+        metrics.HTTP_REQUESTS.inc("/metrics")
+        return web.Response(
+            text=self.registry.render(),
+            content_type="text/plain",
+            charset="utf-8"
+        )
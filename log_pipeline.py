@@ -0,0 +1,157 @@
+"""Journalisation asynchrone: file en mémoire, écriture par un thread dédié, format texte ou JSON"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+# Champs structurés recopiés tels quels dans les lignes JSON (passés via `extra=`)
+STRUCTURED_FIELDS = ("event", "case", "guild_id", "member_id", "channel_id", "duration_ms")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def parse_spec(value, cast):
+    """Lit une spécification `type=valeur,type=valeur` (ex: LOG_SAMPLE=voice=0.1)"""
+    spec = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        key, _, raw = item.partition("=")
+        spec[key.strip()] = cast(raw)
+    return spec
+
+
+class SamplingFilter(logging.Filter):
+    """Échantillonnage et plafond de débit par type d'événement.
+
+    Seuls les enregistrements portant un attribut `event` sont concernés.
+    `sample_rates[event]` garde une fraction des enregistrements (1 sur
+    round(1 / taux), de façon déterministe) et `rate_caps[event]` limite leur
+    nombre par seconde. Le filtre s'exécute avant la mise en file : un
+    enregistrement écarté n'est jamais formaté. Sur le chemin critique,
+    `allow(event)` peut être appelé avant même de créer l'enregistrement, qui
+    est alors marqué `sampled=True` pour ne pas être compté deux fois.
+    """
+
+    def __init__(self, sample_rates=None, rate_caps=None, clock=time.monotonic):
+        super().__init__()
+        self._every = {
+            event: max(1, round(1 / rate)) if rate > 0 else 0
+            for event, rate in (sample_rates or {}).items()
+        }
+        self._caps = dict(rate_caps or {})
+        self._clock = clock
+        self._seen = {}
+        # event -> (seconde courante, enregistrements gardés dans cette seconde)
+        self._windows = {}
+        self.dropped = 0
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        if event is None or getattr(record, "sampled", False):
+            return True
+        return self.allow(event)
+
+    def allow(self, event):
+        """Décide si un enregistrement de ce type est gardé (et le comptabilise)"""
+        every = self._every.get(event)
+        if every is not None:
+            seen = self._seen.get(event, 0)
+            self._seen[event] = seen + 1
+            if every == 0 or seen % every:
+                self.dropped += 1
+                return False
+        cap = self._caps.get(event)
+        if cap is not None:
+            second = int(self._clock())
+            start, count = self._windows.get(event, (second, 0))
+            if start != second:
+                start, count = second, 0
+            if count >= cap:
+                self.dropped += 1
+                return False
+            self._windows[event] = (start, count + 1)
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Met l'enregistrement en file sans le formater (fait par le thread d'écriture).
+
+    `QueueHandler.prepare()` formate le message pour pouvoir le transmettre à
+    un autre processus ; la file étant ici en mémoire, l'enregistrement est
+    transmis tel quel.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    """Format texte historique, sans retour à la ligne injecté par les noms de membres.
+
+    Les enregistrements marqués `extra={"multiline": True}` (piles d'appels
+    construites par le bot) gardent leurs retours à la ligne.
+    """
+
+    def format(self, record):
+        text = super().format(record)
+        if record.exc_info or record.stack_info or getattr(record, "multiline", False):
+            return text
+        return text.replace("\r", "").replace("\n", " ")
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement, avec les champs structurés éventuels"""
+
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(level="INFO", fmt="text", sample_rates=None, rate_caps=None, stream=None):
+    """Installe la file de journalisation sur le logger racine et démarre le thread d'écriture.
+
+    Retourne `(listener, sampling_filter)` ; `listener.stop()` vide la file
+    (appelé aussi à la sortie du processus).
+    """
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    # Niveau aussi sur la sortie: un logger réglé plus bas (ex. `discord.http`, lu pour les
+    # métriques) ne doit pas faire apparaître ses enregistrements sous le niveau configuré
+    handler.setLevel(level)
+    sampling = SamplingFilter(sample_rates, rate_caps)
+    handler.addFilter(sampling)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener, sampling
+
+
+def stop_listener(listener):
+    """Vide la file et arrête le thread d'écriture (sans erreur s'il est déjà arrêté)"""
+    if listener._thread is not None:
+        listener.stop()
@@ -0,0 +1,70 @@
+"""Options de cache des membres et cache compact des noms des membres passés en vocal"""
+from collections import OrderedDict
+
+import discord
+
+
+def client_options(lean=False, prefix_commands=True):
+    """Intents et options de cache du client.
+
+    En mode allégé, discord.py ne garde en cache que les membres présents en
+    vocal (`MemberCacheFlags` limité à `voice`) : l'intent `members` et le
+    chargement des membres au démarrage (chunking) sont désactivés, de même que
+    le cache des messages. Les messages (et l'intent `message_content`) ne sont
+    reçus que si les commandes préfixées (`!status`...) sont actives : les
+    commandes slash passent par les interactions.
+
+    Sans intent `members`, les changements de rôles du bot ne sont pas
+    garantis : ses permissions sont alors recalculées sur les mises à jour de
+    rôles et de serveur.
+    """
+    intents = discord.Intents.default()
+    intents.voice_states = True
+    intents.guilds = True
+    intents.members = not lean
+    intents.messages = prefix_commands
+    intents.message_content = prefix_commands
+
+    options = {"intents": intents}
+    if lean:
+        member_cache_flags = discord.MemberCacheFlags.none()
+        member_cache_flags.voice = True
+        options.update(
+            member_cache_flags=member_cache_flags,
+            chunk_guilds_at_startup=False,
+            max_messages=None,
+        )
+    else:
+        options["max_messages"] = 1000  # Limiter le cache des messages
+    return options
+
+
+class NameCache:
+    """Noms affichés des membres vus en vocal, bornés en nombre (LRU).
+
+    Sert de repli quand le membre n'est plus dans le cache de discord.py
+    (mode allégé : parti du vocal, ou parti pendant l'absence du bot).
+    """
+    __slots__ = ("max_size", "_names")
+
+    def __init__(self, max_size=50000):
+        self.max_size = max_size
+        # (guild_id, member_id) -> nom affiché
+        self._names = OrderedDict()
+
+    def __len__(self):
+        return len(self._names)
+
+    def remember(self, guild_id, member_id, name):
+        key = (guild_id, member_id)
+        names = self._names
+        if names.get(key) == name:
+            names.move_to_end(key)
+            return
+        names[key] = name
+        names.move_to_end(key)
+        if len(names) > self.max_size:
+            names.popitem(last=False)
+
+    def get(self, guild_id, member_id, default=None):
+        return self._names.get((guild_id, member_id), default)
@@ -0,0 +1,203 @@
+"""Compteurs et histogrammes exposés au format texte Prometheus sur /metrics"""
+import logging
+import threading
+from bisect import bisect_left
+
+# Bornes (en secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Compteur, optionnellement découpé selon une étiquette.
+
+    Les valeurs d'étiquette connues à l'avance (`labels`) sont préallouées;
+    une nouvelle valeur n'alloue qu'à sa première apparition.
+    """
+
+    def __init__(self, name, documentation, label=None, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = {value: 0 for value in labels} if label else {None: 0}
+
+    def inc(self, label_value=None, amount=1):
+        with self._lock:
+            try:
+                self._values[label_value] += amount
+            except KeyError:
+                self._values[label_value] = amount
+
+    def value(self, label_value=None):
+        return self._values.get(label_value, 0)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for label_value, count in items:
+            if self.label:
+                yield f'{self.name}{{{self.label}="{_escape_label(label_value)}"}} {count}'
+            else:
+                yield f"{self.name} {count}"
+
+
+class _HistogramValues:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Histogramme à bornes fixes, optionnellement découpé selon une étiquette.
+
+    `observe()` ne fait qu'une recherche dichotomique et trois incréments sur
+    des structures préallouées.
+    """
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = {}
+        if label is None:
+            self._values[None] = _HistogramValues(len(self.buckets) + 1)
+
+    def observe(self, value, label_value=None):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(label_value)
+            if values is None:
+                values = self._values[label_value] = _HistogramValues(len(self.buckets) + 1)
+            values.counts[index] += 1
+            values.total += value
+            values.count += 1
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = [
+                (label_value, list(values.counts), values.total, values.count)
+                for label_value, values in self._values.items()
+            ]
+        for label_value, counts, total, count in snapshot:
+            prefix = f'{self.label}="{_escape_label(label_value)}",' if self.label else ""
+            suffix = f'{{{prefix[:-1]}}}' if prefix else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{{{prefix}le="{_format_value(float(bound))}"}} {cumulative}'
+            yield f"{self.name}_sum{suffix} {_format_value(total)}"
+            yield f"{self.name}_count{suffix} {count}"
+
+
+class CallbackMetric:
+    """Valeur lue au moment de l'export (profondeur de file, compteurs externes...)"""
+
+    def __init__(self, name, documentation, callback, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.kind = kind
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield f"{self.name} {_format_value(self.callback())}"
+
+
+class RateLimitLogHandler(logging.Handler):
+    """Compte les 429 signalés par discord.py, qui les réessaie sans les remonter"""
+
+    def emit(self, record):
+        if "responded with 429" in str(record.msg):
+            RATE_LIMIT_HITS.inc()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+# Cas de on_voice_state_update: 3a/3b/3c correspondent aux changements de salon
+VOICE_CASES = ("join", "leave", "3a", "3b", "3c", "reconnect", "filtered")
+
+VOICE_EVENTS = REGISTRY.register(Counter(
+    "voice_events_received_total",
+    "Événements vocaux reçus par cas de traitement",
+    label="case",
+    labels=VOICE_CASES
+))
+HANDLER_DURATION = REGISTRY.register(Histogram(
+    "voice_event_handler_seconds",
+    "Durée de traitement de on_voice_state_update",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+))
+SEND_LATENCY = REGISTRY.register(Histogram(
+    "notification_send_seconds",
+    "Durée de channel.send par salon",
+    label="channel"
+))
+SEND_FAILURES = REGISTRY.register(Counter(
+    "notification_send_failures_total",
+    "Échecs de channel.send par salon",
+    label="channel"
+))
+DELIVERY_LATENCY = REGISTRY.register(Histogram(
+    "notification_delivery_seconds",
+    "Délai entre l'événement vocal et l'envoi de sa notification"
+))
+RATE_LIMIT_HITS = REGISTRY.register(Counter(
+    "discord_rate_limit_hits_total",
+    "Réponses 429 reçues de l'API Discord (comptées depuis les logs de discord.py)"
+))
+RATE_LIMIT_FAILURES = REGISTRY.register(Counter(
+    "notification_rate_limit_failures_total",
+    "Envois abandonnés sur un 429 (attente trop longue ou essais épuisés)"
+))
+GATEWAY_LATENCY = REGISTRY.register(Histogram(
+    "gateway_latency_seconds",
+    "Latence de la gateway Discord échantillonnée périodiquement",
+    buckets=(0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0)
+))
+LOOP_LAG = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds",
+    "Retard d'ordonnancement de la boucle asyncio",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total",
+    "Requêtes reçues par endpoint de monitoring",
+    label="path",
+    labels=("/", "/ping", "/status", "/health", "/metrics")
+))
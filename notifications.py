@@ -0,0 +1,169 @@
+"""File d'attente de notifications par salon avec regroupement des événements vocaux"""
+import asyncio
+import time
+
+from dispatcher import MAX_MESSAGE_LENGTH, Notification
+from templates import DEFAULT_SET, escape_name
+
+# Types d'événements gérés par la file
+JOIN = "join"
+LEAVE = "leave"
+MOVE_OUT = "move_out"
+MOVE_IN = "move_in"
+# Déconnexion suivie d'un retour rapide dans le même salon (voir `flap`)
+RECONNECT = "reconnect"
+
+ARRIVALS = (JOIN, MOVE_IN)
+DEPARTURES = (LEAVE, MOVE_OUT)
+
+
+def split_message(lines, limit=MAX_MESSAGE_LENGTH):
+    """Découpe les lignes en messages respectant la limite de Discord"""
+    messages = []
+    current = ""
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 1] + "…"
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            messages.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        messages.append(current)
+    return messages
+
+
+class VoiceEvent:
+    """Événement vocal en attente d'envoi"""
+    __slots__ = ("kind", "member_id", "name", "other", "enqueued_at", "detail")
+
+    def __init__(self, kind, member_id, name, other, enqueued_at, detail=None):
+        self.kind = kind
+        self.member_id = member_id
+        self.name = name
+        self.other = other
+        self.enqueued_at = enqueued_at
+        # Précision affichée après le nom (ex: durée de la session précédente)
+        self.detail = detail
+
+
+class _ChannelBatch:
+    """Lot d'événements en attente pour un salon"""
+    __slots__ = ("channel", "events", "timer")
+
+    def __init__(self, channel):
+        self.channel = channel
+        # Un seul événement par membre, l'ordre d'insertion est conservé
+        self.events = {}
+        self.timer = None
+
+
+class NotificationCoalescer:
+    """Regroupe les arrivées/départs d'un même salon sur une courte fenêtre.
+
+    Chaque salon possède son propre lot : le premier événement arme un minuteur
+    de `window` secondes, à l'expiration duquel un seul message est envoyé pour
+    tout le lot. Un lot qui atteint `max_batch` événements est envoyé
+    immédiatement. Une arrivée suivie d'un départ du même membre (ou
+    l'inverse) dans la fenêtre s'annulent.
+
+    Les messages produits sont transmis à `sink` (par exemple
+    `NotificationDispatcher.submit`) sous forme de `Notification`. Ils sont
+    rendus avec les modèles du serveur retournés par `templates_lookup(guild_id)`.
+    """
+
+    def __init__(self, sink, window=2.0, max_batch=25, clock=time.monotonic, templates_lookup=None):
+        self._sink = sink
+        self._templates_lookup = templates_lookup or (lambda guild_id: DEFAULT_SET)
+        self.window = window
+        self.max_batch = max_batch
+        self._clock = clock
+        self._batches = {}
+
+        # Statistiques
+        self.events_received = 0
+        self.events_cancelled = 0
+        self.messages_sent = 0
+
+    def push(self, channel, kind, member_id, display_name, other=None, detail=None):
+        """Ajoute un événement au lot du salon (sans attendre l'envoi).
+
+        `other` est le salon d'origine ou de destination d'un déplacement.
+        """
+        self.events_received += 1
+        batch = self._batches.get(channel.id)
+        if batch is None:
+            batch = self._batches[channel.id] = _ChannelBatch(channel)
+
+        previous = batch.events.get(member_id)
+        if previous is not None and kind == RECONNECT:
+            # L'événement déjà en attente (arrivée...) reste plus informatif
+            return
+        batch.events.pop(member_id, None)
+        if previous is not None and self._cancels(previous.kind, kind):
+            # Événements contradictoires: rien à annoncer pour ce membre
+            self.events_cancelled += 2
+            if not batch.events:
+                self._discard(channel.id)
+            return
+
+        batch.events[member_id] = VoiceEvent(
+            kind,
+            member_id,
+            escape_name(member_id, display_name),
+            escape_name(other.id, other.name) if other is not None else None,
+            previous.enqueued_at if previous is not None else self._clock(),
+            detail,
+        )
+
+        if len(batch.events) >= self.max_batch or self.window <= 0:
+            self._flush(channel.id)
+        elif batch.timer is None:
+            loop = asyncio.get_running_loop()
+            batch.timer = loop.call_later(self.window, self._flush, channel.id)
+
+    @staticmethod
+    def _cancels(previous_kind, kind):
+        """Une arrivée et un départ successifs s'annulent"""
+        return (
+            (previous_kind in ARRIVALS and kind in DEPARTURES)
+            or (previous_kind in DEPARTURES and kind in ARRIVALS)
+        )
+
+    def has_arrival(self, channel_id, member_id):
+        """Vrai si une arrivée du membre dans ce salon attend encore d'être envoyée"""
+        batch = self._batches.get(channel_id)
+        if batch is None:
+            return False
+        event = batch.events.get(member_id)
+        return event is not None and event.kind in ARRIVALS
+
+    def _discard(self, channel_id):
+        batch = self._batches.pop(channel_id, None)
+        if batch is not None and batch.timer is not None:
+            batch.timer.cancel()
+
+    def _flush(self, channel_id):
+        batch = self._batches.pop(channel_id, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        if not batch.events:
+            return
+
+        events = list(batch.events.values())
+        templates = self._templates_lookup(batch.channel.guild.id)
+        contents = split_message(templates.render_lines(events))
+        for index, content in enumerate(contents):
+            # Les horodatages sont rattachés au dernier message du lot
+            event_times = tuple(event.enqueued_at for event in events) if index == len(contents) - 1 else ()
+            if self._sink(Notification(batch.channel, content, event_times)):
+                self.messages_sent += 1
+
+    def flush_all(self):
+        """Transmet immédiatement tous les lots en attente"""
+        for channel_id in list(self._batches):
+            self._flush(channel_id)
@@ -0,0 +1,90 @@
+"""Compteurs d'occupation des salons surveillés, tenus à jour à chaque événement vocal"""
+import time
+
+
+class GuildOccupancy:
+    """Occupation d'un serveur: membres par salon, total et pic de connexions simultanées"""
+    __slots__ = ("counts", "total", "peak", "peak_at", "version")
+
+    def __init__(self):
+        # channel_id -> nombre de membres
+        self.counts = {}
+        self.total = 0
+        self.peak = 0
+        self.peak_at = None
+        # Incrémenté à chaque changement (invalidation des embeds en cache)
+        self.version = 0
+
+
+class OccupancyTracker:
+    """Occupation des salons surveillés, mise à jour en O(1) par `move()`.
+
+    Le gestionnaire vocal appelle `move()` à chaque changement de salon ;
+    `reset()` recompte un serveur à partir du cache de discord.py (démarrage,
+    reconstruction de l'index). Les commandes et `/status` lisent les compteurs
+    sans parcourir les salons ni leurs membres.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._guilds = {}
+        self._summary = None
+        self._summary_version = None
+        # Incrémenté à chaque changement, tous serveurs confondus
+        self.version = 0
+
+    def guild(self, guild_id):
+        occupancy = self._guilds.get(guild_id)
+        if occupancy is None:
+            occupancy = self._guilds[guild_id] = GuildOccupancy()
+        return occupancy
+
+    def move(self, guild_id, before_id=None, after_id=None):
+        """Un membre quitte `before_id` et/ou rejoint `after_id` (None: salon non surveillé)"""
+        occupancy = self.guild(guild_id)
+        counts = occupancy.counts
+        if before_id is not None and counts.get(before_id, 0) > 0:
+            counts[before_id] -= 1
+            occupancy.total -= 1
+        if after_id is not None:
+            counts[after_id] = counts.get(after_id, 0) + 1
+            occupancy.total += 1
+            if occupancy.total > occupancy.peak:
+                occupancy.peak = occupancy.total
+                occupancy.peak_at = self._clock()
+        occupancy.version += 1
+        self.version += 1
+
+    def reset(self, guild_id, channels):
+        """Recompte l'occupation d'un serveur à partir de ses salons surveillés"""
+        occupancy = self.guild(guild_id)
+        occupancy.counts = {channel.id: len(channel.members) for channel in channels}
+        occupancy.total = sum(occupancy.counts.values())
+        if occupancy.total > occupancy.peak:
+            occupancy.peak = occupancy.total
+            occupancy.peak_at = self._clock()
+        occupancy.version += 1
+        self.version += 1
+
+    def remove_guild(self, guild_id):
+        if self._guilds.pop(guild_id, None) is not None:
+            self.version += 1
+
+    def count(self, guild_id, channel_id):
+        occupancy = self._guilds.get(guild_id)
+        return occupancy.counts.get(channel_id, 0) if occupancy else 0
+
+    def summary(self):
+        """Résumé de tous les serveurs (pour /status), recalculé seulement s'il a changé"""
+        if self._summary_version != self.version:
+            self._summary = {
+                str(guild_id): {
+                    "users_in_voice": occupancy.total,
+                    "active_channels": sum(1 for count in occupancy.counts.values() if count),
+                    "peak_users": occupancy.peak,
+                    "peak_at": int(occupancy.peak_at) if occupancy.peak_at else None,
+                }
+                for guild_id, occupancy in self._guilds.items()
+            }
+            self._summary_version = self.version
+        return self._summary
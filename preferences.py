@@ -0,0 +1,130 @@
+"""Préférences de notification par membre et par salon, stockées comme drapeaux entiers"""
+import json
+import os
+import threading
+
+from notifications import JOIN, LEAVE, MOVE_IN, MOVE_OUT, RECONNECT
+
+# Drapeaux (membre ou salon)
+OPT_OUT = 1        # aucune notification (membre: ses passages ne sont pas annoncés ; salon: muet)
+JOIN_ONLY = 2      # seulement les arrivées (connexion, arrivée depuis un autre salon, retour)
+SILENT_MOVES = 4   # pas d'annonce des changements de salon
+
+FLAG_NAMES = {"opt_out": OPT_OUT, "join_only": JOIN_ONLY, "silent_moves": SILENT_MOVES}
+ALL_FLAGS = OPT_OUT | JOIN_ONLY | SILENT_MOVES
+
+# Bit de chaque type de notification
+KIND_BITS = {JOIN: 1, LEAVE: 2, MOVE_IN: 4, MOVE_OUT: 8, RECONNECT: 16}
+ALL_KINDS = 31
+
+
+def _suppressed_kinds(flags):
+    kinds = 0
+    if flags & OPT_OUT:
+        kinds |= ALL_KINDS
+    if flags & JOIN_ONLY:
+        kinds |= KIND_BITS[LEAVE] | KIND_BITS[MOVE_OUT]
+    if flags & SILENT_MOVES:
+        kinds |= KIND_BITS[MOVE_IN] | KIND_BITS[MOVE_OUT]
+    return kinds
+
+
+# Types de notification supprimés, indexés par combinaison de drapeaux
+SUPPRESSED = tuple(_suppressed_kinds(flags) for flags in range(ALL_FLAGS + 1))
+
+
+def flag_names(flags):
+    return [name for name, flag in FLAG_NAMES.items() if flags & flag]
+
+
+class PreferenceStore:
+    """Drapeaux de notification en mémoire, adossés à un fichier JSON.
+
+    Membres: {guild_id: {member_id: drapeaux}} ; salons: {channel_id: drapeaux}
+    (les IDs de salon sont uniques sur Discord). `allows()` ne fait que des
+    accès aux dictionnaires et des opérations sur des petits entiers, sans
+    allocation : un serveur sans préférences s'arrête au premier accès.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._members = {}
+        self._channels = {}
+        self._write_lock = threading.Lock()
+        # Incrémenté à chaque modification ; la dernière version écrite n'est jamais écrasée par une plus ancienne
+        self.changes = 0
+        self._saved = 0
+
+    def __len__(self):
+        return sum(map(len, self._members.values())) + len(self._channels)
+
+    def member_flags(self, guild_id, member_id):
+        members = self._members.get(guild_id)
+        return members.get(member_id, 0) if members else 0
+
+    def channel_flags(self, channel_id):
+        return self._channels.get(channel_id, 0)
+
+    def allows(self, guild_id, member_id, channel_id, kind):
+        """Vrai si la notification `kind` de ce membre dans ce salon doit être envoyée"""
+        flags = self._channels.get(channel_id, 0)
+        members = self._members.get(guild_id)
+        if members:
+            flags |= members.get(member_id, 0)
+        return not SUPPRESSED[flags] & KIND_BITS[kind]
+
+    def set_member(self, guild_id, member_id, flags):
+        self.changes += 1
+        members = self._members.setdefault(guild_id, {})
+        if flags:
+            members[member_id] = flags
+        else:
+            members.pop(member_id, None)
+            if not members:
+                del self._members[guild_id]
+
+    def set_channel(self, channel_id, flags):
+        self.changes += 1
+        if flags:
+            self._channels[channel_id] = flags
+        else:
+            self._channels.pop(channel_id, None)
+
+    # --- Persistance ---
+
+    def snapshot(self):
+        """Copie sérialisable et sa version (à construire sur la boucle, puis écrire avec `save()` hors de la boucle)"""
+        return self.changes, {
+            "members": {
+                str(guild_id): {str(member_id): flags for member_id, flags in members.items()}
+                for guild_id, members in self._members.items()
+            },
+            "channels": {str(channel_id): flags for channel_id, flags in self._channels.items()},
+        }
+
+    def load(self):
+        """Charge le fichier (bloquant) ; absent: aucune préférence"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        self._members = {
+            int(guild_id): {int(member_id): flags & ALL_FLAGS for member_id, flags in members.items() if flags}
+            for guild_id, members in data.get("members", {}).items()
+        }
+        self._channels = {
+            int(channel_id): flags & ALL_FLAGS for channel_id, flags in data.get("channels", {}).items() if flags
+        }
+
+    def save(self, snapshot):
+        """Écrit une copie obtenue par `snapshot()` de façon atomique, sauf si une plus récente l'a été (bloquant)"""
+        version, data = snapshot
+        with self._write_lock:
+            if version <= self._saved:
+                return
+            self._saved = version
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,272 @@
+"""Stockage persistant des sessions vocales (SQLite en mode WAL)"""
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    member_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_member ON sessions (guild_id, member_id, ended_at);
+
+CREATE TABLE IF NOT EXISTS member_totals (
+    guild_id INTEGER NOT NULL,
+    member_id INTEGER NOT NULL,
+    total_seconds REAL NOT NULL,
+    session_count INTEGER NOT NULL,
+    last_channel_id INTEGER NOT NULL,
+    last_ended_at REAL NOT NULL,
+    last_duration REAL NOT NULL,
+    PRIMARY KEY (guild_id, member_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_member_totals_top ON member_totals (guild_id, total_seconds DESC);
+CREATE INDEX IF NOT EXISTS idx_member_totals_recent ON member_totals (last_ended_at);
+
+CREATE TABLE IF NOT EXISTS channel_totals (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    total_seconds REAL NOT NULL,
+    session_count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, channel_id)
+) WITHOUT ROWID;
+"""
+
+UPSERT_MEMBER = """
+INSERT INTO member_totals (guild_id, member_id, total_seconds, session_count, last_channel_id, last_ended_at, last_duration)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (guild_id, member_id) DO UPDATE SET
+    total_seconds = total_seconds + excluded.total_seconds,
+    session_count = session_count + excluded.session_count,
+    last_channel_id = excluded.last_channel_id,
+    last_ended_at = excluded.last_ended_at,
+    last_duration = excluded.last_duration
+"""
+
+UPSERT_CHANNEL = """
+INSERT INTO channel_totals (guild_id, channel_id, total_seconds, session_count)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (guild_id, channel_id) DO UPDATE SET
+    total_seconds = total_seconds + excluded.total_seconds,
+    session_count = session_count + excluded.session_count
+"""
+
+_STOP = object()
+
+
+def format_duration(seconds):
+    """Durée lisible: 45 s, 12 min, 1h 05m"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min"
+    return f"{seconds // 3600}h {(seconds % 3600) // 60:02d}m"
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SessionStore:
+    """Sessions vocales (membre, salon, début, fin) et agrégats indexés.
+
+    Le gestionnaire d'événements ne touche qu'à des dictionnaires en mémoire :
+    les sessions terminées sont mises en file et écrites par lots par un thread
+    dédié, qui met à jour dans la même transaction les tables d'agrégats
+    `member_totals` et `channel_totals` utilisées par `!stats` et `!top`.
+    """
+
+    def __init__(self, path, flush_interval=1.0, batch_size=500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # (guild_id, member_id) -> (channel_id, started_at)
+        self.open_sessions = {}
+        # (guild_id, member_id) -> durée de la dernière session terminée
+        self.last_durations = {}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._read_conn = None
+        self._read_lock = threading.Lock()
+
+        self.sessions_written = 0
+        # Incrémenté à chaque ouverture/fermeture (détection des changements pour l'instantané)
+        self.changes = 0
+
+    def start(self):
+        """Crée le schéma et démarre le thread d'écriture"""
+        conn = connect(self.path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._read_conn = connect(self.path)
+        self._thread = threading.Thread(target=self._run, name="session-store-flusher", daemon=True)
+        self._thread.start()
+
+    async def load_recent(self, max_age_days=30):
+        """Précharge la durée de la dernière session des membres actifs récemment"""
+        since = time.time() - max_age_days * 86400
+        rows = await self._read(
+            "SELECT guild_id, member_id, last_duration FROM member_totals WHERE last_ended_at >= ?",
+            (since,)
+        )
+        for guild_id, member_id, last_duration in rows:
+            self.last_durations.setdefault((guild_id, member_id), last_duration)
+        return len(rows)
+
+    # --- Chemin critique (boucle asyncio, sans E/S) ---
+
+    def open_session(self, guild_id, member_id, channel_id, now=None):
+        """Ouvre une session et retourne la durée de la précédente (ou None)"""
+        key = (guild_id, member_id)
+        if key in self.open_sessions:
+            self.close_session(guild_id, member_id, now)
+        self.open_sessions[key] = (channel_id, now if now is not None else time.time())
+        self.changes += 1
+        return self.last_durations.get(key)
+
+    def restore_session(self, guild_id, member_id, channel_id, started_at):
+        """Reprend une session commencée avant un redémarrage"""
+        self.open_sessions[(guild_id, member_id)] = (channel_id, started_at)
+        self.changes += 1
+
+    def close_session(self, guild_id, member_id, now=None):
+        """Termine la session en cours du membre et retourne sa durée (ou None)"""
+        key = (guild_id, member_id)
+        opened = self.open_sessions.pop(key, None)
+        if opened is None:
+            return None
+        channel_id, started_at = opened
+        ended_at = now if now is not None else time.time()
+        duration = max(0.0, ended_at - started_at)
+        self.last_durations[key] = duration
+        self.changes += 1
+        self._queue.put_nowait((guild_id, member_id, channel_id, started_at, ended_at))
+        return duration
+
+    def current_session(self, guild_id, member_id):
+        return self.open_sessions.get((guild_id, member_id))
+
+    def snapshot_entries(self):
+        """Sessions ouvertes au format de `snapshot.save`"""
+        return [
+            (guild_id, channel_id, member_id, started_at)
+            for (guild_id, member_id), (channel_id, started_at) in self.open_sessions.items()
+        ]
+
+    def pending(self):
+        """Sessions terminées pas encore écrites par le thread d'écriture"""
+        return self._queue.qsize()
+
+    # --- Thread d'écriture ---
+
+    def _run(self):
+        conn = connect(self.path)
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            if first is _STOP:
+                stopping = True
+            else:
+                batch.append(first)
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self._write(conn, batch)
+                except sqlite3.Error as e:
+                    logger.error("❌ Erreur écriture des sessions vocales: %s", e)
+        conn.close()
+
+    def _write(self, conn, batch):
+        members = {}
+        channels = {}
+        for guild_id, member_id, channel_id, started_at, ended_at in batch:
+            duration = ended_at - started_at
+            total, count, last = members.get((guild_id, member_id), (0.0, 0, None))
+            if last is None or ended_at >= last[1]:
+                last = (channel_id, ended_at, duration)
+            members[(guild_id, member_id)] = (total + duration, count + 1, last)
+            total, count = channels.get((guild_id, channel_id), (0.0, 0))
+            channels[(guild_id, channel_id)] = (total + duration, count + 1)
+
+        with conn:
+            conn.executemany(
+                "INSERT INTO sessions (guild_id, member_id, channel_id, started_at, ended_at) VALUES (?, ?, ?, ?, ?)",
+                batch
+            )
+            conn.executemany(
+                UPSERT_MEMBER,
+                [key + (total, count) + last for key, (total, count, last) in members.items()]
+            )
+            conn.executemany(UPSERT_CHANNEL, [key + values for key, values in channels.items()])
+        self.sessions_written += len(batch)
+
+    def close(self):
+        """Écrit les sessions en attente puis arrête le thread (bloquant)"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        if self._read_conn is not None:
+            self._read_conn.close()
+            self._read_conn = None
+
+    # --- Lectures (exécutées hors de la boucle) ---
+
+    def _read_sync(self, sql, params):
+        with self._read_lock:
+            return self._read_conn.execute(sql, params).fetchall()
+
+    async def _read(self, sql, params=()):
+        return await asyncio.to_thread(self._read_sync, sql, params)
+
+    async def member_stats(self, guild_id, member_id):
+        """Agrégats d'un membre, ou None s'il n'a aucune session enregistrée"""
+        rows = await self._read(
+            "SELECT total_seconds, session_count, last_channel_id, last_ended_at, last_duration "
+            "FROM member_totals WHERE guild_id = ? AND member_id = ?",
+            (guild_id, member_id)
+        )
+        if not rows:
+            return None
+        total_seconds, session_count, last_channel_id, last_ended_at, last_duration = rows[0]
+        return {
+            "total_seconds": total_seconds,
+            "session_count": session_count,
+            "last_channel_id": last_channel_id,
+            "last_ended_at": last_ended_at,
+            "last_duration": last_duration,
+        }
+
+    async def top(self, guild_id, limit=10):
+        """Membres ayant passé le plus de temps en vocal: [(member_id, total_seconds, session_count)]"""
+        return await self._read(
+            "SELECT member_id, total_seconds, session_count FROM member_totals "
+            "WHERE guild_id = ? ORDER BY total_seconds DESC LIMIT ?",
+            (guild_id, limit)
+        )
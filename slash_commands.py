@@ -0,0 +1,86 @@
+"""Commandes slash: cache court des réponses et synchronisation versionnée de l'arbre des commandes"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Réponses (embeds) déjà construites, réutilisées pendant `ttl` secondes.
+
+    Une rafale de `/status` sur un serveur ne reconstruit la réponse qu'une
+    fois par période ; les réponses étant éphémères, chaque utilisateur reçoit
+    tout de même la sienne.
+    """
+
+    def __init__(self, ttl=5.0, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        # clé -> (date d'expiration, réponse)
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """Réponse en cache pour `key`, ou construite par `build()` si absente ou expirée"""
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        response = build()
+        if self.ttl > 0:
+            self._entries[key] = (now + self.ttl, response)
+        return response
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+def tree_version(tree, application_id):
+    """Empreinte de la définition des commandes (change dès qu'une commande, option ou traduction change)"""
+    payload = {
+        "application_id": application_id,
+        "commands": sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda c: c["name"]),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def read_synced_version(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def write_synced_version(path, version):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "synced_at": int(time.time())}, f)
+    os.replace(tmp_path, path)
+
+
+async def sync_command_tree(tree, application_id, path):
+    """Envoie l'arbre des commandes à Discord seulement si sa définition a changé depuis la dernière synchronisation.
+
+    La version synchronisée est conservée dans `path` : un redémarrage sans
+    changement de commandes ne fait aucun appel à l'API (la synchronisation
+    est limitée en débit par Discord). Retourne True si l'arbre a été envoyé.
+    """
+    version = tree_version(tree, application_id)
+    if await asyncio.to_thread(read_synced_version, path) == version:
+        logger.info("🌲 Commandes slash déjà à jour (version %s)", version[:12])
+        return False
+    synced = await tree.sync()
+    await asyncio.to_thread(write_synced_version, path, version)
+    logger.info("🌲 %s commande(s) slash synchronisée(s) (version %s)", len(synced), version[:12])
+    return True
@@ -0,0 +1,89 @@
+"""Instantané compact de l'occupation des salons surveillés, pour la réconciliation au démarrage"""
+import os
+import struct
+import sys
+from array import array
+
+# En-tête: signature, version, horodatage de l'instantané, nombre d'entrées
+MAGIC = b"VSNP"
+VERSION = 1
+HEADER = struct.Struct("<4sHdI")
+
+
+def encode(entries, taken_at):
+    """Encode [(guild_id, channel_id, member_id, started_at)] en binaire"""
+    ids = array("Q")
+    starts = array("d")
+    for guild_id, channel_id, member_id, started_at in entries:
+        ids.extend((guild_id, channel_id, member_id))
+        starts.append(started_at)
+    # Format petit-boutiste indépendant de la machine
+    if sys.byteorder == "big":
+        ids.byteswap()
+        starts.byteswap()
+    return HEADER.pack(MAGIC, VERSION, taken_at, len(starts)) + ids.tobytes() + starts.tobytes()
+
+
+def decode(data):
+    """Décode un instantané: (taken_at, [(guild_id, channel_id, member_id, started_at)])"""
+    magic, version, taken_at, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("format d'instantané inconnu")
+    offset = HEADER.size
+    ids = array("Q")
+    ids.frombytes(data[offset:offset + count * 24])
+    starts = array("d")
+    starts.frombytes(data[offset + count * 24:offset + count * 32])
+    if len(starts) != count or len(ids) != count * 3:
+        raise ValueError("instantané tronqué")
+    if sys.byteorder == "big":
+        ids.byteswap()
+        starts.byteswap()
+    entries = [(ids[i * 3], ids[i * 3 + 1], ids[i * 3 + 2], starts[i]) for i in range(count)]
+    return taken_at, entries
+
+
+def save(path, entries, taken_at):
+    """Écrit l'instantané de façon atomique (fichier temporaire puis renommage)"""
+    data = encode(entries, taken_at)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """Lit l'instantané, ou (None, []) s'il est absent ou illisible"""
+    try:
+        with open(path, "rb") as f:
+            return decode(f.read())
+    except (OSError, ValueError, struct.error):
+        return None, []
+
+
+def diff_occupancy(previous, current):
+    """Compare deux états d'occupation.
+
+    `previous`: {(guild_id, member_id): (channel_id, started_at)}
+    `current`: {(guild_id, member_id): channel_id}
+
+    Retourne (joined, left, kept): `joined` et `left` associent un ID de salon
+    à la liste des IDs de membres arrivés/partis, `kept` liste les clés des
+    membres restés dans le même salon.
+    """
+    joined = {}
+    left = {}
+    kept = []
+    for key, (channel_id, _) in previous.items():
+        current_channel = current.get(key)
+        if current_channel == channel_id:
+            kept.append(key)
+        else:
+            left.setdefault(channel_id, []).append(key[1])
+    for key, channel_id in current.items():
+        previous_entry = previous.get(key)
+        if previous_entry is None or previous_entry[0] != channel_id:
+            joined.setdefault(channel_id, []).append(key[1])
+    return joined, left, kept
@@ -0,0 +1,209 @@
+"""Supervision du processus: retard de la boucle asyncio, arrêt propre sur SIGTERM, redémarrage avec backoff"""
+import asyncio
+import logging
+import random
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from itertools import islice
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Erreurs qu'un redémarrage ne corrigera pas
+FATAL_ERRORS = (discord.LoginFailure, discord.PrivilegedIntentsRequired)
+
+
+class LoopLagMonitor:
+    """Mesure le retard d'ordonnancement de la boucle asyncio.
+
+    Une tâche se réveille toutes les `interval` secondes et note l'écart entre
+    l'heure prévue et l'heure réelle du réveil : c'est le temps pendant lequel
+    la boucle était occupée ailleurs (callback bloquant, calcul trop long).
+    Un thread de surveillance vérifie que ces réveils continuent ; si la boucle
+    est bloquée plus de `stall_after` secondes, il journalise la pile de la
+    boucle, ce qu'elle ne peut plus faire elle-même.
+
+    L'état de santé ne regarde que les `health_window` dernières secondes :
+    un pic isolé ne rend pas l'instance malade pendant toute la fenêtre de
+    `window` secondes exposée par `snapshot()`.
+    """
+
+    def __init__(self, interval=0.5, stall_after=10.0, window=60.0, health_window=5.0, observer=None,
+                 clock=time.monotonic):
+        self.interval = interval
+        self.stall_after = stall_after
+        self._health_samples = max(1, int(health_window / interval))
+        self._observer = observer
+        self._clock = clock
+        # Retards des réveils sur les `window` dernières secondes
+        self._recent = deque(maxlen=max(1, int(window / interval)))
+        self.last_lag = 0.0
+        self.last_tick = None
+        self.stalls = 0
+        self._task = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._loop_thread_id = None
+
+    def start(self):
+        """Démarre la mesure sur la boucle courante et le thread de surveillance"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self.last_tick = self._clock()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = self._clock() + self.interval
+            await asyncio.sleep(self.interval)
+            now = self._clock()
+            lag = max(0.0, now - expected)
+            self.last_lag = lag
+            self.last_tick = now
+            self._recent.append(lag)
+            if self._observer is not None:
+                self._observer(lag)
+
+    def _watch(self):
+        stalled = False
+        while not self._stopped.wait(self.interval):
+            blocked = self._clock() - self.last_tick
+            if blocked < self.stall_after:
+                stalled = False
+                continue
+            if stalled:
+                continue
+            # Une seule trace par blocage
+            stalled = True
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(pile indisponible)"
+            logger.error("🧊 Boucle asyncio bloquée depuis %.1fs, pile en cours:\n%s", blocked, stack,
+                         extra={"multiline": True})
+
+    def max_lag(self, samples=None):
+        """Plus grand retard sur la fenêtre, ou sur les `samples` derniers réveils"""
+        if samples is None or samples >= len(self._recent):
+            return max(self._recent, default=0.0)
+        return max(islice(reversed(self._recent), samples))
+
+    def blocked_for(self):
+        """Temps écoulé depuis le dernier réveil, au-delà de l'intervalle prévu"""
+        if self.last_tick is None:
+            return 0.0
+        return max(0.0, self._clock() - self.last_tick - self.interval)
+
+    def healthy(self, threshold):
+        """Faux si la boucle a pris plus de `threshold` secondes de retard ces dernières secondes,
+        si elle est bloquée en ce moment ou si la mesure est arrêtée"""
+        return self._task is not None and max(self.max_lag(self._health_samples), self.blocked_for()) < threshold
+
+    def snapshot(self):
+        return {
+            "loop_lag_ms": round(self.last_lag * 1000, 2),
+            "loop_lag_max_ms": round(self.max_lag() * 1000, 2),
+            "loop_blocked_ms": round(self.blocked_for() * 1000, 2),
+            "loop_stalls": self.stalls,
+        }
+
+
+def restart_delay(attempt, base=1.0, max_delay=60.0):
+    """Backoff exponentiel avec gigue: ~base, 2×base, 4×base... plafonné à `max_delay`"""
+    delay = min(max_delay, base * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class Supervisor:
+    """Fait tourner le client Discord, l'arrête proprement sur signal et le relance s'il meurt.
+
+    SIGTERM (envoyé par Render lors d'un déploiement) et SIGINT déclenchent
+    `client.close()`, qui vide les notifications en attente et enregistre
+    l'état avant de fermer la connexion. Si `client.start()` s'arrête sur une
+    exception, le client est fermé puis relancé après un délai croissant ; le
+    compteur est remis à zéro après `stable_after` secondes de fonctionnement.
+    Un arrêt volontaire du client (fin normale de `start()`) n'est pas relancé.
+    """
+
+    def __init__(self, client, token, base_delay=1.0, max_delay=60.0, stable_after=300.0):
+        self.client = client
+        self.token = token
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.restarts = 0
+        self._stopping = None
+
+    def request_stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                # Windows: seul KeyboardInterrupt est disponible
+                pass
+
+    async def run(self):
+        self._stopping = asyncio.Event()
+        self._install_signal_handlers()
+        attempt = 0
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            runner = asyncio.create_task(self.client.start(self.token), name="discord-client")
+            stopper = asyncio.create_task(self._stopping.wait())
+            await asyncio.wait({runner, stopper}, return_when=asyncio.FIRST_COMPLETED)
+
+            if not runner.done():
+                logger.info("🛑 Signal d'arrêt reçu: envoi des notifications en attente puis arrêt")
+                await self.client.close()
+                # close() termine normalement start() ; sinon la tâche est annulée
+                await asyncio.wait({runner}, timeout=10)
+                runner.cancel()
+                await asyncio.gather(runner, return_exceptions=True)
+                return
+            stopper.cancel()
+
+            error = runner.exception()
+            if not self.client.is_closed():
+                await self.client.close()
+            if error is None:
+                logger.info("🛑 Client Discord arrêté")
+                return
+            if isinstance(error, FATAL_ERRORS):
+                raise error
+
+            if time.monotonic() - started > self.stable_after:
+                attempt = 0
+            delay = restart_delay(attempt, self.base_delay, self.max_delay)
+            attempt += 1
+            self.restarts += 1
+            logger.error(
+                "💥 Client Discord arrêté (%s: %s), redémarrage dans %.1fs",
+                type(error).__name__, error, delay,
+                exc_info=error
+            )
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            self.client.clear()
@@ -0,0 +1,184 @@
+"""Modèles de messages compilés, par serveur et par langue"""
+import logging
+from functools import lru_cache
+from string import Formatter
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Modèles par défaut. Les clés `*_batch` servent quand plusieurs membres sont regroupés.
+DEFAULT_TEMPLATES = {
+    "fr": {
+        "join": "🔗 {names} a rejoint le salon",
+        "join_batch": "🔗 {names} ont rejoint le salon",
+        "leave": "❌ {names} a quitté le salon",
+        "leave_batch": "❌ {names} ont quitté le salon",
+        "move_in": "📥 {names} est arrivé depuis #{channel}",
+        "move_in_batch": "📥 {names} sont arrivés depuis #{channel}",
+        "move_out": "📤 {names} est parti vers #{channel}",
+        "move_out_batch": "📤 {names} sont partis vers #{channel}",
+        "reconnect": "🔁 {names} s'est reconnecté",
+        "reconnect_batch": "🔁 {names} se sont reconnectés",
+        "catch_up": "🔄 Pendant l'absence du bot :",
+        "last_session": "dernière session : {duration}",
+        "and": " et ",
+    },
+    "en": {
+        "join": "🔗 {names} joined the channel",
+        "join_batch": "🔗 {names} joined the channel",
+        "leave": "❌ {names} left the channel",
+        "leave_batch": "❌ {names} left the channel",
+        "move_in": "📥 {names} arrived from #{channel}",
+        "move_in_batch": "📥 {names} arrived from #{channel}",
+        "move_out": "📤 {names} moved to #{channel}",
+        "move_out_batch": "📤 {names} moved to #{channel}",
+        "reconnect": "🔁 {names} reconnected",
+        "reconnect_batch": "🔁 {names} reconnected",
+        "catch_up": "🔄 While the bot was away:",
+        "last_session": "last session: {duration}",
+        "and": " and ",
+    },
+}
+
+# Champs autorisés pour chaque modèle
+PLACEHOLDERS = {
+    "join": {"names", "count"},
+    "join_batch": {"names", "count"},
+    "leave": {"names", "count"},
+    "leave_batch": {"names", "count"},
+    "move_in": {"names", "count", "channel"},
+    "move_in_batch": {"names", "count", "channel"},
+    "move_out": {"names", "count", "channel"},
+    "move_out_batch": {"names", "count", "channel"},
+    "reconnect": {"names", "count"},
+    "reconnect_batch": {"names", "count"},
+    "catch_up": set(),
+    "last_session": {"duration"},
+    "and": set(),
+}
+
+# Ordre d'affichage des lignes d'un message (clés = types d'événements de `notifications`)
+LINE_ORDER = ("join", "move_in", "reconnect", "move_out", "leave")
+
+
+class TemplateError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=8192)
+def escape_name(object_id, name):
+    """Nom échappé pour le markdown Discord, mémorisé par (ID, nom)"""
+    return discord.utils.escape_markdown(name)
+
+
+class Template:
+    """Modèle analysé une seule fois: suite de textes fixes et de champs"""
+    __slots__ = ("source", "_parts")
+
+    def __init__(self, source, allowed):
+        self.source = source
+        parts = []
+        try:
+            parsed = list(Formatter().parse(source))
+        except ValueError as e:
+            raise TemplateError(f"modèle invalide {source!r}: {e}") from None
+        for literal, field, spec, conversion in parsed:
+            if literal:
+                parts.append((True, literal))
+            if field is None:
+                continue
+            if field not in allowed or spec or conversion:
+                raise TemplateError(f"champ {{{field}}} non autorisé dans {source!r}")
+            parts.append((False, field))
+        self._parts = tuple(parts)
+
+    def render(self, values):
+        return "".join(text if literal else values[text] for literal, text in self._parts)
+
+
+class TemplateSet:
+    """Ensemble de modèles compilés pour une langue, avec les surcharges d'un serveur"""
+
+    def __init__(self, language="fr", overrides=None, embeds=False):
+        self.language = language if language in DEFAULT_TEMPLATES else "fr"
+        self.embeds = embeds
+        self._templates = {}
+        defaults = DEFAULT_TEMPLATES[self.language]
+        for key, source in defaults.items():
+            custom = (overrides or {}).get(key)
+            if custom is not None:
+                try:
+                    self._templates[key] = Template(custom, PLACEHOLDERS[key])
+                    continue
+                except TemplateError as e:
+                    logger.warning("⚠️ Modèle personnalisé ignoré (%s): %s", key, e)
+            self._templates[key] = Template(source, PLACEHOLDERS[key])
+        self._and = self._templates["and"].render({})
+
+    def _enumerate(self, parts):
+        if len(parts) == 1:
+            return parts[0]
+        return f"{', '.join(parts[:-1])}{self._and}{parts[-1]}"
+
+    def format_names(self, names):
+        """**A**, **B** et **C** (noms déjà échappés)"""
+        return self._enumerate([f"**{name}**" for name in names])
+
+    def _event_names(self, events):
+        return self._enumerate([f"**{e.name}** ({e.detail})" if e.detail else f"**{e.name}**" for e in events])
+
+    def _line(self, key, names, count, channel=None):
+        template = self._templates[key if count == 1 else f"{key}_batch"]
+        return template.render({"names": names, "count": str(count), "channel": channel})
+
+    def last_session(self, duration):
+        return self._templates["last_session"].render({"duration": duration})
+
+    def render_lines(self, events):
+        """Lignes du message d'un salon, à partir de ses événements regroupés.
+
+        Les arrivées et départs simples donnent une ligne chacun ; les
+        déplacements sont regroupés par salon d'origine ou de destination.
+        """
+        groups = {}
+        for event in events:
+            groups.setdefault(event.kind, {}).setdefault(event.other, []).append(event)
+
+        lines = []
+        for kind in LINE_ORDER:
+            for other, grouped in groups.get(kind, {}).items():
+                lines.append(self._line(kind, self._event_names(grouped), len(grouped), other))
+        return lines
+
+    def render_catch_up(self, joined_names, left_names):
+        """Lignes du récapitulatif des changements survenus pendant l'absence du bot"""
+        lines = [self._templates["catch_up"].render({})]
+        if joined_names:
+            lines.append(self._line("join", self.format_names(joined_names), len(joined_names)))
+        if left_names:
+            lines.append(self._line("leave", self.format_names(left_names), len(left_names)))
+        return lines
+
+
+DEFAULT_SET = TemplateSet()
+
+
+class TemplateCache:
+    """Modèles compilés par serveur, reconstruits quand sa configuration change"""
+
+    def __init__(self, config_lookup):
+        self._config_lookup = config_lookup
+        self._sets = {}
+
+    def get(self, guild_id):
+        templates = self._sets.get(guild_id)
+        if templates is None:
+            config = self._config_lookup(guild_id)
+            if config is None:
+                return DEFAULT_SET
+            templates = self._sets[guild_id] = TemplateSet(config.language, config.templates, config.embeds)
+        return templates
+
+    def invalidate(self, guild_id):
+        self._sets.pop(guild_id, None)
@@ -0,0 +1,148 @@
+"""Worker d'envoi des notifications: reçoit les messages de la gateway et les envoie par l'API REST.
+
+Lancé à côté de `bot.py` quand NOTIFICATION_WORKERS est défini (un processus
+par adresse listée) : python worker.py avec WORKER_LISTEN=unix:///run/bot/worker-0.sock
+"""
+import asyncio
+import logging
+import os
+import signal
+import time
+from collections import OrderedDict
+
+import discord
+from dotenv import load_dotenv
+
+from broker import parse_url, read_frames, start_server
+from dispatcher import GLOBAL_RATE, Notification, NotificationDispatcher, message_payload
+from log_pipeline import setup_logging
+
+load_dotenv()
+
+try:
+    log_listener, log_sampling = setup_logging(
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        fmt=os.getenv('LOG_FORMAT', 'text')
+    )
+except ValueError:
+    log_listener, log_sampling = setup_logging()
+logger = logging.getLogger('worker')
+
+TOKEN = os.getenv('DISCORD_TOKEN')
+if not TOKEN:
+    logger.error("❌ ERREUR CRITIQUE: DISCORD_TOKEN non trouvé dans les variables d'environnement!")
+    exit(1)
+
+# Adresse d'écoute de ce worker (l'une des adresses de NOTIFICATION_WORKERS côté bot)
+WORKER_LISTEN = os.getenv('WORKER_LISTEN', '')
+try:
+    parse_url(WORKER_LISTEN)
+except ValueError as e:
+    logger.error("❌ ERREUR: WORKER_LISTEN invalide: %s", e)
+    exit(1)
+
+# WORKER_COUNT: nombre de workers qui se partagent la limite de débit globale du bot
+try:
+    WORKER_COUNT = max(1, int(os.getenv('WORKER_COUNT', '1')))
+    NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', '4'))
+    NOTIFY_QUEUE_SIZE = int(os.getenv('NOTIFY_QUEUE_SIZE', '1000'))
+    NOTIFY_TTL_SECONDS = float(os.getenv('NOTIFY_TTL_SECONDS', '60'))
+    SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', '15'))
+except ValueError:
+    logger.error("❌ ERREUR: WORKER_COUNT, NOTIFY_WORKERS, NOTIFY_QUEUE_SIZE, NOTIFY_TTL_SECONDS et SHUTDOWN_DRAIN_SECONDS doivent être des nombres!")
+    exit(1)
+
+# Client REST uniquement: login() sans connect(), aucune session gateway (intents sans effet ;
+# `guilds` évite l'avertissement de discord.py sur un cache sans serveurs)
+client = discord.Client(intents=discord.Intents(guilds=True), max_ratelimit_timeout=30.0)
+
+# Format (texte ou embed) choisi par la gateway pour chaque salon, d'après la configuration du serveur.
+# Chaque trame le porte ; seuls les salons les plus récents sont gardés (bien plus que ceux en attente d'envoi)
+EMBED_CACHE_SIZE = 10000
+channel_embeds = OrderedDict()
+
+def remember_embed(channel_id, embed):
+    channel_embeds[channel_id] = embed
+    channel_embeds.move_to_end(channel_id)
+    if len(channel_embeds) > EMBED_CACHE_SIZE:
+        channel_embeds.popitem(last=False)
+
+async def send_notification(channel, content):
+    message = await channel.send(**message_payload(content, channel_embeds.get(channel.id, False)))
+    logger.info("✅ Notification envoyée dans %s", channel.id, extra={"event": "notification_sent", "channel_id": channel.id})
+    return message
+
+async def edit_notification(message, content):
+    channel = message.channel
+    await message.edit(**message_payload(content, channel_embeds.get(channel.id, False)))
+    logger.info("✏️ Notification complétée dans %s", channel.id, extra={"event": "notification_edited", "channel_id": channel.id})
+
+dispatcher = NotificationDispatcher(
+    send_notification,
+    workers=NOTIFY_WORKERS,
+    queue_size=NOTIFY_QUEUE_SIZE,
+    edit=edit_notification,
+    ttl=NOTIFY_TTL_SECONDS,
+    global_rate=(GLOBAL_RATE[0] / WORKER_COUNT, GLOBAL_RATE[1])
+)
+
+# Connexions ouvertes par la gateway, fermées à l'arrêt
+connections = set()
+
+async def handle_gateway(reader, writer):
+    """Met en file les notifications reçues d'une connexion, dans l'ordre de réception"""
+    connections.add(writer)
+    logger.info("🔌 Gateway connectée")
+    try:
+        async for frame in read_frames(reader):
+            now = time.monotonic()
+            channel_id = frame["c"]
+            remember_embed(channel_id, frame["e"])
+            dispatcher.submit(Notification(
+                client.get_partial_messageable(channel_id, guild_id=frame["g"]),
+                frame["t"],
+                tuple(now - age for age in frame["a"]),
+                created_at=now - frame["k"]
+            ))
+    except (ValueError, KeyError) as e:
+        logger.error("❌ Trame invalide reçue de la gateway, connexion fermée: %s", e)
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        logger.warning("⚠️ Connexion avec la gateway perdue: %s", e)
+    finally:
+        connections.discard(writer)
+        writer.close()
+        logger.info("🔌 Gateway déconnectée")
+
+async def main():
+    await client.login(TOKEN)
+    dispatcher.start()
+    server = await start_server(WORKER_LISTEN, handle_gateway)
+    logger.info("🚀 Worker d'envoi à l'écoute sur %s (part de la limite globale: 1/%s)", WORKER_LISTEN, WORKER_COUNT)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await stopping.wait()
+    finally:
+        logger.info("🛑 Arrêt du worker: envoi des notifications en attente")
+        # La gateway garde ses nouvelles notifications en file jusqu'au retour du worker
+        server.close()
+        for writer in list(connections):
+            writer.close()
+        await dispatcher.drain(timeout=SHUTDOWN_DRAIN_SECONDS)
+        logger.info("📊 Notifications: %s", dispatcher.stats())
+        await client.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except discord.LoginFailure:
+        logger.error("❌ ERREUR CRITIQUE: Token Discord invalide!")
+        exit(1)
+    except KeyboardInterrupt:
+        pass